@@ -36,6 +36,10 @@ from . import component
 from . import highlight
 from . import process
 from . import generator
+from . import model
+from . import transport
+from . import spatial
+from . import render
 from . import config as configuration
 from . import log
 
@@ -49,6 +53,8 @@ __all__ = (
     "tracking",
     "fuel_monitor",
     "process",
+    "model",
+    "transport",
 )
 
 DEFAULT_CONFIG_FILE = os.path.join(os.path.split(__file__)[0], "config.json")
@@ -137,7 +143,16 @@ def start(sinks=[], sources=[], **kwargs):
 # config = None
 
 
-def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger=None):
+def run(
+    shared=None,
+    sinks=[],
+    sources=[],
+    config=None,
+    config_hook=None,
+    logger=None,
+    headless=False,
+    duration=None,
+):
     """Starts the ICU system. Call blocks until the GUI is closed.
 
     Args:
@@ -148,7 +163,20 @@ def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger
         config_hook (str): file to get configuration information for an external process, this allows configuration to be handled by
         ICU (written in the same config.json file) and may be made avaliable via shared memory.
         logger (str): name of logger to log ICU events.
+        headless (bool, optional): run the task model without a display against a virtual clock (see run_headless). Defaults to False.
+        duration (int, float, optional): (headless only) virtual time to run for in milliseconds. Defaults to the configured shutdown time.
     """
+    if headless:
+        return run_headless(
+            shared=shared,
+            sinks=sinks,
+            sources=sources,
+            config=config,
+            config_hook=config_hook,
+            logger=logger,
+            duration=duration,
+        )
+
     if config is None:
         config = os.path.join(os.path.split(__file__)[0], "config.json")
 
@@ -161,7 +189,7 @@ def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger
 
     # initialise global event callback (required for all events to be processed)
     logger = log.get_logger(logger)  # get logger for events
-    event.initialise_global_event_callback(logger)
+    event.initialise_global_event_callback(logger, coalesce=config.event_coalesce)
 
     # pprint(config.__dict__)
 
@@ -183,10 +211,13 @@ def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger
             def toggle(self, event):
                 self.fullscreen = not self.fullscreen
                 root.attributes("-fullscreen", self.fullscreen)
+                if main is not None:
+                    main.geometry.refresh()  # the window moves without a <Configure> on some platforms
 
         root = tk.Tk()
         root.lower()
         full_screen = None
+        main = None
 
         if config.screen_aspect is not None:
             root.aspect(*config.screen_aspect, *config.screen_aspect)
@@ -250,6 +281,7 @@ def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger
         )
 
         event.tk_event_schedular(root)  # initial global event schedular
+        render.start(config.frame_rate)  # canvas updates are written once per frame
 
         main = main_panel.MainPanel(
             root,
@@ -304,6 +336,8 @@ def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger
             main.bottom_frame.layout_manager.split("fuel_monitor", "X", prop=550 / 800)
             main.bottom_frame.layout_manager.fill("fuel_monitor", "Y")
 
+        main.layout()  # place all of the widgets in one pass
+
         if config.overlay["enable"]:
             if config.overlay["arrow"]:
                 print("ARROW ENABLED!")
@@ -326,41 +360,20 @@ def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger
                         self.angle = 0
                         self.highlighted = None
                         event.event_scheduler.schedule(
-                            self.rotate_arrow(), sleep=cycle([50])
+                            self.rotate_arrow(), sleep=cycle([50]), policy="skip"
                         )
 
                     @property
                     def position(self):
                         return main.eye_position
 
-                    def get_highlight_position(self, k):
-                        x, y = self.highlights[k].position
-                        w, h = self.highlights[k].size
-                        return x + w / 2, y + h / 2
-
-                    def get_min_distance(self, positions):
-                        min_d = (None, float("inf"))
-                        for k, (px, py) in positions.items():
-                            d = (
-                                (px - self.position[0]) ** 2
-                                + (py - self.position[1]) ** 2
-                            ) ** 0.5
-                            if d < min_d[1]:
-                                min_d = (k, d)
-                        return min_d
-
                     def rotate_arrow(self):
                         while True:
-                            # get positions of all active highlights
-                            positions = {
-                                k: self.get_highlight_position(k)
-                                for k in highlight.all_highlighted()
-                            }
-                            # compute closest to eye position
-                            if len(positions) > 0:
-                                (h, _) = self.get_min_distance(positions)
-                                assert h is not None
-                                hx, hy = positions[h]
+                            # closest active highlight to eye position (see spatial.nearest_highlight)
+                            h, _ = spatial.nearest_highlight(*self.position)
+                            if h is not None:
+                                (x1, y1, x2, y2) = spatial.index().boxes[h]
+                                hx, hy = (x1 + x2) / 2, (y1 + y2) / 2
                                 # print(h, hx, hy, self.position)
                                 # compute angle between eyes and highlight
                                 angle = math.atan2(
@@ -426,10 +439,11 @@ def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger
         et_config = config.input["eyetracker"]
         if et_config.get("enabled", False):
             eyetracker = None
-            filter = eyetracking.filter.TobiiFilter(
-                5, 200
-            )  # TODO some default thing...
-            eyetracker = eyetracking.eyetracker(root, filter=filter, **et_config)
+            et_config = dict(et_config)
+            filter = gaze_filter(et_config.pop("fixation", False))
+            eyetracker = eyetracking.eyetracker(
+                root, filter=filter, geometry=main.geometry, **et_config
+            )
             eyetracker.start()
 
         atexit.register(system.shutdown)
@@ -512,20 +526,123 @@ def run(shared=None, sinks=[], sources=[], config=None, config_hook=None, logger
         system.shutdown()  # ensure shutdown properly...
 
 
-def task_system_monitor(config):
+def run_headless(
+    shared=None,
+    sinks=[],
+    sources=[],
+    config=None,
+    config_hook=None,
+    logger=None,
+    duration=None,
+    start=0.0,
+):
+    """Runs the ICU task model without a display. The same events, event generators and schedules are used as
+    in run, but time is virtual, the call returns as soon as the simulation has run for the given duration.
+
+    Args:
+        shared: shared memory - see run.
+        sinks (list, optional): A list of external sinks, used to receive events from the ICU system. Defaults to [].
+        sources (list, optional): A list of external sources, used to send events to the ICU system. Defaults to [].
+        config (str): Path of configuration file.
+        config_hook (str): see run.
+        logger (str): name of logger to log ICU events.
+        duration (int, float, optional): virtual time to run for in milliseconds. Defaults to the configured shutdown time.
+        start (float, optional): virtual time (seconds) at which the simulation starts, used to timestamp events. Defaults to 0.
+
+    Returns:
+        model.Simulation: the task model in its final state.
+    """
+    if config is None:
+        config = DEFAULT_CONFIG_FILE
+    if config_hook is not None:
+        configuration.hook(config_hook)
+    config = SimpleNamespace(**configuration.load(config))
+
+    if duration is None:
+        duration = config.shutdown
+    if duration is None or duration < 0:
+        raise ValueError(
+            "A headless run requires a duration (or a config shutdown time)."
+        )
+
+    event.initialise_global_event_callback(
+        log.get_logger(logger), coalesce=config.event_coalesce
+    )
+    scheduler = event.virtual_event_schedular(start=start)
+    system = event.EventCallback()
+    system.register("System")
+
+    simulation = model.Simulation(config.__dict__)
+    task = SimpleNamespace(**config.task)
+    if task.system:
+        task_system_monitor(
+            config,
+            scales=list(simulation.scales),
+            warning_lights=list(simulation.warning_lights),
+        )
+    if task.track:
+        task_tracking(config, targets=list(simulation.targets))
+    if task.fuel:
+        task_fuel_monitor(config, pumps=list(simulation.pumps))
+
+    # recorded gaze is replayed (in virtual time) through the same filters as in run
+    et_config = dict(config.input["eyetracker"])
+    if et_config.get("enabled", False) and et_config.get("replay") is not None:
+        filter = gaze_filter(et_config.pop("fixation", False))
+        eyetracker = eyetracking.eyetracker(None, filter=filter, **et_config)
+        eyetracker.schedule()
+
+    for sink in sinks:
+        event.add_event_sink(sink)
+    for source in sources:
+        event.add_event_source(source)
+
+    if shared is not None:
+        shared.event_sinks = get_event_sinks()
+        shared.event_sources = get_event_sources()
+        shared.config = config
+        shared.window_properties = dict()
+        shared.release()
+
+    try:
+        scheduler.run(duration)
+        e = event.Event(system.name, "Global", label="system", command="shutdown")
+        event.GLOBAL_EVENT_CALLBACK.trigger(e)
+    finally:
+        event.close()
+    return simulation
+
+
+def gaze_filter(fixation=False):
+    """The filter applied to eyetracker samples (see eyetracking.filter).
+
+    Args:
+        fixation (bool, optional): detect fixations (see eyetracking.filter.FixationFilter), otherwise every sample
+            is labelled (see eyetracking.filter.TobiiFilter). Defaults to False.
+    """
+    if fixation:
+        return eyetracking.filter.FixationFilter()
+    return eyetracking.filter.TobiiFilter(5, 200)
+
+
+def task_system_monitor(config, scales=None, warning_lights=None):
     """Set up system monitoring task event schedules
 
     Args:
         config (SimpleNamespace): configuration options
+        scales (list, optional): names of scales to schedule. Defaults to all Scale widgets.
+        warning_lights (list, optional): names of warning lights to schedule. Defaults to all WarningLight widgets.
     """
-    scales = system_monitor.Scale.all_components()
+    if scales is None:
+        scales = system_monitor.Scale.all_components()
     for scale in scales:
         schedule = config.__dict__[scale]["schedule"]
         event.event_scheduler.schedule(
             generator.ScaleEventGenerator(scale), sleep=schedule
         )
 
-    warning_lights = system_monitor.WarningLight.all_components()
+    if warning_lights is None:
+        warning_lights = system_monitor.WarningLight.all_components()
     for warning_light in warning_lights:
         schedule = config.__dict__[warning_light]["schedule"]
         event.event_scheduler.schedule(
@@ -534,13 +651,15 @@ def task_system_monitor(config):
         # print(scale, schedule)
 
 
-def task_tracking(config):
+def task_tracking(config, targets=None):
     """Set up tracking task event schedules
 
     Args:
         config (SimpleNamespace): configuration options
+        targets (list, optional): names of targets to schedule. Defaults to all Tracking widgets.
     """
-    targets = tracking.Tracking.all_components()
+    if targets is None:
+        targets = tracking.Tracking.all_components()
     for target in targets:
         schedule = config.__dict__[target]["schedule"]
         event.event_scheduler.schedule(
@@ -549,13 +668,15 @@ def task_tracking(config):
         )
 
 
-def task_fuel_monitor(config):
+def task_fuel_monitor(config, pumps=None):
     """Set up fuel monitoring task event scheduless
 
     Args:
         config (SimpleNamespace): configuration options
+        pumps (list, optional): names of pumps to schedule. Defaults to all Pump widgets.
     """
-    pumps = fuel_monitor.Pump.all_components()
+    if pumps is None:
+        pumps = fuel_monitor.Pump.all_components()
     for pump in pumps:
         schedule = config.__dict__[pump]["schedule"]
         event.event_scheduler.schedule(
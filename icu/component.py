@@ -2,9 +2,13 @@ from abc import ABC, abstractmethod
 from collections import defaultdict
 import math
 
+from . import spatial
+from . import render
+
 class Component(ABC): #TODO refactor this, probably it can be in BaseComponent
 
     __components__ = {} #all of the visual components, tanks, pumps, tracking etc
+    hit_test = True # add to the spatial index when registered (see spatial.component_at)
 
     def __init__(self, *args, **kwargs):
         super(Component, self).__init__(*args, **kwargs)
@@ -12,6 +16,8 @@ class Component(ABC): #TODO refactor this, probably it can be in BaseComponent
     def register(self, name):
         self.__name = name
         Component.__components__[self.__name] = self
+        if isinstance(self, BaseComponent) and getattr(self, 'hit_test', True): # some widgets register without being a Component
+            spatial.index().track(self.__name, self)
         #print("INFO: registered component: {0}".format(self.__name))
 
     @property
@@ -30,94 +36,134 @@ def __validate_padding__(padding):
         raise ValueError("Invalid argument padding: {0}, must be int, float, tuple/2 or list/2".format(padding))
 
 
-#TODO REFACTOR!
-
-class SplitLayoutX:
-
-    def __init__(self, manager, inner_sep=0.):
-        self.manager = manager
-        self.__split = []
-        self.__split_p = []
-        self.__inner_sep = inner_sep
-
-    def add(self, component, prop, max_size=float('inf'), min_size=-float('inf')):
-        self.__split.append(component)
-        self.__split_p.append(prop)
-        _sp = sum(self.__split_p)
-        px = self.manager.component_x
-        gt = self.__inner_sep * (len(self.__split) - 1)
-        for i, component in enumerate(self.__split):
-            _p = self.__split_p[i] / _sp
-            component.x = px
-            _s = (self.manager.component_width - gt) * _p
-            component.width = max(min(_s, max_size), min_size)
-            px = px + component.width + self.__inner_sep
-
-class SplitLayoutY:
-
-    def __init__(self, manager, inner_sep=0.):
-        self.manager = manager
-        self.__split = []
-        self.__split_p = []
-        self.__inner_sep = inner_sep
-
-    def add(self, component, prop, max_size=float('inf'), min_size=-float('inf')):
-        self.__split.append(component)
-        self.__split_p.append(prop)
-        _sp = sum(self.__split_p)
-        py = self.manager.component_y
-        gt = self.__inner_sep * (len(self.__split) - 1)
-        for i, component in enumerate(self.__split):
-            _p = self.__split_p[i] / _sp
-            component.y = py
-            _s = (self.manager.component_height - gt) * _p
-            component.height = max(min(_s, max_size), min_size)
-            py = py + component.height + self.__inner_sep
-
 class SimpleLayoutManager:
+    """
+        Declarative layout of the components of a widget (by name). split, fill and anchor only record a declaration
+        (the last declaration for a component and axis replaces any earlier one), nothing moves until the layout is
+        solved (see layout), in a single pass over the declarations that updates each component at most once. The
+        layout is solved again whenever the widget is resized (see CanvasWidget.resize).
+
+        Padding and inner separation are in the units of the widget when it was created, they are scaled with it.
+        Proportions (see split) are relative to the other components that are split along the same axis.
+    """
+
+    AXES = ('X', 'Y')
 
     def __init__(self, component=None, inner_sep=0., inner_sep_x=0., inner_sep_y=0.):
         self.component = component
-        self.__split_x = SplitLayoutX(self, inner_sep=max(inner_sep, inner_sep_x))
-        self.__split_y = SplitLayoutY(self, inner_sep=max(inner_sep, inner_sep_y))
+        self.__inner_sep = (max(inner_sep, inner_sep_x), max(inner_sep, inner_sep_y))
+        self.__rules = {axis:{} for axis in SimpleLayoutManager.AXES} # axis -> name -> rule (in declaration order)
+        self.__dirty = False
+
+    def __declare(self, component, axis, rule):
+        if not isinstance(component, str): # find the name of the component
+            name = next((k for k, v in self.component.components.items() if v is component), None)
+            if name is None:
+                raise KeyError("Unknown component: {0}".format(getattr(component, 'name', component)))
+            component = name
+        elif component not in self.component.components:
+            raise KeyError("Unknown component: {0}".format(component))
+        rules = self.__rules[axis]
+        rules.pop(component, None) # split order is declaration order
+        rules[component] = rule
+        self.__dirty = True
 
     def split(self, component, axis, prop=1., max_size=float('inf'), min_size=-float('inf')): #X,Y or combination
-        component = self.component.components[component]
-
-        if 'X' in axis:
-            self.__split_x.add(component, prop, max_size=max_size, min_size=min_size)
-
-        if 'Y' in axis:
-            self.__split_y.add(component, prop, max_size=max_size, min_size=min_size)
+        """ Share the content of the widget along axis with the other split components, in proportion prop. """
+        for a in SimpleLayoutManager.AXES:
+            if a in axis:
+                self.__declare(component, a, ('split', prop, max_size, min_size))
 
     def fill(self, component, axis):
-        component = self.component.components[component]
-
-        if 'X' in axis:
-            component.x = self.component.x + self.padding[0]
-            component.width = self.component.content_width
-        
-        if 'Y' in axis:
-            component.y = self.component.y + self.padding[1]
-            component.height = self.component.content_height
+        """ Fill the content of the widget along axis. """
+        for a in SimpleLayoutManager.AXES:
+            if a in axis:
+                self.__declare(component, a, ('fill',))
     
     def anchor(self, component, anchor): #anchor N,E,S,W,C #north east south west or center
-        #TODO refactor this garbage
-        if isinstance(component, str):
-            component = self.component.components[component]
-
+        """ Place the component against the (padded) edges of the widget, keeping its size. """
         for a in anchor:
             if a == 'W': 
-                component.x = self.component.x + self.padding[0]
+                self.__declare(component, 'X', ('anchor', 0))
             elif a == 'E':
-                component.x = self.component.x + self.component.width - component.width - self.padding[0]
+                self.__declare(component, 'X', ('anchor', 1))
             elif a == 'N':
-                component.y = self.component.y + self.padding[1]
+                self.__declare(component, 'Y', ('anchor', 0))
             elif a == 'S':
-                component.y  =self.component.y + self.component.height - component.height - self.padding[1]
+                self.__declare(component, 'Y', ('anchor', 1))
             else:
                 raise NotImplementedError("TODO ?")
 
+    def solve(self, scale=None):
+        """
+            Solve the layout declarations.
+
+        Args:
+            scale (tuple, optional): (sx, sy) the widget has been scaled by, components that are not laid out (along an
+                axis) are scaled with it about its position. Defaults to None (they keep their geometry).
+
+        Returns:
+            dict: name -> [x, y, width, height] of each component that is laid out (every component if scale is given).
+        """
+        widget = self.component
+        components = widget.components
+        geometry = {}
+        if scale is not None:
+            (sx, sy), (wx, wy) = scale, widget.position
+            for name, c in components.items():
+                geometry[name] = [wx + (c.x - wx) * sx, wy + (c.y - wy) * sy, c.width * sx, c.height * sy]
+
+        def get(name):
+            g = geometry.get(name)
+            if g is None:
+                c = components[name]
+                g = geometry[name] = [c.x, c.y, c.width, c.height]
+            return g
+
+        for i, axis in enumerate(SimpleLayoutManager.AXES):
+            rules = self.__rules[axis]
+            if not rules:
+                continue
+            start = widget.position[i] + widget.padding[i]
+            size = (widget.content_width, widget.content_height)[i]
+            sep = self.__inner_sep[i]
+            split = [(name, rule) for name, rule in rules.items() if rule[0] == 'split']
+            total = sum(rule[1] for _, rule in split)
+            available = size - sep * (len(split) - 1)
+            p = start
+            for name, (_, prop, max_size, min_size) in split:
+                g = get(name)
+                g[i], g[i + 2] = p, max(min(available * prop / total, max_size), min_size)
+                p = p + g[i + 2] + sep
+            for name, rule in rules.items():
+                if rule[0] == 'fill':
+                    g = get(name)
+                    g[i], g[i + 2] = start, size
+                elif rule[0] == 'anchor':
+                    g = get(name)
+                    g[i] = start + (size - g[i + 2]) * rule[1]
+        return geometry
+
+    def layout(self, scale=None):
+        """ Apply the solved layout (see solve), only if there are new declarations or the widget has been scaled. """
+        if scale is None and not self.__dirty:
+            return
+        if scale is not None:
+            self.scale(*scale)
+        self.__dirty = False
+        components = self.component.components
+        for name, (x, y, width, height) in self.solve(scale=scale).items():
+            components[name].set_geometry(x, y, width, height)
+
+    def scale(self, sx, sy):
+        """ Scale the inner separation with the widget (see CanvasWidget.resize). """
+        self.__inner_sep = (self.__inner_sep[0] * sx, self.__inner_sep[1] * sy)
+
+    @property
+    def proportional(self):
+        """ Whether the layout scales with the widget (no split is limited by a max/min size), see CanvasWidget.transformed. """
+        return all(rule[0] != 'split' or (rule[2] == float('inf') and rule[3] == -float('inf'))
+                   for rules in self.__rules.values() for rule in rules.values())
 
     @property
     def component_width(self):
@@ -167,11 +213,40 @@ def sub(v, s):
 def rotate(angle, *p): #rotate a set of points
     pass
 
+LAYERS = ('widget', 'highlight', 'overlay') # z-order of the canvas from bottom to top, widgets are in the bottom layer unless set otherwise
+
+def layer_tag(layer):
+    return "layer:{0}".format(layer)
+
+def raise_layers(canvas, layer=LAYERS[0]):
+    """ Restore the z-order of the layers from layer up, e.g. after items have been created above them (see MainPanel.layout). """
+    for l in LAYERS[max(LAYERS.index(layer), 1):]: # the bottom layer is below the others once they are raised
+        canvas.tag_raise(layer_tag(l))
+
+def raise_in_layer(canvas, tag, layer):
+    """ Raise the items with tag to the top of their layer, they keep their order. """
+    if layer == LAYERS[0]:
+        canvas.tag_raise(tag)
+        raise_layers(canvas, LAYERS[1])
+    else:
+        canvas.tag_raise(tag, layer_tag(layer))
+
+def lower_in_layer(canvas, tag, layer):
+    """ Lower the items with tag to the bottom of their layer, they keep their order. """
+    if layer == LAYERS[0]:
+        canvas.tag_lower(tag)
+    else:
+        canvas.tag_lower(tag, layer_tag(layer))
+
 class BaseComponent:
 
     __all_components__ = {}
     __bind__ = defaultdict(dict)
 
+    layer = LAYERS[0] # z-order (see set_layer)
+    parent = None # the CanvasWidget the component is in (see Components)
+    hidden = False # hidden by hide (rather than by a widget it is in, see CanvasWidget.show)
+
     def __init__(self, canvas, x=0., y=0., width=0., height=0., padding=0.):
         self.canvas = canvas
         self.__x = x
@@ -196,6 +271,10 @@ class BaseComponent:
     def padding(self):
         return self.__padding
 
+    @padding.setter
+    def padding(self, padding):
+        self.__padding = __validate_padding__(padding)
+
     @property
     def content_width(self):
         return self.__width - self.__padding[0] * 2
@@ -241,6 +320,13 @@ class BaseComponent:
         for observer in self.observers['size']:
             observer((0, dh))
     
+    def set_geometry(self, x, y, width, height):
+        """ Resize and then move the component (see SimpleLayoutManager.layout), only if its size/position changes. """
+        if (width, height) != self.size:
+            self.size = (width, height)
+        if (x, y) != self.position:
+            self.position = (x, y)
+
     @property
     def position(self):
         return (self.__x, self.__y)
@@ -278,6 +364,95 @@ class BaseComponent:
         for observer in self.observers['position']:
             observer((dx, 0))
 
+    def transformed(self, sx, sy, dx, dy):
+        """
+            Update the geometry of the component after its canvas items have been transformed (x * sx + dx, y * sy + dy),
+            e.g. by a single canvas.scale of the items of a widget (see MainPanel.resize). Unlike setting the size and
+            position nothing is drawn, observers are notified as usual.
+        """
+        (x, y), (w, h) = self.position, self.size
+        self._set_geometry(x * sx + dx, y * sy + dy, w * sx, h * sy)
+        self.transform_content(sx, sy, dx, dy)
+        if self.__width != w or self.__height != h:
+            for observer in self.observers['size']:
+                observer((self.__width - w, self.__height - h))
+        if self.__x != x or self.__y != y:
+            for observer in self.observers['position']:
+                observer((self.__x - x, self.__y - y))
+
+    def _set_geometry(self, x, y, width, height):
+        """ Set the geometry of the component without drawing it or notifying observers (see transformed). """
+        self.__x, self.__y = x, y
+        self.__width, self.__height = width, height
+
+    def transform_content(self, sx, sy, dx, dy):
+        """ Update whatever is in the component after a transform (see transformed). """
+        pass
+
+    @property
+    def parent_hidden(self):
+        """ Whether a widget that the component is in has been hidden. """
+        parent = self.parent
+        while parent is not None:
+            if parent.hidden:
+                return True
+            parent = parent.parent
+        return False
+
+    def moved(self, dx, dy):
+        """ Update the position of the component after its canvas items have been moved (see CanvasWidget.move). """
+        self.__x, self.__y = self.__x + dx, self.__y + dy
+        for observer in self.observers['position']:
+            observer((dx, dy))
+
+    def canvas_items(self):
+        """ The canvas items that draw the component. """
+        return ()
+
+    @property
+    def item_tag(self):
+        """ A canvas tag (or item) of everything that draws the component, None if nothing does. """
+        return None
+
+    def set_layer(self, layer):
+        """ Move the component to a z-order layer (see LAYERS). """
+        self.layer = layer
+        tag = self.item_tag
+        if tag is not None:
+            self.canvas.addtag_withtag(layer_tag(layer), tag)
+            raise_layers(self.canvas, layer)
+
+    def show(self):
+        """ Show the component, unless a widget it is in is hidden (it is then shown with the widget). """
+        self.hidden = False
+        tag = self.item_tag
+        if tag is not None and not self.parent_hidden:
+            render.renderer().itemconfigure(self.canvas, tag, state='normal')
+
+    def hide(self):
+        self.hidden = True
+        tag = self.item_tag
+        if tag is not None:
+            render.renderer().itemconfigure(self.canvas, tag, state='hidden')
+
+    def front(self):
+        """ Raise the component to the top of its layer. """
+        tag = self.item_tag
+        if tag is not None:
+            raise_in_layer(self.canvas, tag, self.layer)
+
+    def back(self):
+        """ Lower the component to the bottom of its layer. """
+        tag = self.item_tag
+        if tag is not None:
+            lower_in_layer(self.canvas, tag, self.layer)
+
+    def delete(self):
+        """ Delete the canvas items of the component. """
+        tag = self.item_tag
+        if tag is not None:
+            render.renderer().delete(self.canvas, tag)
+
     @abstractmethod
     def move(self, dx, dy):
         pass
@@ -323,32 +498,23 @@ class SimpleComponent(BaseComponent):
     def component(self):
         return self.__component
 
+    def canvas_items(self):
+        return (self.__component,)
+
     def move(self, dx, dy):
-        self.canvas.move(self.component, dx, dy)
+        render.renderer().move(self.canvas, self.component, dx, dy)
 
     def resize(self, dw, dh):
         #print(self, "resize:", self.width - dw, self.height - dh, "to:", self.width, self.height)
-       
-        x1,y1, _,_ = self.canvas.coords(self.component)
-        #if x1 != self.x or y1 != self.y:
-        #    print(self.x, x1, self.y, y1)
-        #    raise ValueError()
-        self.canvas.coords(self.component, x1, y1, x1 + self.width, y1 + self.height)
+        # the position is the top left of the item (see __init__), no need to ask tk
+        render.renderer().coords(self.canvas, self.component, self.x, self.y, self.x + self.width, self.y + self.height)
  
-    def show(self):
-        self.canvas.itemconfigure(self.component, state='normal')
-    
-    def hide(self):
-        self.canvas.itemconfigure(self.component, state='hidden')
-
     def is_hidden(self):
-        return self.canvas.itemcget(self.component, "state") == 'hidden'
-
-    def front(self):
-        self.canvas.tag_raise(self.component)
+        return render.renderer().itemcget(self.canvas, self.component, "state") == 'hidden'
 
-    def back(self):
-        self.canvas.tag_lower(self.component)
+    @property
+    def item_tag(self):
+        return self.component
 
     @property
     def tag(self):
@@ -382,13 +548,20 @@ class PolyComponent(BaseComponent):
 
         #TODO inherit all properties???
         old_component = self.__component
+        renderer = render.renderer()
+        renderer.sync(self.canvas, old_component)
+        state = renderer.itemcget(self.canvas, old_component, "state")
         self.__component = self.canvas.create_polygon(new_points, fill='red', width=0,
-                                state=self.canvas.itemcget(old_component, "state"))
-        self.canvas.delete(old_component)
+                                state=state, tags=self.canvas.gettags(old_component))
+        renderer.created(self.canvas, self.__component, new_points, state=state)
+        self.canvas.tag_lower(self.__component, old_component) # keep the z-order of the old polygon
+        renderer.delete(self.canvas, old_component)
+        if self.parent is not None:
+            self.parent.replace_item(old_component, self.__component)
 
     @property
     def coords(self):
-        return self.canvas.coords(self.component)
+        return render.renderer().coords(self.canvas, self.component)
 
     @property
     def lcoords(self): #local coordinates
@@ -403,29 +576,24 @@ class PolyComponent(BaseComponent):
     def component(self):
         return self.__component
 
+    def canvas_items(self):
+        return (self.__component,)
+
     def move(self, dx, dy):
-        self.canvas.move(self.component, dx, dy)
+        render.renderer().move(self.canvas, self.component, dx, dy)
         #self.canvas.move(self.__debug, dx, dy)
         
     def resize(self, dw, dh):
         sx, sy = self.width / (self.width - dw), self.height / (self.height - dh) 
-        self.canvas.scale(self.component, *self.position, sx, sy)
+        render.renderer().scale(self.canvas, self.component, (self.component,), *self.position, sx, sy)
         #self.canvas.scale(self.__debug, *self.position, sx, sy)
 
-    def show(self):
-        self.canvas.itemconfigure(self.component, state='normal')
-    
-    def hide(self):
-        self.canvas.itemconfigure(self.component, state='hidden')
-
     def is_hidden(self):
-        return self.canvas.itemcget(self.component, "state") == 'hidden'
-    
-    def front(self):
-        self.canvas.tag_raise(self.component)
+        return render.renderer().itemcget(self.canvas, self.component, "state") == 'hidden'
 
-    def back(self):
-        self.canvas.tag_lower(self.component)
+    @property
+    def item_tag(self):
+        return self.component
 
 
 
@@ -439,12 +607,7 @@ class LineComponent(SimpleComponent):
 
     def resize(self, dw, dh):
         #print(self, "resize:", self.width - dw, self.height - dh, "to:", self.width, self.height)
-       
-        x1,y1, _,_ = self.canvas.coords(self.component)
-        #if x1 != self.x or y1 != self.y:
-        #    print(self.x, x1, self.y, y1)
-        #    raise ValueError()
-        self.canvas.coords(self.component, x1, y1, x1 + self.width, y1 + self.height)
+        render.renderer().coords(self.canvas, self.component, self.x, self.y, self.x + self.width, self.y + self.height)
 
 class TextComponent(BaseComponent):
     
@@ -456,28 +619,35 @@ class TextComponent(BaseComponent):
     
     @property
     def text_colour(self):
-        return self.canvas.itemcget(self.component, 'fill')
+        return render.renderer().itemcget(self.canvas, self.component, 'fill')
 
     @text_colour.setter
     def text_colour(self, value):
-        return self.canvas.itemconfigure(self.component, fill=value)
+        render.renderer().itemconfigure(self.canvas, self.component, fill=value)
 
     @property
     def text(self):
-        return self.canvas.itemcget(self.component, 'text')
+        return render.renderer().itemcget(self.canvas, self.component, 'text')
     
     @text.setter
     def text(self, value):
-        self.canvas.itemconfigure(self.component, text=value)
+        render.renderer().itemconfigure(self.canvas, self.component, text=value)
+
+    def canvas_items(self):
+        return (self.component,)
+
+    @property
+    def item_tag(self):
+        return self.component
 
     def resize(self, dw, dh):
         pass
 
     def move(self, dx, dy):
-        self.canvas.move(self.component, dx, dy)
+        render.renderer().move(self.canvas, self.component, dx, dy)
 
     def bold(self):
-        self.canvas.itemconfigure(self.component, font='bold')
+        render.renderer().itemconfigure(self.canvas, self.component, font='bold')
 
 
 class BoxComponent(SimpleComponent):
@@ -488,30 +658,63 @@ class BoxComponent(SimpleComponent):
 
     @property
     def colour(self):
-        return self.canvas.itemcget(self.component, "fill")
+        return render.renderer().itemcget(self.canvas, self.component, "fill")
 
     @colour.setter
     def colour(self, value):
-        self.canvas.itemconfigure(self.component, fill=value)
+        render.renderer().itemconfigure(self.canvas, self.component, fill=value)
 
     @property
     def outline_thickness(self):
-        return self.canvas.itemcget(self.component, "width") 
+        return render.renderer().itemcget(self.canvas, self.component, "width") 
 
     @outline_thickness.setter
     def outline_thickness(self, value):
         if value == 0:
             self.outline_colour = "" #?? for some reason it crashes otherwise... TODO 
         else:
-            self.canvas.itemconfigure(self.component, width=value)
+            render.renderer().itemconfigure(self.canvas, self.component, width=value)
 
     @property
     def outline_colour(self):
-        return self.canvas.itemcget(self.component, "outline") 
+        return render.renderer().itemcget(self.canvas, self.component, "outline") 
 
     @outline_colour.setter
     def outline_colour(self, value):
-        self.canvas.itemconfigure(self.component, outline=value)
+        render.renderer().itemconfigure(self.canvas, self.component, outline=value)
+
+class Components(dict):
+    """
+        The components of a CanvasWidget by name. The canvas items of a component that is added are put in the group
+        of the widget (and of the widgets it is in), those of a component that is replaced or removed are taken out
+        (see CanvasWidget.group).
+    """
+
+    def __init__(self, widget, components={}):
+        super(Components, self).__init__()
+        self.widget = widget
+        self.update(components)
+
+    def __setitem__(self, name, component):
+        old = self.get(name)
+        super(Components, self).__setitem__(name, component)
+        if old is not component:
+            if old is not None:
+                self.widget.ungroup(old)
+            self.widget.regroup(component)
+
+    def __delitem__(self, name):
+        self.widget.ungroup(self[name])
+        super(Components, self).__delitem__(name)
+
+    def pop(self, name, *default):
+        if name in self:
+            self.widget.ungroup(self[name])
+        return super(Components, self).pop(name, *default)
+
+    def update(self, *args, **kwargs):
+        for name, component in dict(*args, **kwargs).items():
+            self[name] = component
 
 class CanvasWidget(BaseComponent):
 
@@ -528,25 +731,118 @@ class CanvasWidget(BaseComponent):
             self.layout_manager = layout_manager
             self.layout_manager.component = self
 
-        self.components = dict(**components)
+        self.__group = "group{0}".format(id(self))
+        self.__grouped = set() # items that have the group tag
+        self.components = Components(self, components)
         
         self.components['background'] = BoxComponent(self.canvas, x=x,y=y,width=width,height=height, colour=background_colour,
                                                          outline_colour=outline_colour, outline_thickness=outline_thickness)
         self.__debug = None
 
+    def canvas_items(self):
+        for c in self.components.values():
+            yield from c.canvas_items()
+
+    @property
+    def group(self):
+        """ A canvas tag of every item in the widget, used to transform them all with a single tk call. """
+        return self.__group
+
+    def __widgets(self):
+        widget = self
+        while widget is not None:
+            yield widget
+            widget = widget.parent
+
+    def regroup(self, component):
+        """ Put the canvas items of a component that has been added to the widget in its group (see Components). """
+        component.parent = self
+        items = set(component.canvas_items())
+        tag = component.item_tag # the items of a widget are tagged with a single call
+        for widget in self.__widgets():
+            if tag is not None:
+                self.canvas.addtag_withtag(widget.group, tag)
+            widget.__grouped |= items
+
+    def ungroup(self, component):
+        """ Take the canvas items of a component that is no longer in the widget out of its group (see Components). """
+        if component.parent is self:
+            component.parent = None
+        items = set(component.canvas_items())
+        tag = component.item_tag
+        for widget in self.__widgets():
+            if tag is not None:
+                self.canvas.dtag(tag, widget.group)
+            widget.__grouped -= items
+
+    def replace_item(self, old, new):
+        """ A component in the widget has replaced its canvas item, the new item has the tags of the old one (see PolyComponent.rotate). """
+        for widget in self.__widgets():
+            widget.__grouped.discard(old)
+            widget.__grouped.add(new)
+
+    def move_group(self, dx, dy):
+        """ Move every item in the widget, the components are not updated (see move). """
+        render.renderer().move_group(self.canvas, self.group, self.__grouped, dx, dy)
+
+    def scale_group(self, x0, y0, sx, sy):
+        """ Scale every item in the widget about (x0, y0), the components are not updated (see transformed). """
+        render.renderer().scale(self.canvas, self.group, self.__grouped, x0, y0, sx, sy)
+
+    @property
+    def proportional(self):
+        """ Whether everything in the widget scales with it (see transformed). """
+        return self.layout_manager.proportional and \
+            all(c.proportional for c in self.components.values() if isinstance(c, CanvasWidget))
+
+    def transform_content(self, sx, sy, dx, dy):
+        # a proportional layout is the same as scaling everything in the widget (see resize)
+        self.padding = (self.padding[0] * sx, self.padding[1] * sy)
+        self.layout_manager.scale(sx, sy)
+        for c in self.components.values():
+            c.transformed(sx, sy, dx, dy)
+
     @property
     def tag(self):
         return self.components['background']
 
-    def front(self):
-        #TODO does not preserve ordering...
-        for c in self.components.values():
-            self.canvas.tag_raise(c)
+    @property
+    def item_tag(self):
+        return self.group
 
-    def back(self):
-        #TODO does not preserve ordering...
+    def show(self):
+        self.hidden = False
+        if self.parent_hidden:
+            return
+        if self.__all_shown(): # nothing in the widget is hidden by itself, show every item with a single tk call
+            render.renderer().configure_group(self.canvas, self.group, self.__grouped, state='normal')
+        else:
+            self.__reveal()
+
+    def __all_shown(self):
+        return all(not c.hidden and (not isinstance(c, CanvasWidget) or c.__all_shown()) for c in self.components.values())
+
+    def __reveal(self): # show the components that are not hidden by themselves
         for c in self.components.values():
-            self.canvas.tag_lower(c)
+            if c.hidden:
+                continue
+            if isinstance(c, CanvasWidget):
+                if c.__all_shown():
+                    render.renderer().configure_group(c.canvas, c.group, c.__grouped, state='normal')
+                else:
+                    c.__reveal()
+            else:
+                c.show()
+
+    def hide(self):
+        self.hidden = True
+        render.renderer().configure_group(self.canvas, self.group, self.__grouped, state='hidden')
+
+    def delete(self):
+        items = set(self.__grouped)
+        render.renderer().delete(self.canvas, self.group, items)
+        for widget in self.__widgets():
+            widget.__grouped -= items
 
     def bind(self, event):
         BaseComponent.__bind__[event][self.components['background'].tag] = self
@@ -580,26 +876,40 @@ class CanvasWidget(BaseComponent):
         self.background.outline_colour = value
         
     def move(self, dx, dy):
-        for component in self.components:
-            c = self.components[component]
-            c.position = (c.x + dx, c.y + dy)
+        # every item moves with a single tk call (see group), the components only update their position
+        self.move_group(dx, dy)
+        for c in self.components.values():
+            c.moved(dx, dy)
+
+    def moved(self, dx, dy):
+        for c in self.components.values():
+            c.moved(dx, dy)
+        super(CanvasWidget, self).moved(dx, dy)
+
+    def layout(self):
+        """ Solve the layout of this widget (see SimpleLayoutManager) and then of the widgets in it. """
+        self.layout_manager.layout()
+        for c in self.components.values():
+            if isinstance(c, CanvasWidget):
+                c.layout()
 
     def resize(self, dw, dh):
         pw, ph = self.width - dw, self.height - dh
 
         sw, sh = self.width / pw, self.height / ph
         #print(self, "scale:", sw, sh, "from:", pw,ph, "to:", self.width, self.height)
-        for c in self.components.values(): #scale each widget
-            c.size = (c.width * sw, c.height * sh)
-           
-            c.x = self.x + (c.x - self.x) * sw
-            c.y = self.y + (c.y - self.y) * sh
+        # padding scales with the widget, as does everything in it that is not laid out (about the old position, see set_geometry)
+        self.padding = (self.padding[0] * sw, self.padding[1] * sh)
+        self.layout_manager.layout(scale=(sw, sh))
 
         #x1,y1,_,_ = self.canvas.coords(self.components['background'].component)
         #self.canvas.coords(self.components['background'].component, x1, y1, x1 + width, y1 + height)
  
 
     def debug(self):
-        self.__debug = SimpleComponent(self.canvas, self.canvas.create_rectangle(self.x, self.y, self.x+self.width, self.y+self.height, width=3, outline='green'))
+        coords = (self.x, self.y, self.x+self.width, self.y+self.height)
+        item = self.canvas.create_rectangle(*coords, width=3, outline='green')
+        render.renderer().created(self.canvas, item, coords, width=3, outline='green')
+        self.__debug = SimpleComponent(self.canvas, item)
 
         
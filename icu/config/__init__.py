@@ -166,6 +166,12 @@ eyetracker_options = dict(
     calibrate           = Option('eyetracker', is_type(bool)),          # calibrate the eye-tracker
     sample_rate         = Option('eyetracker', is_type(int)),           # sample rate for the eye-tracker (if configurable on the device)
     stub                = Option('eyetracker', is_type(bool)),          # use the mouse as a stub for an eye tracking device, functions exactly as an eyetracker (useful for testing) 
+    replay              = Option('eyetracker', is_type(str)),           # replay recorded gaze (an event log or Tobii export) instead of using a device
+    speed               = Option('eyetracker', is_type(int, float)),    # replay speed relative to the recording (0 to replay as fast as possible)
+    display_rate        = Option('eyetracker', is_type(int, float)),    # maximum number of gaze samples per second that are sent to the overlay (about the display refresh rate)
+    min_displacement    = Option('eyetracker', is_type(int, float)),    # gaze samples that move less than this (pixels) are not sent to the overlay
+    log_raw             = Option('eyetracker', is_type(bool)),          # record every (unfiltered) gaze sample in the event log
+    fixation            = Option('eyetracker', is_type(bool)),          # emit fixation start/end events (I-VT fixation filter) rather than labelling every sample as gaze/saccade
 )
 
 options = dict(
@@ -191,6 +197,7 @@ options = dict(
             screen_min_size        = Option('main', is_coord()),        # minimum window size
             screen_max_size        = Option('main', is_coord()),        # maximum window size
             background_colour      = Option('main', is_type(str)),      #cosmetic, window background colour
+            frame_rate             = Option('main', is_type(int, float)), # maximum number of times per second the canvas is updated (0 to update immediately)
             
             task            = Option('main', validate_options('task')), 
             system          = Option('task', is_type(bool)),            # enable/disable tracking task
@@ -205,6 +212,7 @@ options = dict(
             eyetracker      = Option('input', validate_options('eyetracker', _options=eyetracker_options)),
 
             shutdown          = Option('main', is_type(int, float)),        # time after which to stop the system (-1 to never stop)
+            event_coalesce    = Option('main', is_type(bool)),              # merge superseding events (burn, transfer, place) that are dispatched in the same tick
 
             overlay             = Option('main',    validate_options('overlay')),
             enable              = Option('overlay', is_type(bool)),         # enable/disable overlay (highlighting, arrows etc)
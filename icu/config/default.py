@@ -23,7 +23,9 @@ def default_config_screen():
                 screen_resizable = True,                              # ICU window resizable ? 
                 screen_aspect = None,                                 # ICU window aspect ratio (if fixed)
                 background_colour = 'grey',                           # ICU window background colour
-                shutdown = -1)                                        # system shutdown after x/seconds (-1 = never)
+                frame_rate = 60,                                      # canvas updates are written at most this many times per second (0 = immediately)
+                shutdown = -1,                                        # system shutdown after x/seconds (-1 = never)
+                event_coalesce = False)                               # merge superseding events dispatched in the same tick (burn, transfer, place)
 
 def default_task_options():                                           # turn on/off specific tasks
     return dict(system = True,                                      
@@ -105,7 +107,10 @@ def default_input():
                 "stub" : True,
                 "enabled" : True,
                 "sample_rate" : 100,
-                "calibrate" : False
+                "calibrate" : False,
+                "fixation" : False,
+                "display_rate" : 60,
+                "min_displacement" : 1
             }}
 
 
@@ -20,6 +20,19 @@ EVENT_LABEL_FAIL = 'fail'
 EVENT_LABEL_TRANSFER = 'transfer'
 EVENT_LABEL_BURN = 'burn'
 EVENT_LABEL_KEY = 'key'
+EVENT_LABEL_PLACE = 'place'
+EVENT_LABEL_CHANGE = 'change'
+EVENT_LABEL_FIXATION = 'fixation'
+EVENT_LABEL_GAZE = 'gaze'
+EVENT_LABEL_SACCADE = 'saccade'
+EVENT_LABEL_FOCUS = 'focus'
+
+# labels, sources and destinations of events are interned and stored as integer codes (see event.Event), 
+# these symbols always have the same code (their index), others are given codes as they are first seen. 
+EVENT_SYMBOLS = ('Global', EVENT_LABEL_CHANGE, EVENT_LABEL_CLICK, EVENT_LABEL_SLIDE, EVENT_LABEL_SWITCH, 
+                 EVENT_LABEL_HIGHTLIGHT, EVENT_LABEL_MOVE, EVENT_LABEL_REPAIR, EVENT_LABEL_FAIL, EVENT_LABEL_TRANSFER, 
+                 EVENT_LABEL_BURN, EVENT_LABEL_KEY, EVENT_LABEL_PLACE, EVENT_LABEL_GAZE, EVENT_LABEL_SACCADE, 'fuel', 'system',
+                 EVENT_LABEL_FIXATION, EVENT_LABEL_FOCUS)
 
 # GENERAL
 
@@ -1,22 +1,57 @@
-import copy
+from sys import version_info, intern
 
-from sys import version_info
-
-from types import SimpleNamespace
+from types import MappingProxyType
 from json import dumps
-from multiprocessing import Queue
-from time import time
+from time import time, monotonic, perf_counter, sleep as _sleep
+from heapq import heappush, heappop
+from itertools import count
+from threading import Lock, Thread, get_ident
+from collections import deque
+from queue import Empty
+from operator import itemgetter
+import os
+import math
+import tkinter as tk
+import asyncio
+
+from .transport import get_transport
+from .constants import EVENT_LABEL_BURN, EVENT_LABEL_TRANSFER, EVENT_LABEL_PLACE, EVENT_LABEL_GAZE, EVENT_LABEL_SACCADE
+from .constants import EVENT_SYMBOLS
 
 global finish
 finish = False
 
+# clock used to timestamp events, replaced by a virtual clock when running headless (see VirtualSchedular)
+clock = time
+
+def now():
+    return clock()
+
 # create unique event ids (ids do not reflect time)
-EVENT_NAME = 0
-def next_name():
-    global EVENT_NAME
-    EVENT_NAME += 1
-    return str(EVENT_NAME)
+next_id = count(1).__next__
+
+# interned event symbols (labels, sources, destinations) and their codes, see constants.EVENT_SYMBOLS
+SYMBOLS = [intern(symbol) for symbol in EVENT_SYMBOLS]
+SYMBOL_CODES = {symbol:code for code, symbol in enumerate(SYMBOLS)}
+_symbol_lock = Lock()
+
+def symbol_code(symbol):
+    """ Get the code of a symbol (str), symbols that have not been seen before are interned and given a new code. """
+    code = SYMBOL_CODES.get(symbol)
+    if code is None:
+        with _symbol_lock:
+            code = SYMBOL_CODES.get(symbol)
+            if code is None:
+                code = len(SYMBOLS)
+                SYMBOLS.append(intern(symbol))
+                SYMBOL_CODES[SYMBOLS[code]] = code
+    return code
+
+def _encode(value): # symbols are stored as codes, anything else (e.g. a list of destinations) is stored as is
+    return symbol_code(value) if value.__class__ is str else value
 
+def _decode(value):
+    return SYMBOLS[value] if value.__class__ is int else value
 
 
 class etuple(tuple):
@@ -35,33 +70,162 @@ class event_property(property):
         nvalue = self.__get__(obj)
         obj.source("Global", label="change", attr=self.fget.__name__, value=nvalue, cause=cause)
 
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+def _label_property(i):
+    return property(lambda self: _decode(tuple.__getitem__(self, i)))
+
+class EventData(tuple):
+    """
+        Read-only event payload, values are accessed as attributes (e.g. event.data.label). 
+
+        The payload is stored as a tuple of values, each distinct set of keys has its own EventData subclass 
+        (see EventData.layout) with properties for the keys. The label (if present) is stored as a symbol code 
+        (see symbol_code). Mutable (list/set) values are frozen on creation, nested dicts are not.
+    """
+    __slots__ = ()
+
+    _keys = ()
+    _index = {}
+    _label = None # index of the label value
+
+    __layouts__ = {}
+
+    @staticmethod
+    def layout(keys):
+        layout = EventData.__layouts__.get(keys)
+        if layout is None:
+            keys = tuple(intern(k) for k in keys)
+            index = {k:i for i,k in enumerate(keys)}
+            attrs = {k:property(itemgetter(i)) for k,i in index.items()}
+            if 'label' in index:
+                attrs['label'] = _label_property(index['label'])
+            attrs.update(__slots__=(), _keys=keys, _index=index, _label=index.get('label'))
+            layout = EventData.__layouts__.setdefault(keys, type(EventData.__name__, (EventData,), attrs))
+        return layout
+
+    @staticmethod
+    def create(data):
+        layout = EventData.layout(tuple(data))
+        values = [_freeze(v) for v in data.values()]
+        if layout._label is not None:
+            values[layout._label] = _encode(values[layout._label])
+        return layout(values)
+
+    def _data(self):
+        data = dict(zip(self._keys, tuple.__iter__(self)))
+        if self._label is not None:
+            data['label'] = _decode(data['label'])
+        return data
+
+    @property
+    def __dict__(self):
+        return MappingProxyType(EventData._data(self))
+
+    def __contains__(self, attr):
+        return attr in self._index
+
+    def get(self, attr, default=None):
+        return getattr(self, attr) if attr in self._index else default
+
+    def items(self):
+        return EventData._data(self).items()
+
+    def __reduce__(self):
+        return (dict, (EventData._data(self),))
+
+    def __str__(self):
+        return str(EventData._data(self))
+
+    def __repr__(self):
+        return repr(EventData._data(self))
+
+def _event(id, src, dst, timestamp, data): # see Event.__reduce__
+    event = Event.__new__(Event)
+    Event._init(event, id, _encode(src), _encode(dst), timestamp, EventData.create(data))
+    return event
+
 class Event:
+    """
+        An immutable event. Events are shared (never copied) between sinks, loggers and external processes, 
+        use with_dst to send the same event to a different destination.
+
+        Events are stored compactly: an integer id, src/dst as symbol codes (see symbol_code) and the payload 
+        as a tuple of values (see EventData).
+    """
+    __slots__ = ('id', 'timestamp', '_src', '_dst', 'data')
 
     def __init__(self, src, dst, timestamp=None, **data):
-        super(Event, self).__init__()
-        self.name = next_name()
-        self.dst = dst
-        self.src = src
-        self.data = SimpleNamespace(**data)
-        self.timestamp = timestamp
         if timestamp is None:
-            self.timestamp = time()
+            timestamp = clock()
+        Event._init(self, next_id(), _encode(src), _encode(dst), timestamp, EventData.create(data))
+
+    def _init(self, id, src, dst, timestamp, data):
+        setattr = object.__setattr__
+        setattr(self, 'id', id)
+        setattr(self, 'timestamp', timestamp)
+        setattr(self, '_src', src)
+        setattr(self, '_dst', dst)
+        setattr(self, 'data', data)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("Event is immutable, see Event.with_dst.")
+
+    def __delattr__(self, attr):
+        raise AttributeError("Event is immutable.")
+
+    @property
+    def name(self):
+        return str(self.id)
+
+    @property
+    def src(self):
+        return _decode(self._src)
+
+    @property
+    def dst(self):
+        return _decode(self._dst)
+
+    @property
+    def label(self):
+        i = self.data._label
+        return None if i is None else _decode(tuple.__getitem__(self.data, i))
+
+    def with_dst(self, dst):
+        """ The same event (id, timestamp and data) sent to a different destination. """
+        event = Event.__new__(Event)
+        Event._init(event, self.id, self._src, _encode(dst), self.timestamp, self.data)
+        return event
+
+    def __reduce__(self): # symbol codes are local to a process, send symbols
+        return (_event, (self.id, self.src, self.dst, self.timestamp, EventData._data(self.data)))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
-        return "{0}:{1} - ({2}->{3}): {4}".format(self.name, self.timestamp, self.src, self.dst, self.data.__dict__)
+        return "{0}:{1} - ({2}->{3}): {4}".format(self.id, self.timestamp, self.src, self.dst, EventData._data(self.data))
     
     def __repr__(self):
         return str(self)
 
 
     def to_tuple(self):
-        return (self.timestamp, self.name, (self.src, self.dst), copy.deepcopy(self.data.__dict__))
+        return (self.timestamp, self.name, (self.src, self.dst), EventData._data(self.data))
 
     def serialise(self) -> dict:
         return {
             "src": self.src,
             "dst": self.dst,
-            "data": self.data.__dict__,
+            "data": EventData._data(self.data),
             "name": self.name,
             "timestamp": self.timestamp,
         }
@@ -77,13 +241,14 @@ class Event:
 class ExternalEventSource: 
     """ 
         A thread-safe event source to be used externally as a
-        mechanism for sending events to the ICU system.
+        mechanism for sending events to the ICU system. Events are sent using a multiprocessing 
+        Queue by default, use transport='shared' for high rate events (see transport.SharedMemoryTransport).
     """
     __NAME = 0
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, transport=None, **kwargs):
         super(ExternalEventSource, self).__init__(*args, **kwargs)
-        self.__buffer = Queue()
+        self.__buffer = get_transport(transport, overflow='block')
         ExternalEventSource.__NAME += 1
         self.__name =  "{0}:{1}".format(type(self).__name__, ExternalEventSource.__NAME)
     
@@ -120,26 +285,126 @@ class ExternalEventSource:
     def __repr__(self):
         return str(self)
 
+class EventFilter:
+    """
+        Matches events by src, dst, label and attr (event.data.attr, e.g. for 'change' events). Each may be a single value 
+        or a collection of values (any of which may match), None matches anything. 
+    """
+
+    FIELDS = ('label', 'dst', 'src', 'attr') # in order of preference when indexing (see GlobalEventCallback)
+
+    def __init__(self, src=None, dst=None, label=None, attr=None):
+        super(EventFilter, self).__init__()
+        values = dict(src=src, dst=dst, label=label, attr=attr)
+        self.values = {k:EventFilter.__values(v) for k,v in values.items() if v is not None}
+
+    @staticmethod
+    def __values(value):
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return frozenset(value)
+        return frozenset([value])
+
+    @staticmethod
+    def get(event, field):
+        if field == 'attr':
+            return getattr(event.data, field, None)
+        return getattr(event, field) # src, dst, label
+
+    def __call__(self, event):
+        for field, values in self.values.items():
+            if EventFilter.get(event, field) not in values:
+                return False
+        return True
+
+    def __str__(self):
+        return "EventFilter({0})".format(", ".join("{0}={1}".format(k, set(v)) for k,v in self.values.items()))
+
+    def __repr__(self):
+        return str(self)
+
 class ExternalEventSink:
     """
         A thread-safe event sink to be used externally as a 
-        mechanism for receiving events from the ICU system.
+        mechanism for receiving events from the ICU system. By default the sink receives 
+        all events, use subscribe to only receive events that match given filters. Events are 
+        sent using a multiprocessing Queue by default, use transport='shared' for high rate events 
+        (see transport.SharedMemoryTransport).
     """
     __NAME = 0
 
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, filters=None, transport=None, **kwargs):
         super(ExternalEventSink, self).__init__(*args, **kwargs)
-        self.__buffer = Queue()
+        self.__buffer = get_transport(transport)
         ExternalEventSink.__NAME += 1
         self.__name =  "{0}:{1}".format(type(self).__name__, ExternalEventSink.__NAME)
+        self.__filters = []
+        for f in (filters or []):
+            self.subscribe(**f) if isinstance(f, dict) else self.__filters.append(f)
+
+    def subscribe(self, src=None, dst=None, label=None, attr=None):
+        """
+            Receive events that match the given filter (see EventFilter). Filters must be added before the 
+            sink is added to ICU (see icu.run/icu.start), the sink receives events that match any of its filters.
+
+        Args:
+            src (str, list, optional): source name(s). Defaults to None (any).
+            dst (str, list, optional): destination name(s). Defaults to None (any).
+            label (str, list, optional): event label(s). Defaults to None (any).
+            attr (str, list, optional): changed attribute(s) for 'change' events. Defaults to None (any).
+        """
+        self.__filters.append(EventFilter(src=src, dst=dst, label=label, attr=attr))
+
+    @property
+    def filters(self):
+        return list(self.__filters)
     
-    def get(self):
+    def get(self, block=True, timeout=None):
         '''
             Pop from event buffer.
         '''
-        event = self.__buffer.get()
+        event = self.__buffer.get(block=block, timeout=timeout)
         return event
+
+    def get_many(self, max_n=None, timeout=0.):
+        """
+            Pop all available events from the event buffer (at most max_n). 
+
+        Args:
+            max_n (int, optional): maximum number of events. Defaults to None (no maximum).
+            timeout (float, optional): seconds to wait for the first event, None waits until there is an event. Defaults to 0 (do not wait).
+
+        Returns:
+            list: events, empty if there were none before the timeout.
+        """
+        try:
+            return self.__buffer.get_many(max_n=max_n, block=timeout is None or timeout > 0, timeout=timeout)
+        except Empty:
+            return []
+
+    def drain(self):
+        """ Pop all available events from the event buffer without waiting. """
+        return self.get_many()
+
+    def __iter__(self):
+        """ Iterate over (and pop) the events that are available, without waiting. """
+        events = self.get_many()
+        while events:
+            yield from events
+            events = self.get_many()
+
+    async def aget(self, poll=0.001):
+        """
+            Pop from event buffer (for use with asyncio), waits for an event without blocking the event loop.
+
+        Args:
+            poll (float, optional): seconds between checks for an event. Defaults to 0.001.
+        """
+        while True:
+            try:
+                return self.__buffer.get(block=False)
+            except Empty:
+                await asyncio.sleep(poll)
         
     def full(self):
         return self.__buffer.full()
@@ -166,13 +431,44 @@ class ExternalEventSink:
 #EVENT_SINKS = {}
 #EVENT_SOURCES = {}
     
+class NullLogger:
+
+    def log(self, event):
+        pass
+
+    def log_many(self, events):
+        pass
+
+    def close(self):
+        pass
+
+def _coalesce_value(e1, e2): # e.g. two burn events, burn the total
+    data = dict(e2.data.items(), value=e1.data.value + e2.data.value)
+    return Event(e2.src, e2.dst, timestamp=e2.timestamp, **data)
+
+def _coalesce_latest(e1, e2): # e.g. two place events, only the last matters
+    return e2
+
+# event label -> (key, merge), events in a batch with the same key are merged (see GlobalEventCallback.coalesce)
+COALESCE = {
+    EVENT_LABEL_BURN :      (lambda e: (e.src, e.dst, EVENT_LABEL_BURN), _coalesce_value),
+    EVENT_LABEL_TRANSFER :  (lambda e: (e.src, e.dst, EVENT_LABEL_TRANSFER), _coalesce_value),
+    EVENT_LABEL_PLACE :     (lambda e: (e.dst, EVENT_LABEL_PLACE), _coalesce_latest),
+    EVENT_LABEL_GAZE :      (lambda e: (e.dst, EVENT_LABEL_GAZE), _coalesce_latest), # gaze samples (of either label)
+    EVENT_LABEL_SACCADE :   (lambda e: (e.dst, EVENT_LABEL_GAZE), _coalesce_latest),
+}
+
 class GlobalEventCallback:
 
-    def __init__(self, logger):
+    def __init__(self, logger, coalesce=False):
         if logger is None:
-            self.logger = lambda _: None
+            self.logger = NullLogger()
         else:
             self.logger = logger
+        log_many = getattr(self.logger, 'log_many', None)
+        if log_many is None:
+            log_many = lambda events: [self.logger.log(event) for event in events]
+        self.__log_many = log_many
 
         self.external_sinks = {}
         self.external_sources = {}
@@ -181,14 +477,22 @@ class GlobalEventCallback:
         self.sources = {}
         self.__closed = False
 
+        self.__pending = deque() # events posted since the last flush (see post)
+        self.__external_pending = deque() # events read from external sources (see schedule_external)
+        self.__readers = None # external source reader threads, started by schedule_external
+        self.__index_external()
+        self.coalesce = COALESCE if coalesce is True else dict(coalesce or {})
+
     def close(self):
+        self.__closed = True
+        for reader in (self.__readers or {}).values():
+            reader.join(timeout=1) # readers must stop before the sources are closed
         for sink in self.external_sinks.values():
             sink.close()
         for source in self.external_sources.values():
             source.close()
         if self.logger is not None:
             self.logger.close()
-        self.__closed = True
 
     @property
     def is_closed(self):
@@ -205,9 +509,100 @@ class GlobalEventCallback:
         for event in events:
             self._trigger(event)
 
-    def __sink_external(self, event): # TODO this could be changed at some point... a more advanced event system is needed        
+    def post(self, *events):
+        """
+            Queue events to be dispatched in the next flush (which happens once per schedular tick), 
+            unlike trigger events are not dispatched immediately.
+        """
+        pending = self.__pending
+        for event in events:
+            if event is not None:
+                pending.append(event)
+
+    def log(self, *events):
+        """ Record events in the log without dispatching them, thread safe if the logger is (see log.BufferedLogger). """
+        self.__log_many(events)
+
+    @property
+    def has_pending(self):
+        return len(self.__pending) > 0
+
+    def flush(self):
+        """ Dispatch all posted events as a batch, events that are posted while dispatching are dispatched in a following batch. """
+        pending = self.__pending
+        while pending:
+            batch = [pending.popleft() for _ in range(len(pending))]
+            if self.coalesce:
+                batch = self.__coalesce(batch)
+            self.__dispatch(batch)
+
+    def __dispatch(self, batch):
+        sinks = self.sinks
+        route_external = self.__route_external
+        external = {} # external sink -> events, each sink is sent the batch at once
+        for event in batch:
+            sink = sinks.get(event.dst)
+            if sink is not None:
+                sink.sink(event)
+            for sink in route_external(event):
+                external.setdefault(sink, []).append(event)
+        for sink, events in external.items():
+            sink._ExternalEventSink__buffer.put_many(events) # events are immutable, no need to copy
+        self.__log_many(batch)
+
+    def __coalesce(self, batch):
+        # merge events in the batch that supersede each other, an event is only merged with an earlier one
+        # if no other (unmerged) event has been sent to the same destination in between.
+        rules = self.coalesce
+        result, index, barrier = [], {}, {}
+        for event in batch:
+            rule = rules.get(event.label)
+            if rule is None:
+                barrier[event.dst] = len(result)
+            else:
+                key, merge = rule[0](event), rule[1]
+                i = index.get(key)
+                if i is not None and i >= barrier.get(event.dst, -1) and result[i] is not None:
+                    event = merge(result[i], event)
+                    result[i] = None
+                index[key] = len(result)
+            result.append(event)
+        return [event for event in result if event is not None]
+
+    def __sink_external(self, event):
+        for sink in self.__route_external(event):
+            sink._ExternalEventSink__buffer.put(event) # events are immutable, no need to copy
+
+    def __route_external(self, event):
+        if not self.external_sinks:
+            return ()
+        sinks = list(self.__external_all)
+        index = self.__external_index
+        for field in EventFilter.FIELDS:
+            candidates = index[field].get(EventFilter.get(event, field))
+            if candidates:
+                for sink, f in candidates:
+                    if sink not in sinks and f(event):
+                        sinks.append(sink)
+        return sinks
+
+    def __index_external(self):
+        # index sink filters by a single field (see EventFilter.FIELDS) so that each event is only checked against 
+        # filters that could match it, sinks without filters receive everything.
+        self.__external_all = []
+        self.__external_index = {field:{} for field in EventFilter.FIELDS}
         for sink in self.external_sinks.values():
-            sink._ExternalEventSink__buffer.put(copy.deepcopy(event))
+            if not sink.filters:
+                self.__external_all.append(sink)
+            for f in sink.filters:
+                if not f.values:
+                    self.__external_all.append(sink)
+                    break
+            else:
+                for f in sink.filters:
+                    field = next(field for field in EventFilter.FIELDS if field in f.values)
+                    for value in f.values[field]:
+                        self.__external_index[field].setdefault(value, []).append((sink, f))
 
     def register_sink(self, name, sink):
         self.sinks[name] = sink
@@ -218,45 +613,80 @@ class GlobalEventCallback:
     def register_external_source(self, name, source):
         assert isinstance(source, ExternalEventSource)
         self.external_sources[name] = source
+        if self.__readers is not None:
+            self.__start_reader(source)
 
     def register_external_sink(self, name, sink):
         assert isinstance(sink, ExternalEventSink)
         self.external_sinks[name] = sink
+        self.__index_external()
 
     def schedule_external(self, sleep=50):
-        def _event_iterator(source):
-            while not source.empty():
-                event =  source._ExternalEventSource__buffer.get()
-                if isinstance(event.dst, (list, tuple)): #if multiple destinations
-                    for dst in event.dst:
-                        e = copy.deepcopy(event) #not efficient... oh well
-                        e.dst = dst
-                        yield e
-                else:
-                    yield event
+        """
+            Start receiving events from external sources. Each source is read by a background thread that hands events 
+            to the schedular as soon as they arrive (see Schedular.call_threadsafe), received events are also checked 
+            every sleep milliseconds in case the schedular cannot be woken from another thread.
 
-        def _trigger():
-            for source in self.external_sources.values():
-                for event in _event_iterator(source):
-                    #print(" -- EXTERNAL:", event)
-                    if event is not None and event.dst in self.sinks:
-                        self.sinks[event.dst].sink(event)
-                        if self.logger is not None:
-                            #print("LOG EVENT", event)
-                            self.logger.log(event)
+        Args:
+            sleep (int, optional): fallback poll interval in milliseconds. Defaults to 50.
+        """
+        self.__readers = {}
+        for source in self.external_sources.values():
+            self.__start_reader(source)
 
+        def _trigger():
+            self.__ingest_external()
             event_scheduler.after(sleep, _trigger)
 
         event_scheduler.after(sleep, _trigger)
 
+    def __start_reader(self, source):
+        reader = Thread(target=self.__read_external, args=(source,), daemon=True, name="reader:" + source.name)
+        self.__readers[source.name] = reader
+        reader.start()
+
+    def __read_external(self, source):
+        buffer = source._ExternalEventSource__buffer
+        pending = self.__external_pending
+        while not self.__closed:
+            try:
+                events = buffer.get_many(block=True, timeout=0.1) # timeout to check for close
+            except Empty:
+                continue
+            except (OSError, ValueError, EOFError):
+                break # the source was closed
+            pending.extend(events)
+            event_scheduler.call_threadsafe(self.__ingest_external)
+
+    def __ingest_external(self):
+        pending = self.__external_pending
+        while pending:
+            event = pending.popleft()
+            if isinstance(event.dst, (list, tuple)): #if multiple destinations
+                events = [event.with_dst(dst) for dst in event.dst]
+            else:
+                events = [event]
+            for event in events:
+                #print(" -- EXTERNAL:", event)
+                if event.dst in self.sinks:
+                    self.sinks[event.dst].sink(event)
+                    self.logger.log(event)
+
 # ===  GLOBAL === #
 GLOBAL_EVENT_CALLBACK = None
 global event_scheduler
 event_scheduler = None
 
-def initialise_global_event_callback(logger=None):
+def initialise_global_event_callback(logger=None, coalesce=False):
     global GLOBAL_EVENT_CALLBACK
-    GLOBAL_EVENT_CALLBACK = GlobalEventCallback(logger)
+    GLOBAL_EVENT_CALLBACK = GlobalEventCallback(logger, coalesce=coalesce)
+
+def log(*events):
+    '''
+        Record events in the event log without dispatching them to any sink, e.g. full rate 
+        samples that are only needed for analysis (see GlobalEventCallback.log).
+    '''
+    GLOBAL_EVENT_CALLBACK.log(*events)
 
 def get_event_sources():
     return list(GLOBAL_EVENT_CALLBACK.sources.keys())
@@ -304,8 +734,8 @@ class EventCallback:
 
     def source(self, dst, timestamp=None, **data):
         e = Event(self.name, dst, timestamp=timestamp, **data)
-        global event_scheduler
-        event_scheduler.schedule(e, sleep=0)
+        GLOBAL_EVENT_CALLBACK.post(e)
+        event_scheduler.wake() # dispatched in the next schedular tick
 
     def sink(self, event): #override this method
         pass
@@ -335,53 +765,389 @@ class EGen:
         else:
             return e
 
-class TKSchedular: #might be better to detach events from the GUI? quick and dirty for now...
+class PeriodicClock:
+    """
+        Ticks at absolute deadlines (start + period, + period, ...), so the time taken to handle a tick (or to wake up
+        for it) does not delay the ticks that follow. The period (seconds) is a number or an iterable of periods (e.g. 
+        a repeating schedule), the clock ends when the iterable does. Ticks that are missed (a later deadline has also 
+        passed when a tick is handled) are either all run back to back (policy 'catchup') or skipped ('skip').
 
-    def __init__(self, tk_root):
-        self.tk_root = tk_root
+        Used by the schedular for repeating generators (see Schedular.schedule) and by threads that sample at a fixed 
+        rate (see wait).
+    """
+
+    POLICIES = ('catchup', 'skip')
+
+    def __init__(self, period, policy='catchup', time=perf_counter):
+        super(PeriodicClock, self).__init__()
+        if policy not in PeriodicClock.POLICIES:
+            raise ValueError("Invalid policy: {0}, must be one of {1}.".format(policy, PeriodicClock.POLICIES))
+        self.__periods = sleep_repeat_int(period) if isinstance(period, (int, float)) else iter(period)
+        self.policy = policy
+        self.time = time
+        self.deadline = None # next deadline, None if the clock has not started or has ended
+        self.started = None # time at which the clock started
+        self.ticks = 0 # ticks run
+        self.skipped = 0 # ticks skipped (policy 'skip')
+        self.lateness = 0. # of the last tick run (time it was run - its deadline), the last of a catchup is the least late
+        self.max_lateness = 0.
+        self.__total_lateness = 0.
+
+    def start(self, now=None):
+        """ Start the clock, the first tick is due one period after now. """
+        self.started = self.time() if now is None else now
+        self.deadline = self.started
+        self.__advance()
+
+    def __advance(self):
+        try:
+            self.deadline += next(self.__periods)
+        except StopIteration:
+            self.deadline = None
+
+    @property
+    def done(self):
+        return self.started is not None and self.deadline is None
+
+    def tick(self, now=None):
+        """ Number of ticks to run at the given time (0 if the next deadline has not passed), the clock advances past them. """
+        if now is None:
+            now = self.time()
+        n = 0
+        while self.deadline is not None and self.deadline <= now:
+            if n > 0 and self.policy == 'skip':
+                self.skipped += 1
+            else:
+                n += 1
+                self.ticks += 1
+                self.lateness = now - self.deadline
+                self.__total_lateness += self.lateness
+                self.max_lateness = max(self.max_lateness, self.lateness)
+            deadline = self.deadline
+            self.__advance()
+            if self.deadline == deadline:
+                break # a period of 0, tick again later
+        return n
+
+    def wait(self, sleep=_sleep):
+        """ Block until the next tick is due (the clock is started if it has not been), returns the number of ticks to run (see tick), 0 if the clock has ended. """
+        if self.started is None:
+            self.start()
+        while self.deadline is not None:
+            delay = self.deadline - self.time()
+            if delay > 0:
+                sleep(delay)
+            n = self.tick()
+            if n > 0:
+                return n
+        return 0
+
+    def stats(self):
+        """ Drift statistics: ticks run and skipped, the achieved rate (ticks per second) and the lateness of ticks (seconds). """
+        elapsed = 0. if self.started is None else self.time() - self.started
+        return dict(ticks=self.ticks, skipped=self.skipped, rate=self.ticks / elapsed if elapsed > 0 else 0.,
+                    mean_lateness=self.__total_lateness / self.ticks if self.ticks > 0 else 0., max_lateness=self.max_lateness)
+
+class ScheduleHandle:
+    """
+        Returned by Schedular.schedule/after, may be used to cancel or reschedule a callback (or a repeating generator).
+    """
 
-    def schedule(self, generator, sleep=0):
+    def __init__(self, schedular, fun, *args):
+        self.__schedular = schedular
+        self._entry = None # [due, order, handle] in the schedular queue (None if not queued)
+        self.clock = None # PeriodicClock of a repeating generator
+        self.cancelled = False
+        self.fun = fun
+        self.args = args
+
+    @property
+    def due(self):
+        """ Time (see Schedular.time) at which the callback will next run, None if it is not scheduled. """
+        return None if self._entry is None else self._entry[0]
+
+    @property
+    def active(self):
+        return self._entry is not None
+
+    def cancel(self):
+        self.cancelled = True
+        if self._entry is not None:
+            self._entry[2] = None # lazily removed from the queue
+            self._entry = None
+
+    def reschedule(self, sleep):
+        """ Run the callback sleep milliseconds from now (instead of when it was previously due). """
+        self.cancel()
+        self.cancelled = False
+        self.__schedular._push(self, sleep)
+        if self.clock is not None:
+            self.clock.deadline = self.due # a repeating generator continues from the new time
+
+    def __call__(self):
+        self.fun(*self.args)
+
+class Schedular:
+    """
+        Base class for event schedulars. All timed callbacks are kept in a single priority queue (ordered by due time),
+        subclasses decide how time passes and when run_due is called.
+    """
+
+    def __init__(self):
+        self._queue = []
+        self.__order = count() # break ties in insertion order (same as tk)
+        self.__lock = Lock() # the queue may be pushed to from other threads (e.g. the eyetracker)
+        self.__calls = deque() # callbacks from other threads (see call_threadsafe)
+        self.__thread = get_ident() # the thread that runs the schedular (e.g. the tk mainloop)
+        self.__closed = False
+
+    def time(self):
+        """ Current time (seconds) of the schedular. """
+        raise NotImplementedError()
+
+    def schedule(self, generator, sleep=0, policy='catchup'):
+        """
+            Schedule events.
+
+            Args:
+                generator (Event, generator): an event, or a generator of events (or tuples of events).
+                sleep (int, iterable, PeriodicClock): milliseconds until the event, or an iterable of milliseconds 
+                    between the events of a generator (e.g. a repeating schedule), or a PeriodicClock (in seconds). 
+                    Repeats are run at absolute deadlines (see PeriodicClock).
+                policy (str, optional): what to do with repeats that are missed (see PeriodicClock). Defaults to 'catchup'.
+        """
         if isinstance(sleep, float):
             sleep = int(sleep)
 
         if isinstance(generator, Event):
             assert isinstance(sleep, int)
-            self.after(sleep, GLOBAL_EVENT_CALLBACK.trigger, generator)
-            return
+            return self.after(sleep, GLOBAL_EVENT_CALLBACK.post, generator)
         
         generator = EGen(generator) # always yields (e1, ...)
 
         if isinstance(sleep, int):
-            self.after(sleep, GLOBAL_EVENT_CALLBACK.trigger, *next(generator))
-            return
+            return self.after(sleep, GLOBAL_EVENT_CALLBACK.post, *next(generator))
+
+        #repeated event - sleep is a generator (or iterable)
+        clock = sleep if isinstance(sleep, PeriodicClock) else PeriodicClock((s / 1000 for s in sleep), policy=policy)
+        clock.time = self.time # the clock is driven by the schedular (e.g. virtual time), as are its stats
+        clock.start(self.time())
+        if clock.done:
+            return None
+        handle = ScheduleHandle(self, self.__trigger_repeat)
+        handle.args = (handle, generator, clock)
+        handle.clock = clock
+        self._push_at(handle, clock.deadline)
+        return handle
+
+    def __trigger_repeat(self, handle, generator, clock):
+        for _ in range(clock.tick(self.time())):
+            try:
+                GLOBAL_EVENT_CALLBACK.post(*next(generator))
+            except StopIteration:
+                return
+        if not (handle.active or handle.cancelled or clock.done): # may have been rescheduled/cancelled while triggering
+            self._push_at(handle, max(clock.deadline, self.time()))
 
-        try:
-            #repeated event - sleep is a generator (or iterable)
-            self.after(next(sleep), self.__trigger_repeat, generator, sleep)
-        except StopIteration:
-            pass
+    def after(self, sleep, fun, *args):
+        handle = ScheduleHandle(self, fun, *args)
+        self._push(handle, sleep)
+        return handle
 
-    def __trigger_repeat(self, generator, sleep):
-        try:
-            GLOBAL_EVENT_CALLBACK.trigger(*next(generator))
-        except StopIteration:
+    def _push(self, handle, sleep):
+        self._push_at(handle, self.time() + sleep / 1000)
+
+    def _push_at(self, handle, due):
+        if self.__closed:
             return
+        entry = [due, next(self.__order), handle]
+        handle._entry = entry
+        with self.__lock:
+            heappush(self._queue, entry)
+        self._wake(entry[0])
+
+    def _wake(self, due):
+        """ Called when a callback is pushed that is due at the given time. """
+        pass
+
+    def wake(self):
+        """ Ensure a tick happens as soon as possible (e.g. to flush events that have been posted), from any thread. """
+        if get_ident() == self.__thread:
+            self._wake(self.time())
+        else:
+            self._notify() # e.g. a key release from a timer thread (see keyhandler), tk must not be called
+
+    def call_threadsafe(self, fun, *args):
+        """ Run a callback on the schedular as soon as possible, may be called from any thread. """
+        self.__calls.append((fun, args))
+        self._notify()
+
+    def _notify(self):
+        """ Called (from any thread) when call_threadsafe is used, callbacks are otherwise run on the next tick. """
+        pass
+
+    def next_due(self):
+        """ Time at which the next callback is due, None if nothing is scheduled. """
+        with self.__lock:
+            while self._queue and self._queue[0][2] is None:
+                heappop(self._queue) # cancelled
+            return self._queue[0][0] if self._queue else None
+
+    def run_due(self, now):
+        """ 
+            Run all callbacks that are due at (or before) the given time, including any that are scheduled while running. 
+            Events that are posted by the callbacks are then dispatched as a batch (see GlobalEventCallback.flush).
+        """
+        queue, calls = self._queue, self.__calls
+        while not self.__closed:
+            while calls:
+                fun, args = calls.popleft()
+                fun(*args)
+            with self.__lock:
+                due = queue and queue[0][0] <= now
+                handle = heappop(queue)[2] if due else None
+            if handle is not None:
+                handle._entry = None
+                handle()
+            elif not due:
+                if GLOBAL_EVENT_CALLBACK is None or not GLOBAL_EVENT_CALLBACK.has_pending:
+                    return
+                GLOBAL_EVENT_CALLBACK.flush()
+
+    def close(self):
+        self.__closed = True
+        with self.__lock:
+            self._queue.clear()
+
+    @property
+    def is_closed(self):
+        return self.__closed
+
+class TKSchedular(Schedular): #might be better to detach events from the GUI? quick and dirty for now...
+    """
+        Runs scheduled callbacks on the tk mainloop, a single tk after callback is armed for the earliest due time and
+        runs everything that is due when it fires.
+    """
+
+    def __init__(self, tk_root):
+        super(TKSchedular, self).__init__()
+        self.tk_root = tk_root
+        self.__armed = None # (due, tk after id)
+        self.__ticking = False
+        # other threads wake the mainloop by writing to a pipe (tk is not thread-safe), not available on windows
+        self.__pipe = None
+        if hasattr(tk_root, 'tk') and hasattr(tk_root.tk, 'createfilehandler'):
+            self.__pipe = os.pipe()
+            for fd in self.__pipe:
+                os.set_blocking(fd, False)
+            tk_root.tk.createfilehandler(self.__pipe[0], tk.READABLE, self.__notified)
+
+    def time(self):
+        return monotonic()
+
+    def _wake(self, due):
+        if self.__ticking:
+            return # the tick will run it (or arm for it)
+        armed = self.__armed
+        if armed is None or due < armed[0]:
+            self.__arm(due)
+
+    def __arm(self, due):
+        if self.__armed is not None:
+            self.tk_root.after_cancel(self.__armed[1])
+        delay = max(0, math.ceil((due - self.time()) * 1000))
+        self.__armed = (due, self.tk_root.after(delay, self.__tick))
+
+    def _notify(self):
+        if self.__pipe is not None:
+            try:
+                os.write(self.__pipe[1], b'\0')
+            except (BlockingIOError, OSError):
+                pass # already notified (or closed)
+
+    def __notified(self, fd, mask):
         try:
-            self.after(next(sleep), self.__trigger_repeat, generator, sleep)
-        except StopIteration:
+            while os.read(fd, 4096):
+                pass
+        except (BlockingIOError, OSError):
             pass
-
-    def after(self, sleep, fun, *args):
-        self.tk_root.after(int(sleep), fun, *args)
+        if not self.__ticking:
+            if self.__armed is not None:
+                self.tk_root.after_cancel(self.__armed[1])
+            self.__tick()
+
+    def __tick(self):
+        self.__armed = None
+        self.__ticking = True
+        try:
+            self.run_due(self.time())
+        finally:
+            self.__ticking = False
+            due = self.next_due()
+            if due is not None and not self.is_closed:
+                self.__arm(due)
 
     def close(self):
-        pass #TODO
+        super(TKSchedular, self).close()
+        if self.__armed is not None:
+            try:
+                self.tk_root.after_cancel(self.__armed[1])
+            except Exception:
+                pass # root may already be destroyed
+            self.__armed = None
+        if self.__pipe is not None:
+            try:
+                self.tk_root.tk.deletefilehandler(self.__pipe[0])
+            except Exception:
+                pass
+            for fd in self.__pipe:
+                os.close(fd)
+            self.__pipe = None
+
+class VirtualSchedular(Schedular):
+    """
+        Runs scheduled callbacks against a virtual clock, time only passes when run is called and jumps 
+        straight to the next due callback. Used to simulate ICU without a display (see icu.run(headless=True)).
+    """
+
+    def __init__(self, start=0.):
+        super(VirtualSchedular, self).__init__()
+        self.__time = start # seconds
+
+    def time(self):
+        return self.__time
+
+    def run(self, duration=None):
+        """ Run all callbacks that are due in the next duration milliseconds (or until there is nothing left to run).
+
+        Args:
+            duration (int, float, optional): virtual time to run for in milliseconds. Defaults to None (run until empty).
+        """
+        end = float('inf') if duration is None else self.__time + duration / 1000
+        self.run_due(self.__time) # anything posted before running
+        while not self.is_closed:
+            due = self.next_due()
+            if due is None or due > end:
+                break
+            self.__time = max(self.__time, due)
+            self.run_due(self.__time)
+        if not self.is_closed and duration is not None:
+            self.__time = end
 
 def tk_event_schedular(root):
-    global event_scheduler
+    global event_scheduler, clock
     event_scheduler = TKSchedular(root)
+    clock = time
+
+    GLOBAL_EVENT_CALLBACK.schedule_external()
+
+def virtual_event_schedular(start=0.):
+    global event_scheduler, clock
+    event_scheduler = VirtualSchedular(start=start)
+    clock = event_scheduler.time
 
     GLOBAL_EVENT_CALLBACK.schedule_external()
+    return event_scheduler
 
 def close():
     GLOBAL_EVENT_CALLBACK.close()
@@ -8,6 +8,8 @@
 import threading
 import traceback
 import math
+import csv
+import os
 from types import SimpleNamespace
 
 from collections import deque
@@ -15,9 +17,11 @@ from collections import deque
 from threading import Thread
 import random
 
-from time import sleep, time
+from time import time, perf_counter
 
 from .. import event
+from ..main_panel import Geometry
+from ..constants import EVENT_LABEL_FIXATION, EVENT_LABEL_GAZE
 
 from . import filter
 
@@ -39,24 +43,142 @@ class EyeTrackingError(Exception):
             self.__cause__ = cause
 
 
+def _valid(x, y):  # invalid (nan) coordinates are logged as None
+    return (x, y) if x == x and y == y else (None, None)
+
+
+class GazeChannel:
+    """
+    Hands gaze events from a tracker thread to the Tk thread without any Tcl calls on the tracker thread. Samples go
+    to a single slot (latest-value-wins, a sample that has not been delivered is replaced), events that must all be
+    delivered (e.g. fixation start/end) go to a bounded queue (the oldest are dropped when it is full). Events that
+    are only logged (see log) go to an unbounded queue, so that loggers are only written from the Tk thread. All are
+    drained on the event schedular (see event.Schedular.call_threadsafe), at most one drain is pending at a time.
+    """
+
+    def __init__(self, sink, maxlen=1024):
+        super(GazeChannel, self).__init__()
+        self.sink = sink  # called on the Tk thread with each event (dict)
+        self.latest = None
+        self.queue = deque(maxlen=maxlen)
+        self.logged = deque()  # events to log (see event.log)
+        self.dropped = 0  # events dropped from the (full) queue
+        self.replaced = 0  # samples replaced before they were delivered
+        self.__pending = False  # a drain has been requested
+        self.__lock = threading.Lock()  # guards latest and pending, which both threads swap
+
+    def put(self, e, latest=True):
+        """Put an event (from any thread), if latest the event replaces any undelivered sample."""
+        with self.__lock:
+            if latest:
+                if self.latest is not None:
+                    self.replaced += 1
+                self.latest = e
+            else:
+                if len(self.queue) == self.queue.maxlen:
+                    self.dropped += 1
+                self.queue.append(e)
+            request, self.__pending = not self.__pending, True
+        if request:
+            event.event_scheduler.call_threadsafe(self.drain)
+
+    def log(self, e):
+        """Log an event (from any thread) on the Tk thread, without delivering it."""
+        with self.__lock:
+            self.logged.append(e)
+            request, self.__pending = not self.__pending, True
+        if request:
+            event.event_scheduler.call_threadsafe(self.drain)
+
+    def drain(self):
+        """Deliver all events that have been put (on the Tk thread)."""
+        with self.__lock:
+            # anything put after this requests another drain
+            self.__pending = False
+            events = [self.queue.popleft() for _ in range(len(self.queue))]
+            logged = [self.logged.popleft() for _ in range(len(self.logged))]
+            latest, self.latest = self.latest, None
+        if logged:
+            event.log(*logged)
+        for e in events:
+            self.sink(e)
+        if latest is not None:
+            self.sink(latest)
+
+
 class EyeTrackerBase(event.EventCallback, threading.Thread):
-    def __init__(self, filter=None, **kwargs):
+    """
+    Base class for eye trackers. Samples are filtered (see eyetracking.filter) and sent to the overlay (Overlay:0),
+    the display can show at most one sample per refresh, so the samples that are sent are limited by:
+        display_rate: at most one sample per 1/display_rate seconds (None to send every sample), the most recent
+            sample is sent, those in between are dropped.
+        min_displacement: samples that moved less than min_displacement pixels from the last sample sent are
+            dropped (unless the label changed).
+    Fixation events (see filter.FixationFilter) are always sent. Unless log_raw is False, every (unfiltered) sample
+    is recorded in the event log as a 'gaze' event from the eye tracker to itself (on the Tk thread, see GazeChannel.log).
+
+    Samples arrive on the tracker thread, they are handed to the Tk thread through a GazeChannel.
+    """
+
+    def __init__(
+        self, filter=None, display_rate=None, min_displacement=0, log_raw=True, **kwargs
+    ):
         super(EyeTrackerBase, self).__init__(**kwargs)
         if filter is None:
             filter = lambda t, x, y: dict(timestamp=t, x=x, y=y, label="place")
 
         self.__filter = filter
+        self.__binocular = getattr(filter, "binocular", False)  # accepts the data of each eye
         self.x, self.y = None, None
-
-    def source(self, x, y, timestamp=None):
-        e = self.__filter(timestamp, x, y)
-        if e is not None:
-            if (
-                self.x != e["x"] or self.y != e["y"]
-            ):  # only trigger if the eyes moved...
+        self.display_rate = display_rate
+        self.min_displacement = min_displacement
+        self.log_raw = log_raw
+        self.__period = 1.0 / display_rate if display_rate else 0.0
+        self.__due = -math.inf  # time after which the next sample may be sent
+        self.__label = None  # label of the last sample sent
+        self.channel = GazeChannel(self.__send)
+
+    def __send(self, e):  # on the Tk thread (see GazeChannel)
+        super().source("Overlay:0", **e)
+
+    def source(self, x, y, timestamp=None, left=None, right=None):
+        if timestamp is None:
+            timestamp = event.now()
+        if self.log_raw:
+            eyes = {} if left is None else dict(left=_valid(*left), right=_valid(*right))
+            x_, y_ = _valid(x, y)
+            self.channel.log(
+                event.Event(
+                    self.name, self.name, timestamp=timestamp, label=EVENT_LABEL_GAZE, x=x_, y=y_, **eyes
+                )
+            )
+        if self.__binocular:
+            e = self.__filter(timestamp, x, y, left=left, right=right)
+        else:
+            e = self.__filter(timestamp, x, y)
+        if e is None:
+            return
+        # a filter may return a list of events (see filter.FixationFilter)
+        for e in [e] if isinstance(e, dict) else e:
+            if e.get("label") == EVENT_LABEL_FIXATION:
+                self.channel.put(e, latest=False)
+            elif self._should_send(e):
                 self.x, self.y = e["x"], e["y"]
-                # print(self.x, self.y)
-                super().source("Overlay:0", **e)
+                self.__label = e.get("label")
+                # the deadline advances by whole periods so that jitter in the sample times does not lower the rate
+                self.__due = max(self.__due, e["timestamp"] - self.__period / 2) + self.__period
+                self.channel.put(e)
+
+    def _should_send(self, e):
+        if self.x is None:
+            return True
+        if e["timestamp"] < self.__due:
+            return False  # decimate to the display rate
+        if e.get("label") != self.__label:
+            return True
+        # only trigger if the eyes moved (far enough)...
+        d = math.hypot(e["x"] - self.x, e["y"] - self.y)
+        return d > 0 and d >= self.min_displacement
 
 
 try:
@@ -73,15 +195,29 @@ EYETRACKER_ADDRESS_URI = "tet-tcp://172.28.195.1"
 
 
 class EyeTracker(EyeTrackerBase):
-    def __init__(self, root, filter=None, sample_rate=300, calibrate=True):
-        super(EyeTracker, self).__init__(filter)
+    def __init__(
+        self, root, filter=None, sample_rate=300, calibrate=True, geometry=None, **kwargs
+    ):
+        super(EyeTracker, self).__init__(filter, **kwargs)
         self.daemon = True  # ??? TODO any issue with this closing down psychopy?
         print("USING TOBII EYETRACKER!")
         if not TOBII_EYETRACKER_AVALIABLE:
             raise TOBII_RESEARCH_EXCEPTION
 
-        super().__init__()
+        self.sample_rate = sample_rate
+        self.tk_root = root
 
+        # transform eye tracking coordinates to canvas coordinates, the geometry is cached (tk must not be called
+        # from the tracker thread) and updated when the window changes
+        if geometry is None:
+            geometry = Geometry(root)
+        self.geometry = geometry
+
+        self.closed = threading.Event()
+        name = f"{EyeTracker.__name__}:{0}"
+        self.register(name)
+
+        # subscribe last, gaze data arrives (on the tracker thread) as soon as it is subscribed
         self.uri = EYETRACKER_ADDRESS_URI
         try:
             self._eyetracker = _TobiiEyetracker(self.uri)  # pylint: disable=E1101
@@ -96,52 +232,30 @@ class EyeTracker(EyeTrackerBase):
             raise exception
         logging.info("Tobii Eyetracker at uri %s created successfully.", self.uri)
 
-        self.sample_rate = sample_rate
-        self.tk_root = root
-
-        # self.tk_root.bind("<Configure>", self.tk_update) #TODO some thought here, cannot bind multiple <Configure>..?
-
-        # transform eye tracking coordinates to tk window coordinates
-        self.tk_position = (self.tk_root.winfo_x(), self.tk_root.winfo_y())
-        self.tk_size = (root.winfo_screenwidth(), self.tk_root.winfo_screenheight())
-
-        self.closed = threading.Event()
-        name = f"{EyeTracker.__name__}:{0}"
-        self.register(name)
-
-    def tk_update(self, _):
-        self.tk_position = (
-            self.tk_root.winfo_x(),
-            self.tk_root.winfo_y(),
-        )  # (event.x, event.y) using the event information has some issues?
-        self.tk_size = (
-            self.tk_root.winfo_screenwidth(),
-            self.tk_root.winfo_screenheight(),
-        )
-
     def _internal_callback(self, gaze_data):
         (x, y), _ = self._preprocess_gaze_data(gaze_data)
-        # print(x, y)
-        self.source(x=x, y=y)
+        left = self._to_window(gaze_data["left_gaze_point_on_display_area"])
+        right = self._to_window(gaze_data["right_gaze_point_on_display_area"])
+        self.source(x=x, y=y, left=left, right=right)
 
-    def _preprocess_gaze_data(self, gaze_data):
-        self.tk_position = (self.tk_root.winfo_x(), self.tk_root.winfo_y())
-        self.tk_size = (
-            self.tk_root.winfo_screenwidth(),
-            self.tk_root.winfo_screenheight(),
-        )
+    def _to_window(self, point):
+        # display area coordinates [0, 1] to canvas coordinates, invalid points are (nan, nan)
+        x, y = point
+        if x != x or y != y:
+            return math.nan, math.nan
+        return self.geometry.transform(x, y)
 
+    def _preprocess_gaze_data(self, gaze_data):
         # Extract gaze data for left and right eye (assuming it returns coordinates in the interval [0, 1])
         left_x, left_y = gaze_data["left_gaze_point_on_display_area"]
         right_x, right_y = gaze_data["right_gaze_point_on_display_area"]
         # average left and right
         raw_ax = (left_x + right_x) / 2
         raw_ay = (left_y + right_y) / 2
-        # Convert gaze data to screen coordinates
-        ax, ay = int(raw_ax * self.tk_size[0]), int(raw_ay * self.tk_size[1])
-        # Convert gaze data to window coordinates
-        ax, ay = ax - self.tk_position[0], ay - self.tk_position[1]
-        return (ax, ay), (raw_ax, raw_ay)
+        if raw_ax != raw_ax or raw_ay != raw_ay:  # invalid sample (nan)
+            return (math.nan, math.nan), (raw_ax, raw_ay)
+        # Convert gaze data to canvas coordinates (see main_panel.Geometry)
+        return self.geometry.transform(raw_ax, raw_ay), (raw_ax, raw_ay)
 
     def close(self):
         self.closed.set()
@@ -158,7 +272,9 @@ class EyeTrackerStub(EyeTrackerBase):
         self.daemon = True
         self.sample_rate = sample_rate
         self.__time = 0
-        root.bind("<Motion>", self.update)
+        # samples at fixed deadlines, samples that are missed (e.g. under load) are skipped, see clock.stats()
+        self.clock = event.PeriodicClock(1.0 / sample_rate, policy="skip")
+        root.bind("<Motion>", self.update, add="+")
 
         self.closed = threading.Event()
         self.register(self.__class__.__name__)
@@ -183,9 +299,8 @@ class EyeTrackerStub(EyeTrackerBase):
         """
         Generates events that move the current overlay (if it exists).
         """
-        while not self.closed.is_set():
+        while self.clock.wait(sleep=self.closed.wait) and not self.closed.is_set():
             self.__time += 1
-            sleep(1.0 / self.sample_rate)
             # self.source('Overlay:Overlay', label='move', dx=random.randint(0,10), dy=random.randint(0,10), timestamp=self.__time)
             # if self._p_mouse_x != self._n_mouse_x or self._p_mouse_y != self._n_mouse_y:
             # print(time(), self._n_mouse_x, self._n_mouse_y)
@@ -201,8 +316,177 @@ class EyeTrackerStub(EyeTrackerBase):
         self.closed.set()
 
 
+def _nan(v):  # missing coordinates (None or empty) are nan
+    return math.nan if v is None or v == "" else float(v)
+
+
+def read_gaze(file, source=None):
+    """Read recorded gaze samples, either raw gaze events from an event log (see EyeTrackerBase.log_raw and
+    icu.log.read_events) or a Tobii Pro Lab data export (.tsv or .csv, see read_tobii_export).
+
+    Args:
+        file (str): path of the log (or log index) or export.
+        source (str, optional): (logs only) name of the eye tracker that recorded the samples. Defaults to None (any).
+
+    Yields:
+        tuple: (timestamp, x, y, left, right), left and right are (x, y) or None if they were not recorded.
+    """
+    if os.path.splitext(file)[1].lower() in (".tsv", ".csv"):
+        yield from read_tobii_export(file)
+        return
+    from .. import log
+
+    for e in log.read_events(file):
+        if e.label == EVENT_LABEL_GAZE and e.src == e.dst and (source is None or e.src == source):
+            left, right = e.data.get("left"), e.data.get("right")
+            if left is not None:
+                left, right = tuple(map(_nan, left)), tuple(map(_nan, right))
+            yield e.timestamp, _nan(e.data.x), _nan(e.data.y), left, right
+
+
+def read_tobii_export(file):
+    """Read gaze samples from a Tobii Pro Lab data export (tab or comma separated), the columns used are the recording
+    timestamp (microseconds if the header says so, otherwise milliseconds) and gaze point X/Y (and the left/right
+    gaze points if present), in screen pixels. Rows without a timestamp or from another sensor (e.g. events) are skipped.
+
+    Yields:
+        tuple: (timestamp, x, y, left, right), see read_gaze.
+    """
+    with open(file, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f, delimiter="\t" if file.lower().endswith(".tsv") else ",")
+        header = next(reader)
+
+        def column(name):
+            for i, h in enumerate(header):
+                if h == name or h.startswith(name + " ["):
+                    return i
+
+        t = column("Recording timestamp")
+        x, y = column("Gaze point X"), column("Gaze point Y")
+        eyes = [column("Gaze point left X"), column("Gaze point left Y"),
+                column("Gaze point right X"), column("Gaze point right Y")]
+        if t is None or x is None or y is None:
+            raise ValueError("{0} is not a Tobii gaze data export, missing timestamp or gaze point columns.".format(file))
+        sensor = column("Sensor")  # rows from other sensors (e.g. keyboard or mouse events) are not gaze samples
+        scale = 1e-6 if ("μs" in header[t] or "us]" in header[t]) else 1e-3
+        for row in reader:
+            if len(row) <= max(t, x, y) or row[t] == "":
+                continue
+            if sensor is not None and sensor < len(row) and row[sensor] not in ("", "Eye Tracker"):
+                continue
+            left = right = None
+            if None not in eyes:
+                lx, ly, rx, ry = (_nan(row[i]) if i < len(row) else math.nan for i in eyes)
+                left, right = (lx, ly), (rx, ry)
+            yield float(row[t]) * scale, _nan(row[x]), _nan(row[y]), left, right
+
+
+class EyeTrackerReplay(EyeTrackerBase):
+    """
+    Replays recorded gaze samples through the filter (and output policies) of EyeTrackerBase, use to benchmark
+    filters and the overlay, or to test attention features without eyetracking hardware (or a display).
+
+    Samples are replayed in real time (speed=1), accelerated (e.g. speed=10) or as fast as possible (speed=None or 0), the
+    recorded timestamps are kept so that filters see the same data regardless of speed. Run as a thread (start) or
+    call replay directly.
+    """
+
+    def __init__(self, samples, filter=None, speed=1.0, source=None, log_raw=False, **kwargs):
+        """
+        Args:
+            samples (str, iterable): a file to read (see read_gaze) or an iterable of (timestamp, x, y) or
+                (timestamp, x, y, left, right).
+            filter: a filter for x,y (see eyetracking.filter).
+            speed (float, optional): replay speed relative to the recording, None (or 0) to replay as fast as possible. Defaults to 1.
+            source (str, optional): (logs only) name of the eye tracker that recorded the samples. Defaults to None (any).
+            log_raw (bool, optional): record the replayed samples in the event log. Defaults to False.
+        """
+        super(EyeTrackerReplay, self).__init__(filter, log_raw=log_raw, **kwargs)
+        self.daemon = True
+        if isinstance(samples, str):
+            samples = read_gaze(samples, source=source)
+        self.samples = samples
+        self.speed = speed
+        self.count = 0  # samples replayed
+        self.elapsed = 0.0  # time taken to replay (seconds)
+        self.closed = threading.Event()
+        self.register(self.__class__.__name__)
+
+    def replay(self):
+        """Replay the samples (until they run out or the eye tracker is closed), returns the number of samples replayed."""
+        start, first = perf_counter(), None
+        for sample in self.samples:
+            if self.closed.is_set():
+                break
+            if self.speed:
+                if first is None:
+                    first = sample[0]
+                delay = start + (sample[0] - first) / self.speed - perf_counter()  # absolute deadlines, no drift
+                if delay > 0 and self.closed.wait(delay):
+                    break
+            self.__replay_sample(sample)
+        self.elapsed = perf_counter() - start
+        return self.count
+
+    def schedule(self):
+        """
+        Replay the samples on the event schedular rather than on a thread, each at its recorded time (relative to now,
+        scaled by speed). Used to replay gaze in virtual time (see icu.run_headless), where the filters and events are
+        the same on every run.
+        """
+        scheduler = event.event_scheduler
+        samples, start = iter(self.samples), scheduler.time()
+        first = next(samples, None)
+        if first is None:
+            return
+
+        def replay_from(sample):
+            self.__replay_sample(sample)
+            for sample in samples:
+                if self.closed.is_set():
+                    return
+                delay = start + (sample[0] - first[0]) / self.speed - scheduler.time() if self.speed else 0.0
+                if delay > 0:
+                    scheduler.after(delay * 1000, replay_from, sample)
+                    return
+                self.__replay_sample(sample)
+
+        scheduler.after(0, replay_from, first)
+
+    def __replay_sample(self, sample):
+        t, x, y = sample[:3]
+        left, right = sample[3:5] if len(sample) >= 5 else (None, None)
+        self.source(x, y, timestamp=t, left=left, right=right)
+        self.count += 1
+
+    @property
+    def rate(self):
+        """Samples replayed per second."""
+        return self.count / self.elapsed if self.elapsed > 0 else 0.0
+
+    def run(self):
+        self.replay()
+
+    def close(self):
+        """
+        Force the thread to exit.
+        """
+        self.closed.set()
+
+
 def eyetracker(
-    root, filter=None, sample_rate=300, calibrate=True, stub=False, **kwargs
+    root,
+    filter=None,
+    sample_rate=300,
+    calibrate=True,
+    stub=False,
+    replay=None,
+    speed=1.0,
+    display_rate=None,
+    min_displacement=0,
+    log_raw=None,
+    geometry=None,
+    **kwargs
 ):
     """Creates a new Eyetracker (there should only ever be one).
     Args:
@@ -211,19 +495,38 @@ def eyetracker(
         sample_rate (int, optional): number of samples (events) per second. Defaults to 300.
         calibrate (bool, optional): calibrate the eyetracker. Defaults to True.
         stub (bool, optional): use a stub class (see StubEyeTracker) if hardware is not available. Defaults to False.
+        replay (str, optional): replay recorded gaze from this file (see EyeTrackerReplay) instead of using a device. Defaults to None.
+        speed (float, optional): replay speed (see EyeTrackerReplay). Defaults to 1.
+        display_rate (int, optional): maximum number of samples sent to the overlay per second (see EyeTrackerBase). Defaults to None (every sample).
+        min_displacement (float, optional): minimum movement (pixels) of samples sent to the overlay. Defaults to 0.
+        log_raw (bool, optional): record every sample in the event log. Defaults to None (True, unless replaying samples that are already in a log).
+        geometry (main_panel.Geometry, optional): screen to canvas transform (see MainPanel.geometry). Defaults to None (the geometry of root).
 
     Returns:
         (EyeTracker): The new EyeTracker.
     """
     LOGGER.debug("Initialising eyetracker... ")
+    if log_raw is None:
+        log_raw = replay is None
+    policy = dict(
+        display_rate=display_rate, min_displacement=min_displacement, log_raw=log_raw
+    )
+    if replay is not None:
+        LOGGER.debug("Using replay eyetracker (%s)", replay)
+        return EyeTrackerReplay(replay, filter=filter, speed=speed, **policy)
     if not stub:
         try:
             return EyeTracker(
-                root, filter=filter, sample_rate=sample_rate, calibrate=calibrate
+                root,
+                filter=filter,
+                sample_rate=sample_rate,
+                calibrate=calibrate,
+                geometry=geometry,
+                **policy
             )
         except Exception as e:
             LOGGER.error("Failed to initialise eyetracker")
             LOGGER.exception(e)
 
     LOGGER.debug("Using stub eyetracker (MOUSE COORDINATE)")
-    return EyeTrackerStub(root, filter=filter, sample_rate=sample_rate)
+    return EyeTrackerStub(root, filter=filter, sample_rate=sample_rate, **policy)
@@ -1,71 +1,563 @@
+"""
+    Filters for gaze samples (timestamp, x, y). Filters can be called on each sample as it arrives, returning a dict
+    (timestamp, x, y and possibly a label) or None if there is no output for the sample, or can process a block of
+    samples at once (see Filter.process), e.g. when the eye tracker delivers samples in bursts or for offline replays.
+    Blocks are numpy structured arrays (see SAMPLE_DTYPE and GAZE_DTYPE), numpy is only required to process blocks.
+    FixationFilter is the full I-VT fixation filter, it returns fixation start/end events rather than samples.
+"""
 
-from collections import deque
 import math
+import statistics
+from collections import deque
+
+from ..constants import EVENT_LABEL_FIXATION
+
+try:
+    import numpy as np
+
+    NUMPY_EXCEPTION = None
+    NUMPY_AVALIABLE = True
+    SAMPLE_DTYPE = np.dtype([('timestamp', 'f8'), ('x', 'f8'), ('y', 'f8')])
+    GAZE_DTYPE = np.dtype([('timestamp', 'f8'), ('x', 'f8'), ('y', 'f8'), ('label', 'U8')])
+except ModuleNotFoundError as _NUMPY_EXCEPTION:
+    NUMPY_EXCEPTION = _NUMPY_EXCEPTION
+    NUMPY_AVALIABLE = False
+    SAMPLE_DTYPE = GAZE_DTYPE = None
+
+def as_samples(block):
+    """ A block of samples as a structured array (see SAMPLE_DTYPE), block may also be a (n,3) array of timestamp, x, y. """
+    if not NUMPY_AVALIABLE:
+        raise NUMPY_EXCEPTION
+    block = np.asarray(block)
+    if block.dtype.names is None:
+        block = block.reshape(-1, 3)
+        samples = np.empty(len(block), dtype=GAZE_DTYPE)
+        samples['timestamp'], samples['x'], samples['y'] = block[:,0], block[:,1], block[:,2]
+    else:
+        samples = np.empty(len(block), dtype=GAZE_DTYPE)
+        for field in SAMPLE_DTYPE.names:
+            samples[field] = block[field]
+    if block.dtype.names is None or 'label' not in block.dtype.names:
+        samples['label'] = ''
+    else:
+        samples['label'] = block['label']
+    return samples
+
+class RingBuffer:
+    """ A fixed size (preallocated) buffer, pushing to a full buffer replaces the oldest value. """
+
+    def __init__(self, n, fill=0.):
+        super(RingBuffer, self).__init__()
+        self.data = [fill] * n
+        self.size = n
+        self.count = 0 # number of values pushed
+        self.index = 0 # position of the next value
+
+    def push(self, value):
+        """ Push a value, returns the value that was replaced. """
+        old = self.data[self.index]
+        self.data[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+        return old
+
+    @property
+    def full(self):
+        return self.count >= self.size
+
+    def __getitem__(self, i): # 0 is the oldest value
+        return self.data[(self.index + i) % self.size]
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def values(self):
+        """ Values in the buffer from oldest to newest. """
+        if not self.full:
+            return self.data[:self.index]
+        return self.data[self.index:] + self.data[:self.index]
+
+    def clear(self):
+        self.count = 0
+        self.index = 0
+
+class Filter:
+    """ Base class for gaze filters. """
+
+    def __call__(self, t, x, y):
+        r = self._step(t, x, y, None)
+        if r is not None:
+            t, x, y, label = r
+            if label is None:
+                return dict(x=x, y=y, timestamp=t)
+            return dict(label=label, x=x, y=y, timestamp=t)
+
+    def _step(self, t, x, y, label):
+        """ Filter a single sample, returns (timestamp, x, y, label) or None. """
+        raise NotImplementedError()
+
+    def process(self, block):
+        """
+            Filter a block of samples (in order), the state of the filter is the same as if each sample was given in turn.
+
+        Args:
+            block (numpy.ndarray): samples (see as_samples).
+
+        Returns:
+            numpy.ndarray: filtered samples (see GAZE_DTYPE), the label of a sample is '' if it has none.
+        """
+        return self._process(as_samples(block))
+
+    def _process(self, samples):
+        result = [self._step(t, x, y, label or None) for t, x, y, label in samples.tolist()]
+        result = [(t, x, y, label or '') for t, x, y, label in filter(None, result)]
+        return np.array(result, dtype=GAZE_DTYPE)
 
+    def reset(self):
+        pass
 
-class NWMAFilter: #Non-weighted moving average
+class NWMAFilter(Filter): #Non-weighted moving average
+    """
+        Average of the last 2n + 1 samples, the timestamp is that of the middle sample. The average is kept as a running
+        sum, so each sample is O(1).
+    """
+
+    RESUM = 1024 # recompute the running sums every RESUM samples (floating point errors accumulate)
 
     def __init__(self, n):
         super(NWMAFilter, self).__init__()
         self.N = 2 * n + 1
         self.C = 1. / self.N
-        self.data_x = deque(maxlen=self.N)
-        self.data_y = deque(maxlen=self.N)
-        self.data_t = deque(maxlen=self.N)
-      
-
-    def __call__(self, t, x, y):
-        self.data_x.append(x)
-        self.data_y.append(y)
-        self.data_t.append(t)
+        self.data_x = RingBuffer(self.N)
+        self.data_y = RingBuffer(self.N)
+        self.data_t = RingBuffer(self.N)
+        self.sum_x, self.sum_y = 0., 0.
 
-        #print(self.data_x)
-        #print(self.data_y)
+    def _step(self, t, x, y, label):
+        self.sum_x += x - self.data_x.push(x)
+        self.sum_y += y - self.data_y.push(y)
+        self.data_t.push(t)
+        if self.data_x.count % NWMAFilter.RESUM == 0:
+            self.sum_x, self.sum_y = math.fsum(self.data_x.data), math.fsum(self.data_y.data)
 
-        if len(self.data_x) == self.data_x.maxlen:
+        if self.data_x.full:
             #the buffer is full, the window is now full, compute the average
-            x = self.C * sum(self.data_x)
-            y = self.C * sum(self.data_y)
-            t = self.data_t[self.N//2]
-         
-            return dict(x=x, y=y, timestamp=t)
+            return self.data_t[self.N//2], self.C * self.sum_x, self.C * self.sum_y, label
 
-class IVTFilter:
+    def _process(self, samples):
+        # the samples in the window (from previous calls) and the block, averaged using cumulative sums
+        n = len(self.data_x)
+        t = np.concatenate([self.data_t.values(), samples['timestamp']])
+        x = np.concatenate([self.data_x.values(), samples['x']])
+        y = np.concatenate([self.data_y.values(), samples['y']])
+        label = np.concatenate([np.full(n, '', dtype=GAZE_DTYPE['label']), samples['label']])
+        N = self.N
+        m = max(0, len(t) - N + 1)
+        result = np.empty(m, dtype=GAZE_DTYPE)
+        if m > 0:
+            cx, cy = np.cumsum(np.insert(x, 0, 0.)), np.cumsum(np.insert(y, 0, 0.))
+            result['x'] = (cx[N:] - cx[:-N]) * self.C
+            result['y'] = (cy[N:] - cy[:-N]) * self.C
+            result['timestamp'] = t[N//2:N//2 + m]
+            result['label'] = label[N-1:]
+            result = result[max(0, n - N + 1):] # windows that were already complete before the block
+        # keep the last N samples as the window
+        self.reset()
+        for t, x, y in zip(t[-N:].tolist(), x[-N:].tolist(), y[-N:].tolist()):
+            self._step(t, x, y, None)
+        return result
+
+    def reset(self):
+        for buffer in (self.data_x, self.data_y, self.data_t):
+            buffer.clear()
+            buffer.data = [0.] * self.N
+        self.sum_x, self.sum_y = 0., 0.
+
+class IVTFilter(Filter):
+    """
+        Labels each sample as 'gaze' or 'saccade' using the velocity (pixels per second) from the previous sample
+        (Velocity-Threshold Identification).
+    """
 
     def __init__(self, threshold):
-        self.data_x = deque(maxlen=2)
-        self.data_y = deque(maxlen=2)
-        self.data_t = deque(maxlen=2)
+        super(IVTFilter, self).__init__()
         self.threshold = threshold
+        self.previous = None # (t, x, y)
 
-    def __call__(self, t, x, y): #estimate velocity using the two most recent samples... 
-        self.data_x.append(x)
-        self.data_y.append(y)
-        self.data_t.append(t)
+    def _step(self, t, x, y, label): #estimate velocity using the two most recent samples...
+        previous, self.previous = self.previous, (t, x, y)
+        if previous is None:
+            return None
+        pt, px, py = previous
+        dt = pt - t
+        if dt != 0:
+            v = math.sqrt((px - x) ** 2 + (py - y) ** 2) / abs(dt)
+            return t, x, y, 'saccade' if v > self.threshold else 'gaze'
 
-        l = len(self.data_x)
+    def _process(self, samples):
+        if len(samples) == 0:
+            return np.empty(0, dtype=GAZE_DTYPE)
+        t, x, y = samples['timestamp'], samples['x'], samples['y']
+        if self.previous is None:
+            pt, px, py = t[:1], x[:1], y[:1] # there is no velocity for the first sample
+        else:
+            pt, px, py = (np.array([v]) for v in self.previous)
+        dt = np.abs(np.diff(np.concatenate([pt, t])))
+        d = np.hypot(np.diff(np.concatenate([px, x])), np.diff(np.concatenate([py, y])))
+        valid = dt != 0
+        result = samples[valid]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v = d[valid] / dt[valid]
+        result['label'] = np.where(v > self.threshold, 'saccade', 'gaze')
+        self.previous = (float(t[-1]), float(x[-1]), float(y[-1]))
+        return result
 
-        dt = self.data_t[0 % l] - self.data_t[1 % l]
-        if dt != 0:
-           
-            dx = self.data_x[0 % l] - self.data_x[1 % l]
-            dy = self.data_y[0 % l] - self.data_y[1 % l]
-            
-            v = math.sqrt(dx **2 + dy ** 2) / abs(dt)
-
-            if v > self.threshold:
-                return dict(label='saccade', x=x, y=y, timestamp=t)
-            else:
-                return dict(label='gaze', x=x, y=y, timestamp=t)
+    def reset(self):
+        self.previous = None
+
+class Pipeline(Filter):
+    """ Filters applied in sequence, samples are passed between filters as tuples (or blocks), not dicts. """
+
+    def __init__(self, *filters):
+        super(Pipeline, self).__init__()
+        self.filters = filters
+
+    def _step(self, t, x, y, label):
+        r = (t, x, y, label)
+        for f in self.filters:
+            r = f._step(*r)
+            if r is None:
+                return None
+        return r
 
-class TobiiFilter:
+    def _process(self, samples):
+        for f in self.filters:
+            samples = f._process(samples)
+        return samples
+
+    def reset(self):
+        for f in self.filters:
+            f.reset()
+
+class TobiiFilter(Pipeline):
+    """ A moving average (see NWMAFilter) followed by velocity threshold classification (see IVTFilter). """
 
     def __init__(self, n, threshold):
-        super(TobiiFilter, self).__init__()
         self.ma = NWMAFilter(n)
         self.ivt = IVTFilter(threshold)
+        super(TobiiFilter, self).__init__(self.ma, self.ivt)
 
-    def __call__(self, t, x, y):
-        r = self.ma(t, x, y)
-        if r is not None:
-            return self.ivt(r['timestamp'], r['x'], r['y'])
\ No newline at end of file
+# ==================== I-VT fixation filter ==================== #
+# The stages of the Tobii Pro I-VT fixation filter (see tobii-pro-i-vt-fixation-filter.pdf), each stage takes one
+# sample (a tuple) at a time and returns a list of output samples, which may be delayed while the stage waits for
+# the samples that follow (e.g. to fill a gap or to complete a window). Times are in seconds, distances in pixels.
+
+if NUMPY_AVALIABLE:
+    FIXATION_DTYPE = np.dtype([('timestamp', 'f8'), ('duration', 'f8'), ('x', 'f8'), ('y', 'f8')])
+else:
+    FIXATION_DTYPE = None
+
+NAN = float('nan')
+
+class GapFill:
+    """
+        Fills gaps (invalid samples) in the data of each eye that are at most max_gap seconds long by linear
+        interpolation. Samples are (timestamp, left_x, left_y, right_x, right_y), invalid values are NaN.
+    """
+
+    OK, OPEN, LOST = 0, 1, 2
+
+    def __init__(self, max_gap=0.075):
+        super(GapFill, self).__init__()
+        self.max_gap = max_gap
+        self.reset()
+
+    def push(self, sample):
+        t = sample[0]
+        self.pending.append(list(sample))
+        for eye, i in enumerate((1, 3)):
+            x, y = sample[i], sample[i+1]
+            if x == x and y == y: # valid (not NaN)
+                if self.state[eye] == GapFill.OPEN:
+                    self.__fill(i, self.last[eye], (t, x, y))
+                self.state[eye] = GapFill.OK
+                self.last[eye] = (t, x, y)
+            elif self.state[eye] == GapFill.OK:
+                self.state[eye] = GapFill.OPEN if self.last[eye] is not None else GapFill.LOST
+            if self.state[eye] == GapFill.OPEN and t - self.last[eye][0] > self.max_gap:
+                self.state[eye] = GapFill.LOST # the gap is too long to fill
+        if GapFill.OPEN in self.state:
+            return []
+        result, self.pending = self.pending, []
+        return result
+
+    def __fill(self, i, start, end):
+        (t0, x0, y0), (t1, x1, y1) = start, end
+        for sample in self.pending:
+            if sample[i] != sample[i] or sample[i+1] != sample[i+1]:
+                a = (sample[0] - t0) / (t1 - t0)
+                sample[i], sample[i+1] = x0 + a * (x1 - x0), y0 + a * (y1 - y0)
+
+    def reset(self):
+        self.pending = []
+        self.state = [GapFill.OK, GapFill.OK]
+        self.last = [None, None] # last valid (t, x, y) of each eye
+
+class EyeSelection:
+    """
+        Combines the data of the two eyes, samples (timestamp, left_x, left_y, right_x, right_y) become
+        (timestamp, x, y). eye is one of:
+            'left' or 'right': use only the data of the given eye.
+            'average': the average of both eyes, or of the valid eye if only one is valid.
+            'strict': the average of both eyes, invalid unless both eyes are valid.
+    """
+
+    EYES = ('left', 'right', 'average', 'strict')
+
+    def __init__(self, eye='average'):
+        super(EyeSelection, self).__init__()
+        if eye not in EyeSelection.EYES:
+            raise ValueError("Invalid eye selection '{0}', must be one of {1}".format(eye, EyeSelection.EYES))
+        self.eye = eye
+
+    def push(self, sample):
+        t, lx, ly, rx, ry = sample
+        if self.eye == 'left':
+            return [(t, lx, ly)]
+        elif self.eye == 'right':
+            return [(t, rx, ry)]
+        left, right = lx == lx and ly == ly, rx == rx and ry == ry
+        if left and right:
+            return [(t, (lx + rx) / 2, (ly + ry) / 2)]
+        elif self.eye == 'strict':
+            return [(t, NAN, NAN)]
+        elif left:
+            return [(t, lx, ly)]
+        return [(t, rx, ry)]
+
+    def reset(self):
+        pass
+
+class NoiseReduction:
+    """
+        Moving median (or average) of n samples, the timestamp is that of the middle sample. Invalid samples stay
+        invalid and are ignored in the windows of their neighbours. n = 1 disables noise reduction.
+    """
+
+    METHODS = {'median' : statistics.median, 'average' : statistics.fmean}
+
+    def __init__(self, n=3, method='median'):
+        super(NoiseReduction, self).__init__()
+        if method not in NoiseReduction.METHODS:
+            raise ValueError("Invalid noise reduction method '{0}', must be one of {1}".format(method, tuple(NoiseReduction.METHODS)))
+        self.n = n
+        self.method = NoiseReduction.METHODS[method]
+        self.window = deque(maxlen=n)
+
+    def push(self, sample):
+        if self.n <= 1:
+            return [sample]
+        self.window.append(sample)
+        if len(self.window) < self.n:
+            return []
+        t, x, y = self.window[self.n // 2]
+        if x != x or y != y:
+            return [(t, x, y)]
+        valid = [s for s in self.window if s[1] == s[1] and s[2] == s[2]]
+        return [(t, self.method([s[1] for s in valid]), self.method([s[2] for s in valid]))]
+
+    def reset(self):
+        self.window.clear()
+
+class VelocityWindow:
+    """
+        Velocity (pixels per second) of each sample, computed from the first and last valid samples in a window of
+        the given length (seconds) centred on the sample. Samples (timestamp, x, y) become (timestamp, x, y, v), v is
+        NaN if the sample is invalid or there are too few valid samples in its window.
+    """
+
+    def __init__(self, window=0.02):
+        super(VelocityWindow, self).__init__()
+        self.half = window / 2
+        self.buffer = deque()
+        self.i = 0 # next sample to output
+
+    def push(self, sample):
+        buffer, result = self.buffer, []
+        buffer.append(sample)
+        while self.i < len(buffer) and sample[0] - buffer[self.i][0] >= self.half:
+            t, x, y = buffer[self.i]
+            while buffer[0][0] < t - self.half:
+                buffer.popleft()
+                self.i -= 1
+            result.append((t, x, y, self.__velocity(t, x, y)))
+            self.i += 1
+        return result
+
+    def __velocity(self, t, x, y):
+        if x != x or y != y:
+            return NAN
+        window = [s for s in self.buffer if s[0] <= t + self.half and s[1] == s[1] and s[2] == s[2]]
+        (t0, x0, y0), (t1, x1, y1) = window[0], window[-1]
+        if t1 <= t0:
+            return NAN
+        return math.hypot(x1 - x0, y1 - y0) / (t1 - t0)
+
+    def reset(self):
+        self.buffer.clear()
+        self.i = 0
+
+class _Fixation:
+
+    __slots__ = ('start', 'end', 'sum_x', 'sum_y', 'n', 'started')
+
+    def __init__(self, t, x, y):
+        self.start, self.end = t, t
+        self.sum_x, self.sum_y, self.n = x, y, 1
+        self.started = False
+
+    def add(self, t, x, y):
+        self.end = t
+        self.sum_x += x
+        self.sum_y += y
+        self.n += 1
+
+    def merge(self, other):
+        self.end = other.end
+        self.sum_x += other.sum_x
+        self.sum_y += other.sum_y
+        self.n += other.n
+
+    @property
+    def x(self):
+        return self.sum_x / self.n
+
+    @property
+    def y(self):
+        return self.sum_y / self.n
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def event(self, action):
+        timestamp = self.start if action == 'start' else self.end
+        return dict(label=EVENT_LABEL_FIXATION, action=action, x=self.x, y=self.y, duration=self.duration, timestamp=timestamp)
+
+class FixationDetector:
+    """
+        Classifies samples (timestamp, x, y, v) as fixation (v <= threshold), saccade (v > threshold) or gap (v is
+        NaN), groups consecutive fixation samples, merges fixations that are at most merge_time seconds and
+        merge_distance pixels apart and discards fixations shorter than min_duration seconds.
+
+        Returns fixation events (dicts), 'start' as soon as a fixation is known to last at least min_duration and
+        'end' once it can no longer be merged with a following fixation. Both have the centroid (x, y) and duration
+        of the fixation so far.
+    """
+
+    def __init__(self, threshold=1000, merge_time=0.075, merge_distance=20, min_duration=0.06):
+        super(FixationDetector, self).__init__()
+        self.threshold = threshold
+        self.merge_time = merge_time
+        self.merge_distance = merge_distance
+        self.min_duration = min_duration
+        self.reset()
+
+    def push(self, sample):
+        t, x, y, v = sample
+        result = []
+        if v <= self.threshold: # fixation sample (False if v is NaN)
+            if self.run is None:
+                self.run = _Fixation(t, x, y)
+            else:
+                self.run.add(t, x, y)
+            if self.run is not self.pending and self.run.duration >= self.min_duration:
+                self.__merge(result) # the run will be kept, decide now so that its start is not delayed
+        elif self.run is not None:
+            if self.run is not self.pending:
+                self.__merge(result)
+            self.run = None
+        if self.pending is not None and self.run is not self.pending:
+            start = t if self.run is None else self.run.start # the run may still be merged until it is decided
+            if start - self.pending.end > self.merge_time:
+                self.__end(result)
+        if self.pending is not None and not self.pending.started and self.pending.duration >= self.min_duration:
+            self.pending.started = True
+            result.append(self.pending.event('start'))
+        return result
+
+    def __merge(self, result):
+        # merge the current run into the pending fixation if they are close enough, otherwise it is the new pending fixation
+        run, pending = self.run, self.pending
+        if pending is not None and run.start - pending.end <= self.merge_time and \
+                math.hypot(run.x - pending.x, run.y - pending.y) <= self.merge_distance:
+            pending.merge(run)
+        else:
+            if pending is not None:
+                self.__end(result)
+            self.pending = run
+        self.run = self.pending
+
+    def __end(self, result):
+        if self.pending.started: # otherwise the fixation is too short and is discarded
+            result.append(self.pending.event('end'))
+        self.pending = None
+
+    def reset(self):
+        self.run = None # the current run of fixation samples
+        self.pending = None # the last fixation, it may still be merged with the next run
+
+class FixationFilter(Filter):
+    """
+        The Tobii Pro I-VT fixation filter, the stages (in order) are:
+            gap fill-in (see GapFill), eye selection (see EyeSelection), noise reduction (see NoiseReduction),
+            velocity calculation (see VelocityWindow) and classification, merging of adjacent fixations and
+            discarding of short fixations (see FixationDetector).
+
+        Rather than a sample, each call returns a (possibly empty) list of fixation start/end events, the data of
+        each eye (left, right) may be given, otherwise both are (x, y). The Tobii defaults for the thresholds are in
+        degrees (30 degrees per second, 0.5 degrees), the defaults here are approximate pixel equivalents at a
+        typical viewing distance.
+    """
+
+    binocular = True # accepts the data of each eye (see EyeTrackerBase)
+
+    def __init__(self, threshold=1000, max_gap=0.075, eye='average', noise=3, noise_method='median', window=0.02,
+                 merge_time=0.075, merge_distance=20, min_duration=0.06):
+        super(FixationFilter, self).__init__()
+        self.stages = (GapFill(max_gap), EyeSelection(eye), NoiseReduction(noise, noise_method), VelocityWindow(window))
+        self.detector = FixationDetector(threshold, merge_time, merge_distance, min_duration)
+
+    def __call__(self, t, x, y, left=None, right=None):
+        if left is None:
+            left = (x, y)
+        if right is None:
+            right = (x, y)
+        return self._push((t, *left, *right))
+
+    def _push(self, sample):
+        samples = [sample]
+        for stage in self.stages:
+            samples = [r for s in samples for r in stage.push(s)]
+        return [e for s in samples for e in self.detector.push(s)]
+
+    def process(self, block):
+        """
+            Filter a block of samples (in order), the state of the filter is the same as if each sample was given in turn.
+
+        Args:
+            block (numpy.ndarray): samples (see as_samples).
+
+        Returns:
+            numpy.ndarray: fixations that ended in the block (see FIXATION_DTYPE), timestamp is the start of the fixation.
+        """
+        samples = as_samples(block)
+        events = [e for t, x, y in zip(samples['timestamp'].tolist(), samples['x'].tolist(), samples['y'].tolist())
+                    for e in self._push((t, x, y, x, y))]
+        return np.array([(e['timestamp'] - e['duration'], e['duration'], e['x'], e['y']) for e in events if e['action'] == 'end'],
+                        dtype=FIXATION_DTYPE)
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+        self.detector.reset()
@@ -17,14 +17,13 @@ from .constants import EVENT_LABEL_TRANSFER, EVENT_LABEL_FAIL, EVENT_LABEL_REPAI
 
 from . import event
 
-from .event import Event, EventCallback, event_property, etuple
+from .event import Event, EventCallback, PeriodicClock, event_property, etuple
 
 from .component import Component, CanvasWidget, SimpleComponent, BoxComponent, LineComponent, TextComponent, BaseComponent
 from .highlight import Highlight
 
 
 from pprint import pprint
-from itertools import cycle
 
 class FuelTank(EventCallback, Component, CanvasWidget):
 
@@ -109,7 +108,7 @@ class FuelTankMain(FuelTank):
         self.__trigger_enter = self.fuel > lim[0] and self.fuel < lim[1]
         self.__trigger_leave = not self.__trigger_enter
 
-        event.event_scheduler.schedule(self.__burn(), sleep=cycle([int(1000/self.event_rate)])) #start burning fuel
+        event.event_scheduler.schedule(self.__burn(), sleep=PeriodicClock(1. / self.event_rate)) #start burning fuel
 
     def __burn(self):
         while True:
@@ -172,6 +171,7 @@ class Pump(EventCallback, Component, CanvasWidget):
         name = "{0}{1}".format(tank1.name.split(':')[1], tank2.name.split(':')[1])
         name = "{0}:{1}".format(Pump.__name__, name)
         self.__state = options[name]['state']
+        self.__transfer_handle = None
         super(Pump, self).__init__(canvas, x=x, y=y, width=width, height=height, background_colour=Pump.COLOURS[self.__state], outline_thickness=OUTLINE_WIDTH)
 
       
@@ -216,7 +216,13 @@ class Pump(EventCallback, Component, CanvasWidget):
         return (x + width/d, y + height*n/d), (x + width/2, y + height/d), (x + width*n/d, y + height*n/d)
     
     def start(self):
-        event.event_scheduler.schedule(self.__transfer(), sleep=cycle([int(1000/self.event_rate)]))
+        self.stop()
+        self.__transfer_handle = event.event_scheduler.schedule(self.__transfer(), sleep=PeriodicClock(1. / self.event_rate))
+
+    def stop(self):
+        if self.__transfer_handle is not None:
+            self.__transfer_handle.cancel()
+            self.__transfer_handle = None
 
     def __transfer(self):
         while self.state == 0: #on
@@ -256,6 +262,8 @@ class Pump(EventCallback, Component, CanvasWidget):
         self.background_colour = Pump.COLOURS[value]
         if value == 0:
             self.start()
+        else:
+            self.stop()
 
     def click_callback(self, event):
         if self.state != 2: #the pump has failed
@@ -344,6 +352,7 @@ class FuelWidget(CanvasWidget):
         self.layout_manager.fill('wr', 'Y')
         self.layout_manager.split('wl', 'X', .5)
         self.layout_manager.split('wr', 'X', .5)
+        self.layout() # the pumps between the wings are placed relative to the tanks
         
         tank_a_name = name.format('A')
         tank_b_name = name.format('B')
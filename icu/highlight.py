@@ -1,6 +1,7 @@
 
 from .event import EventCallback
 from .component import BaseComponent, BoxComponent
+from . import spatial
 
 def all_highlights():
     return Highlight.__all_highlights__
@@ -32,15 +33,17 @@ class Highlight(EventCallback):
             self.__box = BoxComponent(self.canvas, x=component.x, y=component.y, width=component.width, height=component.height,
                                         colour=background_colour, outline_thickness=highlight_thickness, outline_colour=highlight_colour, stipple="gray25")
 
-            #self.__box.front()
-            if not state:
+            self.__box.set_layer('highlight') # above every widget, whenever the widgets are raised
+            if state:
+                self.on()
+            else:
                 self.off()
 
             Highlight.__all_highlights__[self.name] = self
 
     def sink(self, event):
         print("HIGHLIGHT: ", event)
-        if "value" in event.data.__dict__: #if no value is given, flip the highlight on/off
+        if "value" in event.data: #if no value is given, flip the highlight on/off
             (self.off, self.on)[int(event.data.value)]() #love it
         else:
             self.flip()
@@ -58,9 +61,11 @@ class Highlight(EventCallback):
 
     def on(self):
         self.__box.show()
+        spatial.highlighted(self.component.name, True)
        
     def off(self):
         self.__box.hide()
+        spatial.highlighted(self.component.name, False)
 
     @property
     def is_on(self):
@@ -95,7 +100,6 @@ class Highlight(EventCallback):
         return self.__canvas
 
     def move(self, _):
-        self.__box.front() #TODO this is a work around until the layout manager supports layering
         self.__box.position = self.component.position
 
     def resize(self, dsize):
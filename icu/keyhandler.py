@@ -1,9 +1,8 @@
-from itertools import cycle
 from threading import Timer
 
 from collections import defaultdict
 from . import event
-from .event import Event, EventCallback
+from .event import Event, EventCallback, PeriodicClock
 
 from .component import BaseComponent
 from .constants import EVENT_LABEL_KEY
@@ -99,7 +98,7 @@ class KeyHandler(EventCallback):
             KeyHoldGenerator: event generator.
         """
         generator = KeyHoldGenerator(self, sink, key=key, label=label, **data)
-        event.event_scheduler.schedule(generator, sleep=cycle([1000/HOLD_FREQUENCY]))
+        generator.handle = event.event_scheduler.schedule(generator, sleep=PeriodicClock(1. / HOLD_FREQUENCY, policy='skip'))
         self.holds[key] = generator
 
 class KeyHoldGenerator(EventGenerator):
@@ -113,6 +112,7 @@ class KeyHoldGenerator(EventGenerator):
         self.data = data #key, keycode, label etc
         self.key = data['key']
         self.stop = False
+        self.handle = None # see KeyHandler.hold
 
     def __next__(self):
         if not self.stop:
@@ -122,6 +122,8 @@ class KeyHoldGenerator(EventGenerator):
 
     def released(self):
         self.stop = True
+        if self.handle is not None:
+            self.handle.cancel()
 
 class JoyStickHandler:
 
@@ -1,7 +1,37 @@
+import os
+import io
+import re
+import ast
+import gzip
+import mmap
+import struct
+from json import dumps, loads, dump, load
+from contextlib import contextmanager
+from threading import Thread, Condition
+from collections import deque
+from time import monotonic
 
+from . import event as _event
 
+try:
+    import numpy as np
 
-# log events to files 
+    NUMPY_EXCEPTION = None
+    NUMPY_AVALIABLE = True
+except ModuleNotFoundError as _NUMPY_EXCEPTION:
+    NUMPY_EXCEPTION = _NUMPY_EXCEPTION
+    NUMPY_AVALIABLE = False
+
+try:
+    import zstandard
+
+    ZSTD_EXCEPTION = None
+    ZSTD_AVALIABLE = True
+except ModuleNotFoundError as _ZSTD_EXCEPTION:
+    ZSTD_EXCEPTION = _ZSTD_EXCEPTION
+    ZSTD_AVALIABLE = False
+
+# log events to files
 class FileLogger:
 
     def __init__(self, file):
@@ -10,12 +40,593 @@ class FileLogger:
     def log(self, event):
         self.file.write(str(event) + "\n")
 
+    def log_many(self, events):
+        self.file.write("".join([str(event) + "\n" for event in events]))
+
     def close(self):
         self.file.close()
 
-        
+# ================================ LOG FORMATS ================================ #
+
+# binary log: file header, then blocks of fixed size records (one block per write), all fields are little-endian and
+# 8 byte aligned so that blocks can be memory mapped (see icu.log readers)
+#   block:   header | symbols (json list, new symbols since the previous block) | records | payloads (json objects)
+#   record:  id, timestamp, src, dst, label (symbol codes, -1 if none), payload size, payload offset (in the block payloads)
+
+LOG_MAGIC = b'ICUEVLOG'
+LOG_VERSION = 1
+BLOCK_MAGIC = b'EVTB'
+
+FILE_HEADER = struct.Struct('<8sII')        # magic, version, reserved
+BLOCK_HEADER = struct.Struct('<4sIIIQQ')    # magic, records, symbols, reserved, symbols size, payloads size
+RECORD = struct.Struct('<qdiiiIQ')          # id, timestamp, src, dst, label, payload size, payload offset
+
+def _pad(size):
+    return -size % 8
+
+def _json_default(value):
+    if isinstance(value, _event.Event):
+        return value.id # e.g. the cause of a change event, events are logged separately
+    if isinstance(value, (tuple, frozenset, set)):
+        return list(value)
+    return str(value)
+
+class TextEventWriter:
+    """
+        Writes events as lines of text (see Event.__str__), the same format as FileLogger.
+    """
+
+    def __init__(self, file):
+        super(TextEventWriter, self).__init__()
+        self.file = file
+
+    def write(self, events):
+        self.file.write("".join([str(event) + "\n" for event in events]).encode('utf-8'))
+
+class BinaryEventWriter:
+    """
+        Writes events in a compact binary format (see LOG_MAGIC), each write is a block of fixed size records
+        followed by the event data (without label) as json.
+    """
+
+    def __init__(self, file):
+        super(BinaryEventWriter, self).__init__()
+        self.file = file
+        self.__symbols = 0 # symbols written so far
+        self.file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION, 0))
+
+    def write(self, events):
+        records, payloads, offset = bytearray(), [], 0
+        code = _event.symbol_code
+        for e in events:
+            data = e.data
+            src, dst = e._src, e._dst
+            src = src if src.__class__ is int else code(str(src))
+            dst = dst if dst.__class__ is int else code(str(dst))
+            label = -1 if data._label is None else tuple.__getitem__(data, data._label)
+            payload = {k:v for k, v in zip(data._keys, tuple.__iter__(data)) if k != 'label'}
+            payload = dumps(payload, separators=(',', ':'), default=_json_default).encode('utf-8')
+            records += RECORD.pack(e.id, e.timestamp, src, dst, label, len(payload), offset)
+            payloads.append(payload)
+            offset += len(payload)
+
+        n = len(_event.SYMBOLS)
+        symbols = dumps(_event.SYMBOLS[self.__symbols:n]).encode('utf-8')
+        payloads = b"".join(payloads)
+        self.file.write(b"".join([
+            BLOCK_HEADER.pack(BLOCK_MAGIC, len(events), n - self.__symbols, 0, len(symbols) + _pad(len(symbols)), len(payloads) + _pad(len(payloads))),
+            symbols, bytes(_pad(len(symbols))), records, payloads, bytes(_pad(len(payloads)))]))
+        self.__symbols = n
+
+LOG_FORMATS = {'text' : TextEventWriter, 'binary' : BinaryEventWriter}
+
+# ================================ LOGGERS ================================ #
+
+class BufferedLogger:
+    """
+        Logs events to a file from a background thread, events are handed over in batches (see GlobalEventCallback.flush)
+        and written in large blocks so that logging never waits on disk I/O. Logging only waits if more than max_pending
+        events have not been written yet (see stalls).
+    """
+
+    def __init__(self, file, format='text', max_pending=100000, flush_interval=1.):
+        """
+        Args:
+            file (str): path of the log file.
+            format (str, optional): 'text' or 'binary' (see LOG_FORMATS). Defaults to 'text'.
+            max_pending (int, optional): maximum number of events waiting to be written. Defaults to 100000.
+            flush_interval (float, optional): maximum seconds between writes. Defaults to 1.
+        """
+        super(BufferedLogger, self).__init__()
+        if format not in LOG_FORMATS:
+            raise ValueError("Invalid log format: {0}, must be one of {1}.".format(format, list(LOG_FORMATS)))
+        self.format = format
+        self._open(file)
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.stalls = 0 # number of times logging waited for the writer
+        self.error = None
+
+        self.__pending = deque() # batches of events
+        self.__size = 0 # number of pending events
+        self.__condition = Condition()
+        self.__closed = False
+        self.__thread = Thread(target=self.__write, daemon=True, name="BufferedLogger")
+        self.__thread.start()
+
+    def log(self, event):
+        self.log_many((event,))
+
+    def log_many(self, events):
+        if not events or self.__closed:
+            return
+        with self.__condition:
+            if self.__size >= self.max_pending and self.__thread.is_alive():
+                self.stalls += 1
+                while self.__size >= self.max_pending and self.__thread.is_alive():
+                    self.__condition.wait(0.1)
+            self.__pending.append(events)
+            self.__size += len(events)
+            if self.__size >= self.max_pending // 2:
+                self.__condition.notify_all()
+
+    def __write(self):
+        last = monotonic()
+        while True:
+            with self.__condition:
+                while not self.__closed and self.__size < self.max_pending // 2 and monotonic() - last < self.flush_interval:
+                    self.__condition.wait(self.flush_interval - (monotonic() - last))
+                batches, self.__pending = self.__pending, deque()
+                self.__size = 0
+                closed = self.__closed
+                self.__condition.notify_all()
+            if batches:
+                try:
+                    self._write([e for batch in batches for e in batch])
+                except Exception as e:
+                    self.error = e
+                    return
+            last = monotonic()
+            if closed:
+                return
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join()
+        self._close()
+        if self.error is not None:
+            raise self.error
+
+    def _open(self, file):
+        self.file = open(file, 'wb')
+        self.writer = LOG_FORMATS[self.format](self.file)
+
+    def _write(self, events): # on the writer thread
+        self.writer.write(events)
+        self.file.flush()
+
+    def _close(self):
+        self.file.close()
+
+# compression -> file extension
+COMPRESSION = {None : '', 'gzip' : '.gz', 'zstd' : '.zst'}
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+def _compressor(raw, compress):
+    if compress is None:
+        return raw
+    if compress == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='wb')
+    if compress == 'zstd':
+        if not ZSTD_AVALIABLE:
+            raise ZSTD_EXCEPTION
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+    raise ValueError("Invalid compression: {0}, must be one of {1}.".format(compress, list(COMPRESSION)))
+
+def open_log(file):
+    """ Open a log file for reading (binary mode), compressed logs (gzip or zstd) are decompressed as they are read. """
+    with open(file, 'rb') as f:
+        magic = f.read(4)
+    if magic.startswith(_GZIP_MAGIC):
+        return gzip.open(file, 'rb')
+    if magic == _ZSTD_MAGIC:
+        if not ZSTD_AVALIABLE:
+            raise ZSTD_EXCEPTION
+        return zstandard.ZstdDecompressor().stream_reader(open(file, 'rb'), closefd=True)
+    return open(file, 'rb')
+
+class RotatingLogger(BufferedLogger):
+    """
+        Logs events to a sequence of (compressed) segment files, a new segment is started when the current one reaches 
+        max_bytes (on disk) or spans max_seconds of events. The segments are listed in an index file along with the time 
+        range of their events (see read_index), so that a time window can be read without reading the whole log 
+        (see read_events). Existing segments are kept, new segments are numbered after them.
+
+        Segments are named <file>.<number><ext>[.gz|.zst] and the index <file>.index.json, where file is the given path 
+        without its extension.
+    """
+
+    BLOCK_SIZE = 4096
+
+    def __init__(self, file, format='binary', compress='gzip', max_bytes=64 * 2**20, max_seconds=None, max_segments=None, **kwargs):
+        """
+        Args:
+            file (str): path of the log, segment and index files are named after it.
+            format (str, optional): 'text' or 'binary' (see LOG_FORMATS). Defaults to 'binary'.
+            compress (str, optional): 'gzip', 'zstd' or None. Defaults to 'gzip'.
+            max_bytes (int, optional): maximum size of a segment on disk (approximate, compressors buffer their output). Defaults to 64MB.
+            max_seconds (float, optional): maximum time spanned by the events in a segment. Defaults to None (no maximum).
+            max_segments (int, optional): maximum number of segments to keep, the oldest are deleted. Defaults to None (keep all).
+        """
+        if compress not in COMPRESSION:
+            raise ValueError("Invalid compression: {0}, must be one of {1}.".format(compress, list(COMPRESSION)))
+        if max_bytes <= 0:
+            raise ValueError("Invalid max_bytes: {0}, must be positive.".format(max_bytes))
+        if max_seconds is not None and max_seconds <= 0:
+            raise ValueError("Invalid max_seconds: {0}, must be positive (or None).".format(max_seconds))
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.max_segments = max_segments
+        super(RotatingLogger, self).__init__(file, format=format, **kwargs)
+
+    def _open(self, file):
+        self.root, self.ext = os.path.splitext(file)
+        if not self.ext:
+            self.ext = '.bin' if self.format == 'binary' else '.txt'
+        self.index_file = self.root + '.index.json'
+        self.segments = read_index(self.index_file) if os.path.exists(self.index_file) else []
+        self.__number = max([segment['number'] for segment in self.segments], default=-1) + 1
+        self.__segment = None
+        self.file = None
+
+    def __start_segment(self):
+        path = "{0}.{1:05d}{2}{3}".format(self.root, self.__number, self.ext, COMPRESSION[self.compress])
+        self.__raw = open(path, 'wb')
+        self.file = _compressor(self.__raw, self.compress)
+        self.writer = LOG_FORMATS[self.format](self.file)
+        self.__segment = dict(number=self.__number, file=os.path.basename(path), start=None, end=None, events=0)
+        self.__number += 1
+
+    def __end_segment(self):
+        if self.file is not self.__raw:
+            self.file.close() # flush the compressor
+        self.__raw.close()
+        segment, self.__segment, self.file = self.__segment, None, None
+        segment['bytes'] = os.path.getsize(os.path.join(os.path.dirname(self.index_file), segment['file']))
+        self.segments.append(segment)
+        if self.max_segments is not None:
+            while len(self.segments) > self.max_segments:
+                old = self.segments.pop(0)
+                try:
+                    os.remove(os.path.join(os.path.dirname(self.index_file), old['file']))
+                except FileNotFoundError:
+                    pass
+        tmp = self.index_file + '.tmp'
+        with open(tmp, 'w') as f:
+            dump(dict(segments=self.segments), f, indent=1)
+        os.replace(tmp, self.index_file)
+
+    def _write(self, events):
+        # events are written in blocks of at most BLOCK_SIZE, a segment ends after the block that reaches max_bytes 
+        # or before the first event that is max_seconds after its start
+        i = 0
+        while i < len(events):
+            if self.__segment is None:
+                self.__start_segment()
+            segment = self.__segment
+            j = min(len(events), i + RotatingLogger.BLOCK_SIZE)
+            full = False
+            if self.max_seconds is not None:
+                start = events[i].timestamp if segment['start'] is None else segment['start']
+                j = next((k for k in range(i, j) if events[k].timestamp - start >= self.max_seconds), j)
+                full = j < len(events) and events[j].timestamp - start >= self.max_seconds
+                if j == i:
+                    self.__end_segment()
+                    continue
+            block = events[i:j]
+            self.writer.write(block)
+            timestamps = [e.timestamp for e in block]
+            start, end = min(timestamps), max(timestamps)
+            segment['start'] = start if segment['start'] is None else min(start, segment['start'])
+            segment['end'] = end if segment['end'] is None else max(end, segment['end'])
+            segment['events'] += len(block)
+            if full or self.__raw.tell() >= self.max_bytes:
+                self.__end_segment()
+            i = j
+        if self.file is not None and self.compress is None:
+            self.file.flush()
+
+    def _close(self):
+        if self.__segment is not None:
+            self.__end_segment()
+
 def get_logger(logger):
+    """
+        Get a logger for events.
+
+    Args:
+        logger (str, object): path of the log file, events are logged in the binary format if the file extension is .bin
+            (text otherwise). Paths ending with .gz or .zst are logged to compressed segments (see RotatingLogger).
+            Or a logger object (with log, log_many and close).
+    """
     if logger is None:
         return None
-    # TODO other kinds of loggers, currently logging to a file is the default
-    return FileLogger(logger)
\ No newline at end of file
+    if not isinstance(logger, str):
+        return logger
+    root, ext = os.path.splitext(logger)
+    compress = {v:k for k,v in COMPRESSION.items() if v}.get(ext)
+    if compress is not None:
+        root, ext = os.path.splitext(root)
+    format = 'binary' if ext == '.bin' else 'text'
+    if compress is not None:
+        return RotatingLogger(root + ext, format=format, compress=compress)
+    return BufferedLogger(logger, format=format)
+
+# ================================ READERS ================================ #
+
+# text log line, see Event.__str__
+_TEXT_EVENT = re.compile(r"^(.*?):([-+.\deE]+) - \((.*?)->(.*?)\): (\{.*\})$")
+_TEXT_CAUSE = ", 'cause': "
+
+def _parse_text_data(data):
+    try:
+        return ast.literal_eval(data)
+    except (ValueError, SyntaxError):
+        pass
+    i = data.find(_TEXT_CAUSE) # the cause of change events is an event (last), keep its id
+    if i >= 0:
+        result = _parse_text_data(data[:i] + "}")
+        cause = data[i + len(_TEXT_CAUSE):].split(":", 1)[0]
+        result['cause'] = int(cause) if cause.isdigit() else cause
+        return result
+    return {'raw' : data}
+
+def _parse_text_dst(dst):
+    return list(ast.literal_eval(dst)) if dst.startswith('[') else dst
+
+def read_text_events(file):
+    """ Iterate over the events in a text log (see TextEventWriter), the cause of an event is given by its id. """
+    with io.TextIOWrapper(open_log(file), encoding='utf-8') as f:
+        for line in f:
+            match = _TEXT_EVENT.match(line.rstrip("\n"))
+            if match is None:
+                continue # not an event (e.g. truncated)
+            id, timestamp, src, dst, data = match.groups()
+            id = int(id) if id.isdigit() else id
+            yield _event._event(id, src, _parse_text_dst(dst), float(timestamp), _parse_text_data(data))
+
+def _binary_blocks(buffer):
+    # (records, symbols, records offset, payloads offset) for each complete block of a binary log
+    magic, version, _ = FILE_HEADER.unpack_from(buffer, 0)
+    if magic != LOG_MAGIC or version != LOG_VERSION:
+        raise ValueError("Not a binary event log (version {0}).".format(LOG_VERSION))
+    offset = FILE_HEADER.size
+    while offset + BLOCK_HEADER.size <= len(buffer):
+        magic, n, _, _, symbols_size, payloads_size = BLOCK_HEADER.unpack_from(buffer, offset)
+        if magic != BLOCK_MAGIC:
+            raise ValueError("Invalid block at {0}.".format(offset))
+        symbols = offset + BLOCK_HEADER.size
+        records = symbols + symbols_size
+        payloads = records + n * RECORD.size
+        end = payloads + payloads_size
+        if end > len(buffer):
+            break # incomplete block (the log was not closed)
+        yield n, loads(bytes(buffer[symbols:records]).rstrip(b"\0")), records, payloads
+        offset = end
+
+@contextmanager
+def _log_buffer(file):
+    # the content of a binary log, memory mapped unless it is compressed
+    with open_log(file) as f:
+        if isinstance(f, io.BufferedReader):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield buffer
+        else:
+            yield f.read()
+
+def read_binary_events(file):
+    """ Iterate over the events in a binary log (see BinaryEventWriter), the cause of an event is given by its id. """
+    with _log_buffer(file) as buffer:
+        symbols = []
+        for n, new, records, payloads in _binary_blocks(buffer):
+            symbols.extend(new)
+            for id, timestamp, src, dst, label, size, offset in RECORD.iter_unpack(buffer[records:payloads]):
+                data = loads(buffer[payloads + offset:payloads + offset + size])
+                if label >= 0:
+                    data = dict(label=symbols[label], **data)
+                yield _event._event(id, symbols[src], symbols[dst], timestamp, data)
+
+def is_binary_log(file):
+    with open_log(file) as f:
+        return f.read(len(LOG_MAGIC)) == LOG_MAGIC
+
+def is_log_index(file):
+    return file.endswith('.index.json')
+
+def read_index(file):
+    """ Segments listed in the index file of a RotatingLogger, each is a dict with: number, file, start, end, events, bytes. """
+    with open(file, 'r') as f:
+        return load(f)['segments']
+
+def log_files(file, start=None, end=None):
+    """ 
+        Log files that may contain events in the given time window, either the file itself or the segments of an index file 
+        (see RotatingLogger).
+    """
+    if not is_log_index(file):
+        return [file]
+    directory = os.path.dirname(file)
+    return [os.path.join(directory, segment['file']) for segment in read_index(file)
+            if (start is None or segment['end'] >= start) and (end is None or segment['start'] < end)]
+
+def read_events(file, start=None, end=None):
+    """ 
+        Iterate over the events in a log file (text or binary, possibly compressed) or in the segments of an index file 
+        (see RotatingLogger), only events with start <= timestamp < end are given. 
+    """
+    for path in log_files(file, start=start, end=end):
+        events = read_binary_events(path) if is_binary_log(path) else read_text_events(path)
+        if start is None and end is None:
+            yield from events
+        else:
+            yield from (e for e in events if (start is None or e.timestamp >= start) and (end is None or e.timestamp < end))
+
+def convert_log(file, binary_file):
+    """ Convert a text log to the binary format (which is much faster to read, see EventLog). """
+    with open(binary_file, 'wb') as f:
+        writer, batch = BinaryEventWriter(f), []
+        for e in read_text_events(file):
+            batch.append(e)
+            if len(batch) == 100000:
+                writer.write(batch)
+                batch.clear()
+        if batch:
+            writer.write(batch)
+
+def _column(values):
+    # numpy column from a list of values, numbers with missing values (None) are NaN
+    kinds = set(v.__class__ for v in values)
+    if kinds <= {bool}:
+        return np.array(values, dtype=bool)
+    if kinds <= {int}:
+        return np.array(values, dtype=np.int64)
+    if kinds <= {int, float, type(None)}:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if kinds <= {str}:
+        return np.array(values, dtype=str)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+class EventLog:
+    """
+        Reads an event log (text or binary, see BufferedLogger) as columns (numpy arrays) of events with the same label. 
+        Logs are read lazily in chunks, binary logs are memory mapped so only the events that are selected are decoded.
+
+        Columns are: id, timestamp, src, dst and each of the event data keys (e.g. x, y for gaze events, attr, value for 
+        change events). For example, the fuel of each tank over a session:
+
+            fuel = EventLog(file).columns('change', attr='fuel')
+            fuel['timestamp'], fuel['src'], fuel['value']
+    """
+
+    def __init__(self, file, chunk_size=100000, start=None, end=None):
+        """
+        Args:
+            file (str): path of the log file, or of the index file of a RotatingLogger.
+            chunk_size (int, optional): maximum number of events in each chunk. Defaults to 100000.
+            start (float, optional): only read events with a timestamp >= start. Defaults to None.
+            end (float, optional): only read events with a timestamp < end. Defaults to None.
+        """
+        super(EventLog, self).__init__()
+        if not NUMPY_AVALIABLE:
+            raise NUMPY_EXCEPTION
+        self.file = file
+        self.chunk_size = chunk_size
+        self.start, self.end = start, end
+        self.files = log_files(file, start=start, end=end) # only segments that overlap the time window are read
+
+    def __iter__(self):
+        return read_events(self.file, start=self.start, end=self.end)
+
+    def chunks(self, label=None, src=None, dst=None, attr=None):
+        """
+            Iterate over chunks of the log, each chunk is a dict of label -> columns for events that match the 
+            given filter (see EventFilter).
+        """
+        event_filter = _event.EventFilter(src=src, dst=dst, label=label, attr=attr)
+        for file in self.files:
+            if is_binary_log(file):
+                yield from self.__binary_chunks(file, event_filter)
+            else:
+                yield from self.__text_chunks(file, event_filter)
+
+    def columns(self, label, src=None, dst=None, attr=None):
+        """ Columns of all events in the log with the given label that match the given filter (see chunks). """
+        chunks = [chunk[label] for chunk in self.chunks(label=label, src=src, dst=dst, attr=attr) if label in chunk]
+        keys = list(dict.fromkeys(k for chunk in chunks for k in chunk))
+        result = {}
+        for k in keys:
+            parts = [chunk[k] if k in chunk else _column([None] * len(chunk['id'])) for chunk in chunks]
+            result[k] = np.concatenate(parts) if len(set(p.dtype.kind for p in parts)) == 1 else \
+                        _column([v for p in parts for v in p.tolist()])
+        return result
+
+    def labels(self):
+        """ Labels of the events in the log. """
+        return list(dict.fromkeys(label for chunk in self.chunks() for label in chunk))
+
+    @staticmethod
+    def __to_columns(events):
+        groups = {}
+        for e in events:
+            groups.setdefault(e.label, []).append(e)
+        result = {}
+        for label, events in groups.items():
+            data = [e.data.__dict__ for e in events]
+            keys = list(dict.fromkeys(k for d in data for k in d if k != 'label'))
+            columns = dict(id=_column([e.id for e in events]), timestamp=_column([e.timestamp for e in events]),
+                           src=_column([e.src for e in events]), dst=_column([e.dst for e in events]))
+            for k in keys:
+                columns.setdefault(k, _column([d.get(k) for d in data]))
+            result[label] = columns
+        return result
+
+    def __text_chunks(self, file, event_filter):
+        start, end = self.start, self.end
+        chunk = []
+        for e in read_text_events(file):
+            if event_filter(e) and (start is None or e.timestamp >= start) and (end is None or e.timestamp < end):
+                chunk.append(e)
+            if len(chunk) == self.chunk_size:
+                yield EventLog.__to_columns(chunk)
+                chunk = []
+        if chunk:
+            yield EventLog.__to_columns(chunk)
+
+    def __binary_chunks(self, file, event_filter):
+        dtype = np.dtype([('id', '<i8'), ('timestamp', '<f8'), ('src', '<i4'), ('dst', '<i4'), ('label', '<i4'),
+                          ('size', '<u4'), ('offset', '<u8')])
+        values = event_filter.values
+        with _log_buffer(file) as buffer:
+            if isinstance(buffer, bytes):
+                records_map = np.frombuffer(buffer, dtype=np.uint8) # decompressed
+            else:
+                records_map = np.memmap(file, dtype=np.uint8, mode='r') # record columns are views of the file
+            symbols = []
+            for n, new, records, payloads in _binary_blocks(buffer):
+                symbols.extend(new)
+                codes = {symbol:code for code, symbol in enumerate(symbols)}
+                table = np.array(symbols, dtype=str)
+                block = records_map[records:records + n * dtype.itemsize].view(dtype)
+                for i in range(0, n, self.chunk_size):
+                    chunk = block[i:i + self.chunk_size]
+                    mask = np.ones(len(chunk), dtype=bool)
+                    if self.start is not None:
+                        mask &= chunk['timestamp'] >= self.start
+                    if self.end is not None:
+                        mask &= chunk['timestamp'] < self.end
+                    for field in ('label', 'src', 'dst'): # vectorised filter on symbol codes
+                        if field in values:
+                            mask &= np.isin(chunk[field], [codes[v] for v in values[field] if v in codes])
+                    chunk = chunk[mask]
+                    result = {}
+                    for code in np.unique(chunk['label']):
+                        rows = chunk[chunk['label'] == code]
+                        data = [loads(buffer[payloads + o:payloads + o + s]) for o, s in zip(rows['offset'].tolist(), rows['size'].tolist())]
+                        if 'attr' in values:
+                            keep = np.array([d.get('attr') in values['attr'] for d in data], dtype=bool)
+                            rows, data = rows[keep], [d for d, k in zip(data, keep) if k]
+                            if not data:
+                                continue
+                        columns = dict(id=np.array(rows['id']), timestamp=np.array(rows['timestamp']), 
+                                       src=table[rows['src']], dst=table[rows['dst']])
+                        for k in dict.fromkeys(k for d in data for k in d):
+                            columns.setdefault(k, _column([d.get(k) for d in data]))
+                        result[symbols[code] if code >= 0 else None] = columns
+                    if result:
+                        yield result
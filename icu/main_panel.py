@@ -3,8 +3,10 @@ import tkinter as tk
 from . import panel
 from .constants import MAIN_BANNER_COLOUR, MAIN_BANNER_HEIGHT
 
-from .component import BaseComponent, CanvasWidget, SimpleLayoutManager, EmptyComponent
+from .component import BaseComponent, CanvasWidget, SimpleLayoutManager, EmptyComponent, raise_layers
 
+from . import event
+from . import render
 from .event import EventCallback
 
 from .overlay import Overlay
@@ -12,6 +14,86 @@ from .overlay import Overlay
 OUTER_PADDING = 10 ##??? maybe...
 MOUSE_BIND = "<Button-1>"
 
+try:
+    import numpy as np
+
+    NUMPY_EXCEPTION = None
+    NUMPY_AVALIABLE = True
+except ModuleNotFoundError as _NUMPY_EXCEPTION:
+    NUMPY_EXCEPTION = _NUMPY_EXCEPTION
+    NUMPY_AVALIABLE = False
+
+class Geometry:
+    """
+        Cached screen and window geometry of a widget (typically the MainPanel canvas), used to map normalised screen
+        coordinates ([0,1] x [0,1], e.g. from an eye tracker) to canvas coordinates. Tk is only queried (on the Tk
+        thread) when the window changes (<Configure> of the toplevel or the widget, see refresh for fullscreen toggles),
+        transform may be called from any thread without touching Tk.
+    """
+
+    def __init__(self, widget):
+        super(Geometry, self).__init__()
+        self.widget = widget
+        self.screen_size = (1, 1)
+        self.origin = (0, 0) # screen position of the widget
+        self.scale = (1., 1.) # canvas units per pixel, e.g. if the canvas content is scaled on resize
+        self.__transform = (1., 0., 1., 0.) # canvas = a * normalised + b (ax, bx, ay, by)
+        self.update()
+        widget.winfo_toplevel().bind("<Configure>", self.__configure, add="+")
+        if widget is not widget.winfo_toplevel():
+            widget.bind("<Configure>", self.__configure, add="+")
+
+    def __configure(self, event):
+        if event.widget is self.widget or event.widget is self.widget.winfo_toplevel():
+            self.update() # not the <Configure> of some other child widget
+
+    def refresh(self, *_):
+        """ Update once tk has settled (e.g. after a fullscreen toggle), may be used as a callback. """
+        self.widget.after_idle(self.update)
+
+    def update(self):
+        """ Query the geometry from tk (on the Tk thread). """
+        widget = self.widget
+        self.screen_size = (widget.winfo_screenwidth(), widget.winfo_screenheight())
+        self.origin = (widget.winfo_rootx(), widget.winfo_rooty())
+        scroll = (widget.canvasx(0), widget.canvasy(0)) if hasattr(widget, 'canvasx') else (0., 0.)
+        self.__update(scroll)
+
+    def set_scale(self, sx, sy):
+        """ Set the canvas units per pixel (see MainPanel.resize). """
+        self.scale = (sx, sy)
+        self.__update()
+
+    def __update(self, scroll=None):
+        if scroll is not None:
+            self.__scroll = scroll
+        (sw, sh), (ox, oy), (sx, sy), (cx, cy) = self.screen_size, self.origin, self.scale, self.__scroll
+        # a single assignment, readers on other threads always see a consistent transform
+        self.__transform = (sw * sx, cx - ox * sx, sh * sy, cy - oy * sy)
+
+    @property
+    def window_position(self):
+        """ Screen position of the widget. """
+        return self.origin
+
+    def transform(self, x, y):
+        """ Normalised screen coordinates to canvas coordinates (nan stays nan). """
+        ax, bx, ay, by = self.__transform
+        return ax * x + bx, ay * y + by
+
+    def transform_many(self, points):
+        """ Transform an (n, 2) array of normalised screen coordinates to canvas coordinates (requires numpy). """
+        if not NUMPY_AVALIABLE:
+            raise NUMPY_EXCEPTION
+        ax, bx, ay, by = self.__transform
+        points = np.asarray(points, dtype=float)
+        return points * np.array([ax, ay]) + np.array([bx, by])
+
+    def inverse(self, x, y):
+        """ Canvas coordinates to normalised screen coordinates. """
+        ax, bx, ay, by = self.__transform
+        return (x - bx) / ax, (y - by) / ay
+
 class MainPanel(tk.Canvas, EventCallback):
 
     def __init__(self, parent, width, height, background_colour='blue'):
@@ -48,6 +130,9 @@ class MainPanel(tk.Canvas, EventCallback):
         self.__main.layout_manager.fill('bottom', 'X')
 
         self.__overlay = None
+        self.geometry = Geometry(self) # screen -> canvas coordinates (e.g. for eye tracking)
+        self.__resize_size = None # size of the last <Configure> (see resize)
+        self.__resize_handle = None
 
         # mouse clicks should be registered to the canvas
 
@@ -65,6 +150,11 @@ class MainPanel(tk.Canvas, EventCallback):
                 clickable = bound[overlap]
                 self.source(clickable.name, label="click", x=event.x, y=event.y)
 
+    def layout(self):
+        """ Solve the layout of every widget on the panel (see CanvasWidget.layout), once they have all been added. """
+        self.__main.layout()
+        raise_layers(self) # widgets created after the highlights (see LAYERS)
+
     @property
     def size(self):
         return self.__main.size
@@ -74,15 +164,35 @@ class MainPanel(tk.Canvas, EventCallback):
         return self.__main.position
 
     def resize(self, event):
+        """ Resize to the window (<Configure>), at most once per frame (see render), to the size of the last event. """
         #print(event.width, event.height)
         if self.winfo_width() != event.width or self.winfo_height() != event.height:
-            self.config(width=event.width, height=event.height)
-            self.__main.size = (event.width-OUTER_PADDING*2, event.height-OUTER_PADDING*2)
-            self.pack()
+            self.__resize_size = (event.width, event.height)
+            if self.__resize_handle is None:
+                self.__schedule_resize()
+
+    def __schedule_resize(self):
+        period = render.renderer().period or 0.
+        self.__resize_handle = event.event_scheduler.after(period * 1000, self.__resize)
+
+    def __resize(self):
+        self.__resize_handle = None
+        width, height = self.__resize_size
+        self.config(width=width, height=height)
+        main = self.__main
+        size = (width - OUTER_PADDING*2, height - OUTER_PADDING*2)
+        if main.proportional and main.width > 0 and main.height > 0:
+            # the whole panel is scaled, transform every item with one tk call and then update the components
+            sx, sy = size[0] / main.width, size[1] / main.height
+            main.scale_group(main.x, main.y, sx, sy)
+            main.transformed(sx, sy, main.x - main.x * sx, main.y - main.y * sy)
+        else:
+            main.size = size
+        self.pack()
 
     def overlay(self, component):
         self.__overlay = Overlay(self, component)
-        self.__overlay.front()
+        self.__overlay.set_layer('overlay')
         self.__main.components['overlay'] = self.__overlay
 
     @property
@@ -0,0 +1,297 @@
+"""
+    Pure-python state models of the ICU tasks. Each model mirrors the state and event handling of its widget
+    (see system_monitor, tracking and fuel_monitor) and registers under the same name, so it receives and
+    generates the same events. Models are used to run ICU without a display (see icu.run(headless=True)).
+"""
+
+
+from . import event
+from .event import Event, EventCallback, PeriodicClock, event_property, etuple, now
+
+from .constants import EVENT_LABEL_BURN, EVENT_LABEL_TRANSFER, EVENT_LABEL_FAIL, EVENT_LABEL_REPAIR, EVENT_LABEL_CLICK
+from .constants import EVENT_LABEL_KEY, EVENT_LABEL_MOVE, EVENT_LABEL_SLIDE, EVENT_LABEL_SWITCH
+from .constants import TANK_BURN_RATE, TANK_ACCEPT_POSITION, TANK_ACCEPT_PROPORTION
+
+
+class Model(EventCallback):
+
+    def __init__(self, name):
+        super(Model, self).__init__()
+        EventCallback.register(self, name)
+
+class HighlightModel(Model):
+
+    def __init__(self, component, state=False, enable=True, **kwargs):
+        super(HighlightModel, self).__init__("Highlight:{0}".format(component))
+        self.__state = state
+
+    def sink(self, event):
+        if "value" in event.data: #if no value is given, flip the highlight on/off
+            self.__state = bool(event.data.value)
+        else:
+            self.__state = not self.__state
+        self.source('Global', label='highlight', value=self.is_on)
+
+    @property
+    def is_on(self):
+        return self.__state
+
+    @property
+    def is_off(self):
+        return not self.__state
+
+class FuelTankModel(Model):
+
+    def __init__(self, name, capacity=1000, fuel=100, **kwargs):
+        super(FuelTankModel, self).__init__(name)
+        self.capacity = capacity
+        self.__fuel = fuel
+
+    @event_property
+    def fuel(self):
+        return self.__fuel
+
+    @fuel.setter
+    def fuel(self, value):
+        self.__fuel = min(max(value, 0), self.capacity)
+
+    def sink(self, event):
+        if event.data.label == EVENT_LABEL_BURN or event.data.label == EVENT_LABEL_TRANSFER:
+            self.fuel = etuple(self.fuel + event.data.value, event)
+
+    def update(self, dfuel, event=None):
+        self.fuel = etuple(self.fuel + dfuel, event)
+
+class FuelTankMainModel(FuelTankModel):
+
+    def __init__(self, name, burn_rate=TANK_BURN_RATE, accept_position=TANK_ACCEPT_POSITION,
+                 accept_proportion=TANK_ACCEPT_PROPORTION, **kwargs):
+        super(FuelTankMainModel, self).__init__(name, **kwargs)
+        self.accept_position = accept_position
+        self.accept_proportion = accept_proportion
+        self.burn_rate = burn_rate #fuel per second
+        self.event_rate = 10 # same as FuelTankMain
+
+        lim = self.limits
+        self.__trigger_enter = self.fuel > lim[0] and self.fuel < lim[1]
+        self.__trigger_leave = not self.__trigger_enter
+
+        event.event_scheduler.schedule(self.__burn(), sleep=PeriodicClock(1. / self.event_rate)) #start burning fuel
+
+    def __burn(self):
+        while True:
+            dfuel = min(self.burn_rate / self.event_rate, self.fuel)
+            if self.fuel > 0:
+                yield Event(self.name, self.name, label=EVENT_LABEL_BURN, value=-dfuel)
+            else:
+                yield None
+
+    @property
+    def limits(self):
+        cy, ch = self.capacity*self.accept_position, self.capacity*(self.accept_proportion/2)
+        return cy - ch, cy + ch
+
+    @FuelTankModel.fuel.setter
+    def fuel(self, value):
+        FuelTankModel.fuel.fset(self, value)
+        lim = self.limits
+        if self.fuel > lim[0] and self.fuel < lim[1]:
+            if self.__trigger_enter:
+                self.source('Global', label='fuel', acceptable=True)
+                self.__trigger_enter = False
+                self.__trigger_leave = True
+        elif self.__trigger_leave:
+            self.source('Global', label='fuel', acceptable=False)
+            self.__trigger_leave = False
+            self.__trigger_enter = True
+
+class FuelTankInfiniteModel(FuelTankModel):
+
+    def update(self, *args, **kwargs):
+        pass # no updates
+
+    def sink(self, *args, **kwargs): # receives no events
+        pass
+
+class PumpModel(Model):
+
+    def __init__(self, tank1, tank2, state=1, flow_rate=100, event_rate=10, **kwargs):
+        super(PumpModel, self).__init__("Pump:{0}{1}".format(tank1.name.split(':')[1], tank2.name.split(':')[1]))
+        self.tank1 = tank1
+        self.tank2 = tank2
+        self.flow_rate = flow_rate
+        self.event_rate = event_rate
+        self.__state = state
+        self.__transfer_handle = None
+
+    def start(self):
+        self.stop()
+        self.__transfer_handle = event.event_scheduler.schedule(self.__transfer(), sleep=PeriodicClock(1. / self.event_rate))
+
+    def stop(self):
+        if self.__transfer_handle is not None:
+            self.__transfer_handle.cancel()
+            self.__transfer_handle = None
+
+    def __transfer(self):
+        while self.state == 0: #on
+            yield self.transfer()
+
+    def transfer(self):
+        if self.tank1.fuel == 0 or self.tank2.fuel == self.tank2.capacity:
+            return None #no event...
+        flow = self.flow_rate / self.event_rate
+        flow = min(flow, self.tank1.fuel)
+        flow = min(flow, self.tank2.capacity - self.tank2.fuel)
+        e1 = Event(self.name, self.tank1.name, label=EVENT_LABEL_TRANSFER, value=-flow)
+        e2 = Event(self.name, self.tank2.name, label=EVENT_LABEL_TRANSFER, value=flow)
+        return e1, e2
+
+    @event_property
+    def state(self):
+        return self.__state
+
+    @state.setter
+    def state(self, value):
+        self.__state = value
+        if value == 0:
+            self.start()
+        else:
+            self.stop()
+
+    def sink(self, event):
+        if event.data.label == EVENT_LABEL_FAIL:
+            self.state = etuple(2, cause=event) # failed (unusable)
+        elif event.data.label == EVENT_LABEL_REPAIR:
+            self.state = etuple(1, cause=event) # not transfering (useable)
+        elif event.data.label == EVENT_LABEL_CLICK:
+            if self.state != 2:
+                self.state = etuple(abs(self.__state - 1), cause=event)
+
+class ScaleModel(Model):
+
+    def __init__(self, name, size=11, position=None, **kwargs):
+        super(ScaleModel, self).__init__(name)
+        self.__size = size
+        self.__state = 0
+        if position is None:
+            position = size // 2
+        else:
+            position = min(max(position, 0), size-1)
+        self.slide(position)
+
+    @event_property
+    def state(self):
+        return self.__state
+
+    @state.setter
+    def state(self, value):
+        self.__state = value
+
+    def slide(self, y, cause=None):
+        self.state = etuple(max(0, min(self.__size-1, self.__state + y)), cause=cause)
+
+    def sink(self, event):
+        if event.data.label == EVENT_LABEL_CLICK or (event.data.label == EVENT_LABEL_KEY and event.data.action == 'press'):
+            self.slide(self.__size // 2 - self.__state, cause=event)
+        elif event.data.label == EVENT_LABEL_SLIDE:
+            self.slide(event.data.slide, cause=event)
+
+class WarningLightModel(Model):
+
+    def __init__(self, name, state=0, prefered_state=0, grace=1, **kwargs):
+        super(WarningLightModel, self).__init__(name)
+        self.__state = state
+        self.__prefered_state = prefered_state
+        self.grace = grace
+        self.last_interacted = 0
+
+    @event_property
+    def state(self):
+        return self.__state
+
+    @state.setter
+    def state(self, value):
+        self.__state = value
+
+    def sink(self, event):
+        if event.data.label == EVENT_LABEL_CLICK or (event.data.label == EVENT_LABEL_KEY and event.data.action == 'press'):
+            if self.__state != self.__prefered_state:
+                self.state = etuple(self.__prefered_state, cause=event)
+                self.last_interacted = now()
+        elif event.data.label == EVENT_LABEL_SWITCH:
+            if now() - self.grace > self.last_interacted:
+                self.state = etuple(int(not bool(self.__prefered_state)), cause=event)
+
+class TargetModel(Model):
+    """
+        Model of the tracking target, the target position is relative to the top left of a (square) tracking
+        area of the given size (in pixels).
+    """
+
+    def __init__(self, name, size, invert=False, **kwargs):
+        super(TargetModel, self).__init__(name)
+        self.size = size
+        self.target_size = size / 6 # see Tracking (ts = size/12)
+        self.position = (size/2 - self.target_size/2, size/2 - self.target_size/2)
+        self.invert = (1,-1)[int(invert)]
+        self.key_events = {'Left':(-1,0), 'Right':(1,0), 'Up':(0,-1), 'Down':(0,1)}
+
+    def sink(self, event):
+        x, y = self.position
+        if event.data.label == EVENT_LABEL_KEY:
+            dx, dy = self.key_events[event.data.key]
+            s = self.invert * self.size / 200
+            dx, dy = dx * s, dy * s
+        else:
+            dx, dy = event.data.dx * self.invert, event.data.dy * self.invert
+
+        m = self.size - self.target_size
+        nx, ny = max(0, min(m, x + dx)), max(0, min(m, y + dy))
+        self.position = (nx, ny)
+
+        c = self.target_size / 2 - self.size / 2
+        self.source('Global', label=EVENT_LABEL_MOVE, dx=dx, dy=dy, x=nx + c, y=ny + c)
+
+class Simulation:
+    """
+        The full ICU task model built from a config (see icu.config), without any widgets.
+    """
+
+    def __init__(self, config):
+        super(Simulation, self).__init__()
+        task = config['task']
+        highlight = config['overlay']
+        self.tanks, self.pumps, self.scales, self.warning_lights, self.targets = {}, {}, {}, {}, {}
+        self.highlights = {}
+
+        def add_highlight(name):
+            if highlight.get('enable', True):
+                self.highlights[name] = HighlightModel(name, **highlight)
+
+        if task['system']:
+            defaults = {"WarningLight:0" : dict(prefered_state=1), "WarningLight:1" : dict(prefered_state=0)}
+            for name, options in defaults.items():
+                options.update(config.get(name, {}))
+                self.warning_lights[name] = WarningLightModel(name, **options)
+            for name in sorted(k for k in config if k.startswith('Scale:')):
+                self.scales[name] = ScaleModel(name, **config[name])
+            for name in [*self.warning_lights, *self.scales, "SystemMonitor"]:
+                add_highlight(name)
+
+        if task['track']:
+            name = "Target:0"
+            self.targets[name] = TargetModel(name, config['screen_height']/2, **config[name])
+            add_highlight(name)
+
+        if task['fuel']:
+            for name in "ABCDEF":
+                name = "FuelTank:{0}".format(name)
+                tank = (FuelTankMainModel, FuelTankMainModel, FuelTankModel, FuelTankModel,
+                        FuelTankInfiniteModel, FuelTankInfiniteModel)["ABCDEF".index(name[-1])]
+                self.tanks[name] = tank(name, **config[name])
+            for t1, t2 in ["EC", "CA", "EA", "FD", "DB", "FB", "AB", "BA"]: # same topology as FuelWidget
+                pump = PumpModel(self.tanks["FuelTank:" + t1], self.tanks["FuelTank:" + t2], **config["Pump:" + t1 + t2])
+                self.pumps[pump.name] = pump
+            for name in [*self.tanks, *self.pumps, "FuelMonitor"]:
+                add_highlight(name)
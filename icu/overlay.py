@@ -7,26 +7,31 @@
 
 from .event import Event, EventCallback
 from .component import Component, PolyComponent, BaseComponent
-from .highlight import all_highlighted
+from .constants import EVENT_LABEL_FIXATION
+from .spatial import GazeFocus, HIGHLIGHTED
 
 
 class Overlay(EventCallback, Component, PolyComponent):
     """
-    A GUI widget that is placed above other widgets. Accepts 'move' and 'place' events to move the widget.
+    A GUI widget that is placed above other widgets. Accepts 'move' and 'place' events to move the widget, gaze
+    events ('gaze', 'saccade' or 'fixation' start/end) show and hide it.
     """
 
+    hit_test = False # the overlay follows the gaze, it is not something to look at
+
     def __init__(self, canvas, component):
         super(Overlay, self).__init__(canvas, component)
         name = "{0}:{1}".format(Overlay.__name__, str(0))
 
         EventCallback.register(self, name)
         Component.register(self, name)
+        self.focus = GazeFocus() # the component that the gaze is on
 
     def sink(self, event):
-        print(event)
         if event.data.label == "place":
             self.x = event.data.x
             self.y = event.data.y
+            self.focus.update(event.data.x, event.data.y)
         elif event.data.label == "move":
             self.x += event.data.dx
             self.y += event.data.dy
@@ -39,10 +44,19 @@ class Overlay(EventCallback, Component, PolyComponent):
         elif event.data.label == "gaze":
             self.x = event.data.x - self.width / 2
             self.y = event.data.y - self.height / 2
-            if (
-                len(all_highlighted()) > 0
-            ):  # TODO ??? hmmm what about for debugging purposes...?
+            self.focus.update(event.data.x, event.data.y)
+            if HIGHLIGHTED:  # TODO ??? hmmm what about for debugging purposes...?
                 self.show()
+        elif event.data.label == EVENT_LABEL_FIXATION:
+            if event.data.action == "start":
+                self.x = event.data.x - self.width / 2
+                self.y = event.data.y - self.height / 2
+                self.focus.update(event.data.x, event.data.y)
+                if HIGHLIGHTED:
+                    self.show()
+            else:
+                self.focus.update(None, None)
+                self.hide()
         elif event.data.label == "show":
             self.show()
         elif event.data.label == "hide":
@@ -0,0 +1,234 @@
+"""
+    Spatial index of the (named) components of the GUI, used to find which component is at a position (e.g. where the
+    eyes are) and which highlighted component is nearest, without computing the distance to every component. The index
+    is kept up to date by the position/size observers of each component (see BaseComponent.observe).
+
+    GazeFocus uses the index to emit 'focus' events (action 'enter' or 'leave') when the gaze moves onto or off a
+    component.
+"""
+
+import math
+from collections import defaultdict
+
+from .event import EventCallback
+from .constants import EVENT_LABEL_FOCUS
+
+
+class GridIndex:
+    """
+        A uniform grid over axis aligned boxes (x, y, width, height), each cell (of size cell x cell) holds the keys
+        of the boxes that overlap it, and separately the keys of the boxes whose centre is in it (see nearest).
+        Updating a box only touches the cells it covers.
+    """
+
+    SCAN = 16 # nearest checks at most this many keys directly rather than searching the grid
+
+    def __init__(self, cell=64):
+        super(GridIndex, self).__init__()
+        self.cell = cell
+        self.boxes = {} # key -> (x1, y1, x2, y2)
+        self.__cells = defaultdict(set) # (i, j) -> keys of boxes that overlap the cell
+        self.__centres = defaultdict(set) # (i, j) -> keys of boxes whose centre is in the cell
+        self.__extent = None # (i1, j1, i2, j2) bounds of the centre cells (may be larger than needed after removes)
+
+    def __index(self, x, y):
+        return int(math.floor(x / self.cell)), int(math.floor(y / self.cell))
+
+    def __span(self, box):
+        (i1, j1), (i2, j2) = self.__index(box[0], box[1]), self.__index(box[2], box[3])
+        return ((i, j) for i in range(i1, i2 + 1) for j in range(j1, j2 + 1))
+
+    @staticmethod
+    def __centre(box):
+        return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+
+    def insert(self, key, x, y, width, height):
+        """ Insert (or update) the box of key. """
+        box = (min(x, x + width), min(y, y + height), max(x, x + width), max(y, y + height))
+        old = self.boxes.get(key)
+        if old == box:
+            return
+        if old is not None:
+            self.remove(key)
+        self.boxes[key] = box
+        for cell in self.__span(box):
+            self.__cells[cell].add(key)
+        i, j = self.__index(*GridIndex.__centre(box))
+        self.__centres[(i, j)].add(key)
+        e = self.__extent
+        self.__extent = (i, j, i, j) if e is None else (min(e[0], i), min(e[1], j), max(e[2], i), max(e[3], j))
+
+    def remove(self, key):
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return
+        for cell in self.__span(box):
+            self.__discard(self.__cells, cell, key)
+        self.__discard(self.__centres, self.__index(*GridIndex.__centre(box)), key)
+
+    @staticmethod
+    def __discard(cells, cell, key):
+        keys = cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del cells[cell]
+
+    def at(self, x, y):
+        """ Keys of the boxes that contain the point (x, y), smallest (innermost) first. """
+        keys = self.__cells.get(self.__index(x, y), ())
+        boxes = self.boxes
+        hits = [k for k in keys if boxes[k][0] <= x <= boxes[k][2] and boxes[k][1] <= y <= boxes[k][3]]
+        hits.sort(key=lambda k: (boxes[k][2] - boxes[k][0]) * (boxes[k][3] - boxes[k][1]))
+        return hits
+
+    def nearest(self, x, y, keys=None):
+        """
+            The key of the box whose centre is nearest to (x, y), searching the cells in rings around (x, y) until no
+            closer centre is possible.
+
+        Args:
+            x, y (float): position.
+            keys (set, optional): only consider these keys. Defaults to None (all keys).
+
+        Returns:
+            tuple: (key, distance), (None, inf) if there are no (matching) boxes.
+        """
+        best, best_d = None, math.inf
+        if self.__extent is None:
+            return best, best_d
+        if keys is not None and len(keys) <= GridIndex.SCAN:
+            # a few keys (e.g. the highlighted components) are quicker to check directly than to search for
+            for k in keys:
+                box = self.boxes.get(k)
+                if box is not None:
+                    px, py = GridIndex.__centre(box)
+                    d = math.hypot(px - x, py - y)
+                    if d < best_d:
+                        best, best_d = k, d
+            return best, best_d
+        ci, cj = self.__index(x, y)
+        i1, j1, i2, j2 = self.__extent
+        rings = max(abs(ci - i1), abs(ci - i2), abs(cj - j1), abs(cj - j2))
+        boxes, centres = self.boxes, self.__centres
+        for r in range(rings + 1):
+            for cell in GridIndex.__ring(ci, cj, r):
+                for k in centres.get(cell, ()):
+                    if keys is None or k in keys:
+                        px, py = GridIndex.__centre(boxes[k])
+                        d = math.hypot(px - x, py - y)
+                        if d < best_d:
+                            best, best_d = k, d
+            if best_d <= r * self.cell: # everything in the next ring is at least r cells away
+                break
+        return best, best_d
+
+    @staticmethod
+    def __ring(ci, cj, r):
+        if r == 0:
+            yield ci, cj
+            return
+        for i in range(ci - r, ci + r + 1):
+            yield i, cj - r
+            yield i, cj + r
+        for j in range(cj - r + 1, cj + r):
+            yield ci - r, j
+            yield ci + r, j
+
+    def __contains__(self, key):
+        return key in self.boxes
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def clear(self):
+        self.boxes.clear()
+        self.__cells.clear()
+        self.__centres.clear()
+        self.__extent = None
+
+
+class ComponentIndex(GridIndex):
+    """ GridIndex of components (by name), updated when a component moves or is resized. """
+
+    def __init__(self, cell=64):
+        super(ComponentIndex, self).__init__(cell=cell)
+        self.components = {}
+        self.__observers = {} # name -> observer callback
+
+    def track(self, name, component):
+        """ Add a component to the index (see Component.register). """
+        self.untrack(name)
+        observer = lambda _: self.insert(name, *component.position, *component.size)
+        component.observe('position', observer)
+        component.observe('size', observer)
+        self.components[name] = component
+        self.__observers[name] = observer
+        observer(None)
+
+    def untrack(self, name):
+        component = self.components.pop(name, None)
+        if component is not None:
+            observer = self.__observers.pop(name)
+            component.unobserve('position', observer)
+            component.unobserve('size', observer)
+            self.remove(name)
+
+    def component_at(self, x, y):
+        """ Name of the innermost component at (x, y), None if there is none. """
+        hits = self.at(x, y)
+        return hits[0] if hits else None
+
+    def clear(self):
+        for name in list(self.components):
+            self.untrack(name)
+        super(ComponentIndex, self).clear()
+
+
+INDEX = ComponentIndex()
+HIGHLIGHTED = set() # names of the highlighted components (see highlight.Highlight.on/off)
+
+def index():
+    """ The index of all registered components (see Component.register). """
+    return INDEX
+
+def component_at(x, y):
+    """ Name of the innermost component at (x, y), None if there is none. """
+    return INDEX.component_at(x, y)
+
+def highlighted(name, value):
+    """ Record whether the component is highlighted (see nearest_highlight). """
+    if value:
+        HIGHLIGHTED.add(name)
+    else:
+        HIGHLIGHTED.discard(name)
+
+def nearest_highlight(x, y):
+    """ The highlighted component nearest (by centre) to (x, y) as (name, distance), (None, inf) if nothing is highlighted. """
+    return INDEX.nearest(x, y, keys=HIGHLIGHTED)
+
+
+class GazeFocus(EventCallback):
+    """
+        The component the eyes are on, sends a 'focus' event to Global (action 'enter' or 'leave', with the name of
+        the component) when the gaze moves onto or off a component (see Overlay).
+    """
+
+    def __init__(self, name="GazeFocus", index=None):
+        super(GazeFocus, self).__init__()
+        self.index = INDEX if index is None else index
+        self.component = None
+        EventCallback.register(self, name)
+
+    def update(self, x, y):
+        """ Update the gaze position, None if the position is unknown (e.g. the end of a fixation). """
+        component = None if x is None else self.index.component_at(x, y)
+        if component != self.component:
+            if self.component is not None:
+                self.source('Global', label=EVENT_LABEL_FOCUS, action='leave', component=self.component)
+            if component is not None:
+                self.source('Global', label=EVENT_LABEL_FOCUS, action='enter', component=component, x=x, y=y)
+            self.component = component
+
+    def sink(self, event):
+        pass
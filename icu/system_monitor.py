@@ -18,7 +18,7 @@ from .constants import EVENT_LABEL_CLICK, EVENT_LABEL_KEY
 
 from .event import Event, EventCallback, get_event_sinks, event_property, etuple
 
-from .component import Component, CanvasWidget, SimpleComponent, BoxComponent, LineComponent
+from .component import Component, CanvasWidget, SimpleComponent, BoxComponent, LineComponent, EmptyComponent
 from .highlight import Highlight
 
 #TODO refactor (constants)
@@ -191,7 +191,7 @@ class SystemMonitorWidget(CanvasWidget):
         #scale widget
         scales = {k:v for k,v in config.items() if 'Scale' in k}
 
-        self.scale_widget = CanvasWidget(canvas, padding=0, inner_sep=self.content_width/(len(scales)*2-1))
+        self.scale_widget = CanvasWidget(canvas, padding=0)
         self.components['scale_widget'] = self.scale_widget
         self.layout_manager.fill('scale_widget', 'X')
         self.layout_manager.split('scale_widget', 'Y', 1-scale_prop)
@@ -205,6 +205,10 @@ class SystemMonitorWidget(CanvasWidget):
             scale = Scale(canvas, name=name, **options, highlight=highlight)
             self.scales[name] = scale
 
+            if i > 0: # the gaps between scales are as wide as the scales
+                self.scale_widget.components['gap' + str(i)] = EmptyComponent()
+                self.scale_widget.layout_manager.split('gap' + str(i), 'X')
+
             self.scale_widget.components[str(i)] = scale
 
             self.scale_widget.layout_manager.fill(str(i), 'Y')
@@ -35,9 +35,8 @@ if __name__ == '__main__':
     highlight = [h for h in m.event_sinks if 'Highlight' in h]
 
     def _sink():
-        if not sink.empty():
-            event = sink.get()
-            #print("SINK", event)
+        for event in sink.drain():
+            pass #print("SINK", event)
         
     
     def _source():
@@ -0,0 +1,141 @@
+import math
+
+import numpy as np
+
+from icu.eyetracking.filter import RingBuffer, NWMAFilter, IVTFilter, Pipeline, TobiiFilter, FixationFilter, GapFill, \
+                                   EyeSelection, NoiseReduction, VelocityWindow, FixationDetector, NAN
+
+RATE = 120. # samples per second
+
+def gaze(*segments):
+    """ Samples (t, x, y) at RATE, each segment is (duration, (x0, y0), (x1, y1)), x0 is None for a gap (NaN). """
+    samples, t = [], 0.
+    for duration, start, end in segments:
+        n = int(round(duration * RATE))
+        for i in range(n):
+            if start is None:
+                x, y = NAN, NAN
+            else:
+                a = i / n
+                jitter = (i % 3 - 1) * 0.5 # a little noise, well below the velocity threshold
+                x, y = start[0] + a * (end[0] - start[0]) + jitter, start[1] + a * (end[1] - start[1]) - jitter
+            samples.append((t, x, y))
+            t += 1. / RATE
+    return samples
+
+def fixation(duration, p):
+    return (duration, p, p)
+
+def blocks(samples, sizes=(1, 7, 50, 3, 2, 100)):
+    """ Samples split into blocks of varying sizes, some smaller than the filter windows. """
+    i, k = 0, 0
+    while i < len(samples):
+        n = sizes[k % len(sizes)]
+        yield np.array(samples[i:i + n], dtype=float)
+        i, k = i + n, k + 1
+
+def same(a, b):
+    assert len(a) == len(b), (len(a), len(b))
+    for r, s in zip(a, b):
+        assert r[3] == s[3] and all(math.isclose(u, v, rel_tol=1e-9, abs_tol=1e-9) for u, v in zip(r[:3], s[:3])), (r, s)
+
+def per_sample(f, samples):
+    result = [f(t, x, y) for t, x, y in samples]
+    return [(r['timestamp'], r['x'], r['y'], r.get('label', '')) for r in result if r is not None]
+
+def per_block(f, samples):
+    return [tuple(r) for b in blocks(samples) for r in f.process(b).tolist()]
+
+# a fixation, a saccade, a fixation with a short gap (which is filled), a long gap, then two more fixations
+A, B, C, D = (100, 100), (500, 300), (800, 100), (100, 500)
+SAMPLES = gaze(fixation(0.3, A), (0.03, A, B), fixation(0.3, B), fixation(0.05, None), fixation(0.2, B),
+               fixation(0.2, None), fixation(0.3, C), (0.03, C, D), fixation(0.2, D))
+VALID = [s for s in SAMPLES if s[1] == s[1]] # the eye tracker sends no sample during a gap
+
+if __name__ == '__main__':
+    # RingBuffer
+    buffer = RingBuffer(3)
+    assert [buffer.push(v) for v in (1, 2)] == [0., 0.] and buffer.values() == [1, 2] and not buffer.full
+    assert [buffer.push(v) for v in (3, 4, 5)] == [0., 1, 2] # the oldest values are replaced
+    assert buffer.full and len(buffer) == 3 and buffer.values() == [3, 4, 5] and buffer[0] == 3 and buffer[2] == 5
+    buffer.clear()
+    assert len(buffer) == 0 and buffer.values() == []
+
+    # NWMAFilter, the running sum is the average of the last 2n + 1 samples (also after it is recomputed, see RESUM)
+    f = NWMAFilter(2)
+    samples = [(i * 0.01, 1e6 + (i * 7919) % 13, -1e6 + (i * 104729) % 17) for i in range(3 * NWMAFilter.RESUM + 10)]
+    result = per_sample(f, samples)
+    assert len(result) == len(samples) - 4
+    for i, (t, x, y, label) in enumerate(result):
+        window = samples[i:i + 5]
+        assert t == window[2][0] and label == ''
+        assert math.isclose(x, math.fsum(s[1] for s in window) / 5, abs_tol=1e-6)
+        assert math.isclose(y, math.fsum(s[2] for s in window) / 5, abs_tol=1e-6)
+    same(per_block(NWMAFilter(2), samples), result)
+
+    # IVTFilter, samples are labelled by their velocity from the previous sample
+    f = IVTFilter(1000)
+    result = per_sample(f, VALID)
+    assert len(result) == len(VALID) - 1 # there is no velocity for the first sample
+    labels = [r[3] for r in result]
+    n = int(round(0.3 * RATE))
+    assert set(labels[:n - 1]) == {'gaze'} and set(labels[n:n + 3]) == {'saccade'}
+    assert labels.count('saccade') == 9 # the two saccades (and the first sample after each), and the jump across the gap
+    assert f(VALID[-1][0], 0, 0) is None # no velocity without time
+    same(per_block(IVTFilter(1000), VALID), result)
+
+    # Pipeline, the moving average then the classification (see TobiiFilter)
+    result = per_sample(TobiiFilter(2, 1000), VALID)
+    same(per_sample(Pipeline(NWMAFilter(2), IVTFilter(1000)), VALID), result)
+    same(per_block(TobiiFilter(2, 1000), VALID), result)
+    same(per_block(Pipeline(NWMAFilter(2), IVTFilter(1000)), VALID), result)
+    assert len(result) == len(VALID) - 5 and {r[3] for r in result} == {'gaze', 'saccade'}
+
+    # FixationFilter stages
+    fill = GapFill(max_gap=0.075)
+    assert fill.push((0., 1., 1., 1., 1.)) == [[0., 1., 1., 1., 1.]]
+    assert fill.push((0.01, NAN, NAN, 1., 1.)) == [] # waiting for the end of the gap
+    assert fill.push((0.02, 3., 5., 1., 1.)) == [[0.01, 2., 3., 1., 1.], [0.02, 3., 5., 1., 1.]] # interpolated
+    assert fill.push((0.03, NAN, NAN, 1., 1.)) == []
+    result = fill.push((0.2, NAN, NAN, 1., 1.)) # the gap is too long, it stays invalid
+    assert [s[0] for s in result] == [0.03, 0.2] and all(s[1] != s[1] for s in result)
+
+    assert EyeSelection('left').push((0., 1., 2., 3., 4.)) == [(0., 1., 2.)]
+    assert EyeSelection('right').push((0., 1., 2., 3., 4.)) == [(0., 3., 4.)]
+    assert EyeSelection('average').push((0., 1., 2., 3., 4.)) == [(0., 2., 3.)]
+    assert EyeSelection('average').push((0., NAN, NAN, 3., 4.)) == [(0., 3., 4.)]
+    assert all(v != v for v in EyeSelection('strict').push((0., NAN, NAN, 3., 4.))[0][1:])
+
+    noise = NoiseReduction(3, 'median')
+    assert noise.push((0., 1., 1.)) == [] and noise.push((0.1, 9., 2.)) == []
+    assert noise.push((0.2, 2., 3.)) == [(0.1, 2., 2.)] # the timestamp of the middle sample
+    assert NoiseReduction(1).push((0., 1., 1.)) == [(0., 1., 1.)]
+
+    window = VelocityWindow(2 / 64.)
+    result = [r for i in range(10) for r in window.push((i / 64., i * 5., 0.))] # 320 pixels per second
+    assert [r[0] for r in result] == [i / 64. for i in range(9)] # delayed by half a window
+    assert all(math.isclose(r[3], 320.) for r in result)
+
+    detector = FixationDetector(threshold=1000, merge_time=0.075, merge_distance=20, min_duration=0.06)
+    short = [detector.push((i * 0.01, 0., 0., 10.)) for i in range(4)] + [detector.push((0.04, 0., 0., 5000.))]
+    assert not any(short) # shorter than min_duration, discarded
+    events = [e for i in range(5, 20) for e in detector.push((i * 0.01, 50., 50., 10.))]
+    events += [e for i in range(20, 40) for e in detector.push((i * 0.01, 50., 50., NAN))] # a gap ends the fixation
+    assert [e['action'] for e in events] == ['start', 'end'] and events[0]['timestamp'] == 0.05
+    assert math.isclose(events[1]['duration'], 0.14) and (events[1]['x'], events[1]['y']) == (50., 50.)
+
+    # FixationFilter, the short gap is filled so B is a single fixation, the long gap ends it
+    f = FixationFilter()
+    events = [e for t, x, y in SAMPLES for e in f(t, x, y)]
+    assert [e['action'] for e in events] == ['start', 'end'] * 3 + ['start'], [e['action'] for e in events]
+    for (start, end), p in zip(zip(events[0::2], events[1::2]), (A, B, C)):
+        assert math.hypot(end['x'] - p[0], end['y'] - p[1]) < 2, (end, p)
+        assert math.isclose(end['timestamp'] - end['duration'], start['timestamp'])
+    assert 0.4 < events[3]['duration'] < 0.6 # both sides of the filled gap
+    ends = [(e['timestamp'] - e['duration'], e['duration'], e['x'], e['y']) for e in events if e['action'] == 'end']
+
+    # the block path gives the same fixations as the per-sample path
+    f = FixationFilter()
+    result = [tuple(r) for b in blocks(SAMPLES) for r in f.process(b).tolist()]
+    assert len(result) == len(ends) and all(math.isclose(u, v, abs_tol=1e-9) for r, s in zip(result, ends) for u, v in zip(r, s))
+    print("DONE")
@@ -0,0 +1,117 @@
+import os
+import tempfile
+
+from icu.event import Event
+from icu.log import BinaryEventWriter, BufferedLogger, RotatingLogger, EventLog, read_events, read_index, log_files, convert_log, \
+                    get_logger, ZSTD_AVALIABLE
+
+def events(n, start=0.):
+    result = []
+    for i in range(n):
+        t = start + i * 0.01
+        result.append(Event('EyeTracker', 'Overlay', timestamp=t, label='gaze', x=i * 0.5, y=float(i % 7)))
+        if i % 10 == 0:
+            result.append(Event('Pump12', 'Global', timestamp=t, label='change', attr='fuel', value=i, cause=result[-1]))
+    return result
+
+def expected(e):
+    # events are read back with the id of their cause (see log readers)
+    timestamp, name, (src, dst), data = e.to_tuple()
+    return timestamp, name, (src, dst), {k:(v.id if isinstance(v, Event) else v) for k, v in data.items()}
+
+def check(file, sent, start=None, end=None):
+    sent = [e for e in sent if (start is None or e.timestamp >= start) and (end is None or e.timestamp < end)]
+    assert [e.to_tuple() for e in read_events(file, start=start, end=end)] == [expected(e) for e in sent], file
+
+    log = EventLog(file, chunk_size=64, start=start, end=end)
+    assert set(log.labels()) == {'gaze', 'change'}
+    gaze = log.columns('gaze')
+    assert gaze['timestamp'].tolist() == [e.timestamp for e in sent if e.label == 'gaze']
+    assert gaze['x'].tolist() == [e.data.x for e in sent if e.label == 'gaze']
+    assert set(gaze['src'].tolist()) == {'EyeTracker'}
+    fuel = log.columns('change', attr='fuel')
+    assert fuel['value'].tolist() == [e.data.value for e in sent if e.label == 'change']
+    assert fuel['cause'].tolist() == [e.data.cause.id for e in sent if e.label == 'change']
+
+def log(logger, sent):
+    for i in range(0, len(sent), 100): # in batches, as GlobalEventCallback.flush
+        logger.log_many(sent[i:i + 100])
+    logger.close()
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        path = lambda name: os.path.join(directory, name)
+        sent = events(1000)
+
+        # single file logs, text and binary (see get_logger)
+        for name in ('log.txt', 'log.bin'):
+            logger = get_logger(path(name))
+            assert isinstance(logger, BufferedLogger) and not isinstance(logger, RotatingLogger)
+            log(logger, sent)
+            check(path(name), sent)
+            check(path(name), sent, start=2., end=5.5)
+
+        logger = get_logger(path('log.bin.gz'))
+        assert isinstance(logger, RotatingLogger) and (logger.format, logger.compress) == ('binary', 'gzip')
+        log(logger, sent)
+        check(path('log.index.json'), sent)
+
+        convert_log(path('log.txt'), path('converted.bin'))
+        check(path('converted.bin'), sent)
+
+        # a binary log written in blocks, an incomplete block (the log was not closed) is not read
+        with open(path('blocks.bin'), 'wb') as f:
+            writer = BinaryEventWriter(f)
+            for i in range(0, len(sent), 300):
+                writer.write(sent[i:i + 300])
+        check(path('blocks.bin'), sent)
+        with open(path('blocks.bin'), 'rb') as f:
+            data = f.read()
+        with open(path('truncated.bin'), 'wb') as f:
+            f.write(data[:-10])
+        assert [e.to_tuple() for e in read_events(path('truncated.bin'))] == [expected(e) for e in sent[:900]]
+
+        # compressed segments with an index (see RotatingLogger)
+        for compress, suffix in (('gzip', '.gz'), ('zstd', '.zst')):
+            if compress == 'zstd' and not ZSTD_AVALIABLE:
+                print("zstandard is not installed, skipped zstd segments")
+                continue
+            for format, ext in (('binary', '.bin'), ('text', '.txt')): # the index is named without the extension
+                name = compress + '-' + format + ext
+                logger = RotatingLogger(path(name), format=format, compress=compress, max_seconds=2.)
+                log(logger, sent)
+                index = os.path.splitext(path(name))[0] + '.index.json'
+                segments = read_index(index)
+                assert len(segments) == 5, segments
+                assert all(segment['file'].endswith(ext + suffix) for segment in segments)
+                assert all(segment['end'] - segment['start'] < 2. for segment in segments)
+                assert sum(segment['events'] for segment in segments) == len(sent)
+                check(index, sent)
+                check(index, sent, start=3.05, end=6.)
+                assert len(log_files(index, start=3.05, end=6.)) == 2 # only the segments in the time window are read
+
+                # logging again to the same file adds segments after the existing ones
+                more = events(100, start=20.)
+                log(RotatingLogger(path(name), format=format, compress=compress, max_seconds=2.), more)
+                segments = read_index(index)
+                assert [segment['number'] for segment in segments] == list(range(6))
+                check(index, sent + more)
+
+        # segments are rotated by size, and the oldest are deleted
+        block_size, RotatingLogger.BLOCK_SIZE = RotatingLogger.BLOCK_SIZE, 50
+        log(RotatingLogger(path('small.bin'), compress=None, max_bytes=4096, max_segments=3), sent)
+        RotatingLogger.BLOCK_SIZE = block_size
+        segments = read_index(path('small.index.json'))
+        assert len(segments) == 3 and segments[0]['number'] > 0
+        assert not os.path.exists(path('small.00000.bin'))
+        kept = sent[len(sent) - sum(segment['events'] for segment in segments):]
+        assert [e.to_tuple() for e in read_events(path('small.index.json'))] == [expected(e) for e in kept]
+
+        for kwargs in (dict(max_bytes=0), dict(max_seconds=0), dict(max_seconds=-1.), dict(compress='lz4')):
+            try:
+                RotatingLogger(path('invalid.bin'), **kwargs)
+                assert False, "expected ValueError for {0}".format(kwargs)
+            except ValueError:
+                pass
+
+    print("DONE")
@@ -0,0 +1,19 @@
+from icu import event
+from icu.event import Event, PeriodicClock
+
+if __name__ == '__main__':
+    event.initialise_global_event_callback(event.NullLogger())
+    schedular = event.virtual_event_schedular()
+
+    def gen():
+        while True:
+            yield Event('test', 'test', label='tick')
+
+    handle = schedular.schedule(gen(), sleep=PeriodicClock(0.1))
+    schedular.run(10000)
+
+    stats = handle.clock.stats()
+    print(stats)
+    assert stats['ticks'] == 100
+    assert abs(stats['rate'] - 10.) < 1e-6, "expected 10Hz, got {0}".format(stats['rate'])
+    print("DONE")
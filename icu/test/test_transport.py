@@ -0,0 +1,61 @@
+from multiprocessing import Process
+
+from icu.event import Event
+from icu.transport import SharedMemoryTransport
+
+def echo(receive, send, n):
+    for _ in range(n):
+        send.put(receive.get(timeout=10))
+    receive.close()
+    send.close()
+
+def events(n, size=0):
+    return [Event('src', 'dst', label='test', i=i, x=i * 0.5, text='x' * ((i * 7) % (size + 1)), values=[i, None, True])
+            for i in range(n)]
+
+if __name__ == '__main__':
+    # round trip: this process -> echo process -> this process
+    to_child, from_child = SharedMemoryTransport(), SharedMemoryTransport()
+    sent = events(1000)
+    p = Process(target=echo, args=(to_child, from_child, len(sent)))
+    p.daemon = True
+    p.start()
+    to_child.put_many(sent[:500])
+    for e in sent[500:]:
+        to_child.put(e)
+    received = []
+    while len(received) < len(sent):
+        received.extend(from_child.get_many(timeout=10))
+    p.join(10)
+    assert [e.to_tuple() for e in received] == [e.to_tuple() for e in sent]
+    assert from_child.empty() and to_child.dropped == 0
+    to_child.close()
+    from_child.close()
+
+    # wrap around: records of 2 to 5 slots often do not fit at the end of a small ring
+    ring = SharedMemoryTransport(slots=16, slot_size=64)
+    sent = events(200, size=150)
+    received = []
+    for i in range(0, len(sent), 2):
+        ring.put_many(sent[i:i + 2])
+        received.extend(ring.get_many())
+    assert [e.to_tuple() for e in received] == [e.to_tuple() for e in sent]
+    assert ring.dropped == 0 and ring.empty()
+
+    # an event that is too large for the ring is dropped (and counted) by put_many, put raises
+    large = Event('src', 'dst', label='large', text='x' * 16 * 64)
+    small = events(2)
+    ring.put_many([small[0], large, small[1]])
+    assert ring.dropped == 1
+    assert [e.to_tuple() for e in ring.get_many()] == [e.to_tuple() for e in small]
+    try:
+        ring.put(large)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+    # a full ring drops what does not fit
+    ring.put_many(events(20))
+    assert ring.full() and ring.dropped == 1 + 20 - ring.qsize()
+    ring.close()
+    print("DONE")
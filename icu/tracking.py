@@ -159,11 +159,22 @@ class Tracking(EventCallback, Component, CanvasWidget):
         pw, ph = aspect - dw, aspect - dh
         sw, sh = aspect / pw, aspect / ph
         #print(self, "scale:", sw, sh, "from:", pw,ph, "to:", self.width, self.height)
-        for c in self.components.values(): #scale each widget
-            c.size = (c.width * sw, c.height * sh)
-           
-            c.x = self.x + (c.x - self.x) * sw
-            c.y = self.y + (c.y - self.y) * sh
+        self.layout_manager.layout(scale=(sw, sh)) #scale each widget
+
+    def transformed(self, sx, sy, dx, dy):
+        # keep aspect ratio, the items have been transformed with the parent, undo that and scale them uniformly
+        (x, y), (w, h) = self.position, self.size
+        self._set_geometry(x * sx + dx, y * sy + dy, w * sx, h * sy)
+        s = min(self.size) / min(w, h)
+        tx, ty = self.x - x * s, self.y - y * s
+        self.scale_group(0, 0, s / sx, s / sy)
+        self.move_group(tx - dx * s / sx, ty - dy * s / sy)
+        self.transform_content(s, s, tx, ty)
+        d = min(self.size) - min(w, h) # as the size setter
+        for observer in self.observers['size']:
+            observer((d, d))
+        for observer in self.observers['position']:
+            observer((self.x - x, self.y - y))
 
     @BaseComponent.size.setter
     def size(self, value):
@@ -0,0 +1,420 @@
+"""
+    Transports used by ExternalEventSink and ExternalEventSource to move events between processes.
+
+    QueueTransport (the default) is a multiprocessing.Queue, events are pickled and sent through a pipe by a feeder thread.
+    SharedMemoryTransport is a single-producer/single-consumer ring of fixed-size binary records in shared memory
+    (see multiprocessing.shared_memory), it avoids the pipe and feeder thread and is much faster for high rate events
+    (e.g. eye tracking).
+"""
+
+import struct
+import pickle
+import logging
+from os import getpid
+from time import sleep, monotonic
+from threading import Lock
+from multiprocessing import Queue, Semaphore
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from collections import deque
+
+from . import event
+
+LOGGER = logging.getLogger("ICU")
+
+# ================================ RECORD CODEC ================================ #
+
+_HEAD = struct.Struct('<qd')    # id, timestamp
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_LEN = struct.Struct('<I')
+_COUNT = struct.Struct('<H')
+
+_INT_MIN, _INT_MAX = -(1 << 63), (1 << 63) - 1
+
+def _pack_value(out, value):
+    cls = value.__class__
+    if value is None:
+        out += b'N'
+    elif cls is bool:
+        out += b'T' if value else b'F'
+    elif cls is int and _INT_MIN <= value <= _INT_MAX:
+        out += b'i'
+        out += _INT.pack(value)
+    elif cls is float:
+        out += b'f'
+        out += _FLOAT.pack(value)
+    elif cls is str:
+        data = value.encode('utf-8')
+        out += b's'
+        out += _LEN.pack(len(data))
+        out += data
+    elif (cls is tuple or cls is list) and len(value) < 0xFFFF:
+        out += b'l'
+        out += _COUNT.pack(len(value))
+        for v in value:
+            _pack_value(out, v)
+    elif cls is dict and len(value) < 0xFFFF and all(k.__class__ is str for k in value):
+        out += b'd'
+        _pack_dict(out, value)
+    elif cls is event.Event:
+        out += b'e'
+        _pack_event(out, value)
+    else: # anything else is pickled
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        out += b'p'
+        out += _LEN.pack(len(data))
+        out += data
+
+def _pack_dict(out, value):
+    out += _COUNT.pack(len(value))
+    for k, v in value.items():
+        _pack_value(out, k)
+        _pack_value(out, v)
+
+def _pack_event(out, e):
+    out += _HEAD.pack(e.id, e.timestamp)
+    _pack_value(out, e.src) # symbol codes are local to a process, send symbols
+    _pack_value(out, e.dst)
+    _pack_dict(out, event.EventData._data(e.data))
+
+def _unpack_value(buffer, i):
+    tag = buffer[i]
+    i += 1
+    if tag == 0x4E: # N
+        return None, i
+    if tag == 0x54: # T
+        return True, i
+    if tag == 0x46: # F
+        return False, i
+    if tag == 0x69: # i
+        return _INT.unpack_from(buffer, i)[0], i + 8
+    if tag == 0x66: # f
+        return _FLOAT.unpack_from(buffer, i)[0], i + 8
+    if tag == 0x73: # s
+        n = _LEN.unpack_from(buffer, i)[0]
+        i += 4
+        return str(buffer[i:i+n], 'utf-8'), i + n
+    if tag == 0x6C: # l
+        n = _COUNT.unpack_from(buffer, i)[0]
+        i += 2
+        values = []
+        for _ in range(n):
+            v, i = _unpack_value(buffer, i)
+            values.append(v)
+        return tuple(values), i
+    if tag == 0x64: # d
+        return _unpack_dict(buffer, i)
+    if tag == 0x65: # e
+        return _unpack_event(buffer, i)
+    if tag == 0x70: # p
+        n = _LEN.unpack_from(buffer, i)[0]
+        i += 4
+        return pickle.loads(buffer[i:i+n]), i + n
+    raise ValueError("Invalid event record, unknown tag: {0}".format(chr(tag)))
+
+def _unpack_dict(buffer, i):
+    n = _COUNT.unpack_from(buffer, i)[0]
+    i += 2
+    value = {}
+    for _ in range(n):
+        k, i = _unpack_value(buffer, i)
+        value[k], i = _unpack_value(buffer, i)
+    return value, i
+
+def _unpack_event(buffer, i):
+    id, timestamp = _HEAD.unpack_from(buffer, i)
+    src, i = _unpack_value(buffer, i + _HEAD.size)
+    dst, i = _unpack_value(buffer, i)
+    data, i = _unpack_dict(buffer, i)
+    return event._event(id, src, dst, timestamp, data), i
+
+def pack(e):
+    """ Encode an event as a binary record (bytes). """
+    out = bytearray()
+    _pack_event(out, e)
+    return bytes(out)
+
+def unpack(buffer, offset=0):
+    """ Decode an event from a binary record (see pack). """
+    return _unpack_event(buffer, offset)[0]
+
+# ================================ TRANSPORTS ================================ #
+
+class QueueTransport:
+    """
+        Events are sent through a multiprocessing.Queue. A batch of events (see put_many) is sent as a single item.
+    """
+
+    def __init__(self):
+        super(QueueTransport, self).__init__()
+        self.__queue = Queue()
+        self.__pending = deque() # received events that have not been got yet (see get_many)
+
+    def __getstate__(self):
+        return self.__queue
+
+    def __setstate__(self, queue):
+        self.__queue = queue
+        self.__pending = deque()
+
+    def put(self, event):
+        self.__queue.put(event)
+
+    def put_many(self, events):
+        events = list(events)
+        if len(events) == 1:
+            self.__queue.put(events[0])
+        elif events:
+            self.__queue.put(events)
+
+    def __receive(self, block=True, timeout=None):
+        item = self.__queue.get(block=block, timeout=timeout)
+        if isinstance(item, list):
+            self.__pending.extend(item)
+        else:
+            self.__pending.append(item)
+
+    def get(self, block=True, timeout=None):
+        if not self.__pending:
+            self.__receive(block=block, timeout=timeout)
+        return self.__pending.popleft()
+
+    def get_many(self, max_n=None, block=True, timeout=None):
+        if not self.__pending:
+            self.__receive(block=block, timeout=timeout)
+        pending = self.__pending
+        try:
+            while max_n is None or len(pending) < max_n:
+                self.__receive(block=False)
+        except Empty:
+            pass
+        n = len(pending) if max_n is None else min(max_n, len(pending))
+        return [pending.popleft() for _ in range(n)]
+
+    def full(self):
+        return self.__queue.full()
+
+    def empty(self):
+        return not self.__pending and self.__queue.empty()
+
+    def qsize(self):
+        return len(self.__pending) + self.__queue.qsize() # a batch in the queue is counted once
+
+    def close(self):
+        return self.__queue.close()
+
+class SharedMemoryTransport:
+    """
+        Events are sent through a lock-free single-producer/single-consumer ring buffer in shared memory.
+
+        Each event is encoded as a binary record (see pack) stored in one or more consecutive fixed-size slots.
+        Only one process (and thread) may put events and only one may get them, this is the case for external sinks
+        (ICU puts, the external process gets) and for external sources (the other way around). The process that creates
+        the transport owns the shared memory and releases it on close. The transport is attached (by name) when it is
+        passed to another process.
+
+        When the ring is full, events are either dropped (overflow='drop', see dropped) or put blocks until there is space
+        (overflow='block').
+    """
+
+    # ring header (uint64): head slot, records written (producer) | tail slot, records read (consumer) | slots, slot size
+    # | consumer waiting (see get)
+    __HEADER = struct.Struct('<QQ')
+    __FLAG = struct.Struct('<Q')
+    __HEADER_SIZE = 64
+    __HEAD, __TAIL, __INFO, __WAITING = 0, 16, 32, 48
+    __WRAP = 0xFFFFFFFF # record length of a wrap marker (the rest of the ring is unused)
+
+    def __init__(self, slots=4096, slot_size=128, overflow='drop', name=None, doorbell=None):
+        """
+        Args:
+            slots (int, optional): number of slots in the ring. Defaults to 4096.
+            slot_size (int, optional): size of each slot in bytes, most events fit in a single slot. Defaults to 128.
+            overflow (str, optional): 'drop' or 'block' when the ring is full. Defaults to 'drop'.
+            name (str, optional): name of existing shared memory to attach to. Defaults to None (create new shared memory).
+            doorbell (multiprocessing.Semaphore, optional): used to wake a waiting consumer, if attaching. Defaults to None 
+                (the consumer polls).
+        """
+        super(SharedMemoryTransport, self).__init__()
+        if overflow not in ('drop', 'block'):
+            raise ValueError("Invalid overflow: {0}, must be 'drop' or 'block'.".format(overflow))
+        self.overflow = overflow
+        self.dropped = 0
+        self.__lock = Lock()
+        if name is None:
+            if slot_size < 8 or slot_size % 8 != 0:
+                raise ValueError("Invalid slot size: {0}, must be a multiple of 8.".format(slot_size))
+            self.__memory = SharedMemory(create=True, size=SharedMemoryTransport.__HEADER_SIZE + slots * slot_size)
+            self.__memory.buf[:SharedMemoryTransport.__HEADER_SIZE] = bytes(SharedMemoryTransport.__HEADER_SIZE)
+            SharedMemoryTransport.__HEADER.pack_into(self.__memory.buf, SharedMemoryTransport.__INFO, slots, slot_size)
+            self.__owner = getpid() # only the creating process releases the memory (not forked processes)
+            doorbell = Semaphore(0)
+        else:
+            self.__memory = SharedMemory(name=name)
+            slots, slot_size = SharedMemoryTransport.__HEADER.unpack_from(self.__memory.buf, SharedMemoryTransport.__INFO)
+            self.__owner = None
+        self.slots, self.slot_size = slots, slot_size
+        self.__doorbell = doorbell
+        self.__closed = False
+
+    def __reduce__(self): # attach to the same shared memory in other processes
+        return (SharedMemoryTransport, (self.slots, self.slot_size, self.overflow, self.__memory.name, self.__doorbell))
+
+    @property
+    def name(self):
+        return self.__memory.name
+
+    def __fits(self, record):
+        return -(-(len(record) + _LEN.size) // self.slot_size) <= self.slots
+
+    def put(self, event):
+        """ Put an event, raises ValueError if it is too large for the ring. """
+        record = pack(event)
+        if not self.__fits(record):
+            raise ValueError("Event is too large ({0} bytes) for {1}.".format(len(record) + _LEN.size, self))
+        self.__put_records((record,))
+
+    def put_many(self, events):
+        """ Put a batch of events, the consumer is notified once. Events that are too large for the ring are dropped. """
+        records = []
+        for e in events:
+            record = pack(e)
+            if self.__fits(record):
+                records.append(record)
+            else: # e.g. from GlobalEventCallback.flush, which must not fail
+                self.dropped += 1
+                LOGGER.warning("Dropped event (%s->%s) that is too large (%d bytes) for %s.", e.src, e.dst, len(record) + _LEN.size, self)
+        self.__put_records(records)
+
+    def __put_records(self, records):
+        buf, header = self.__memory.buf, SharedMemoryTransport.__HEADER
+        with self.__lock:
+            head, written = header.unpack_from(buf, SharedMemoryTransport.__HEAD)
+            published = written
+            for record in records:
+                size = len(record) + _LEN.size
+                n = -(-size // self.slot_size)
+                pos = head % self.slots
+                skip = self.slots - pos if pos + n > self.slots else 0 # records do not wrap around the end of the ring
+                if head + skip + n - header.unpack_from(buf, SharedMemoryTransport.__TAIL)[0] > self.slots:
+                    if self.overflow == 'drop':
+                        self.dropped += 1
+                        continue
+                    if written > published:
+                        self.__publish(head, written)  # the consumer must see what has been written to make space
+                        published = written
+                    start = monotonic()
+                    while head + skip + n - header.unpack_from(buf, SharedMemoryTransport.__TAIL)[0] > self.slots:
+                        sleep(0.0001 if monotonic() - start < 0.01 else 0.001)
+                        if self.__closed:
+                            return
+                if skip:
+                    _LEN.pack_into(buf, self.__offset(pos), SharedMemoryTransport.__WRAP)
+                    head, pos = head + skip, 0
+                offset = self.__offset(pos)
+                _LEN.pack_into(buf, offset, len(record))
+                buf[offset + _LEN.size:offset + size] = record
+                head, written = head + n, written + 1
+            if written > published:
+                self.__publish(head, written)
+
+    def __publish(self, head, written):
+        # the record count is written last (the consumer only reads published records)
+        buf = self.__memory.buf
+        SharedMemoryTransport.__HEADER.pack_into(buf, SharedMemoryTransport.__HEAD, head, written)
+        if self.__doorbell is not None and SharedMemoryTransport.__FLAG.unpack_from(buf, SharedMemoryTransport.__WAITING)[0]:
+            SharedMemoryTransport.__FLAG.pack_into(buf, SharedMemoryTransport.__WAITING, 0)
+            self.__doorbell.release()
+
+    def __wait(self, block, timeout):
+        # wait for published records, returns the tail slot, the number of records read and written
+        buf, header, flag = self.__memory.buf, SharedMemoryTransport.__HEADER, SharedMemoryTransport.__FLAG
+        start = monotonic()
+        while True:
+            tail, read = header.unpack_from(buf, SharedMemoryTransport.__TAIL)
+            written = header.unpack_from(buf, SharedMemoryTransport.__HEAD)[1]
+            if written > read:
+                return tail, read, written
+            elapsed = monotonic() - start
+            if not block or (timeout is not None and elapsed >= timeout):
+                raise Empty
+            if elapsed < 0.0002: # spin briefly, then wait for the producer to ring the doorbell
+                sleep(0)
+                continue
+            # the wait is short in case the doorbell is missed (the flag and record count are not synchronised)
+            wait = 0.001 if timeout is None else min(0.001, timeout - elapsed)
+            if self.__doorbell is None:
+                sleep(wait / 2)
+                continue
+            flag.pack_into(buf, SharedMemoryTransport.__WAITING, 1)
+            if header.unpack_from(buf, SharedMemoryTransport.__HEAD)[1] == read:
+                self.__doorbell.acquire(timeout=wait)
+            flag.pack_into(buf, SharedMemoryTransport.__WAITING, 0)
+
+    def get(self, block=True, timeout=None):
+        return self.get_many(1, block=block, timeout=timeout)[0]
+
+    def get_many(self, max_n=None, block=True, timeout=None):
+        tail, read, written = self.__wait(block, timeout)
+        n = written - read if max_n is None else min(max_n, written - read)
+        buf, events = self.__memory.buf, []
+        for _ in range(n):
+            pos = tail % self.slots
+            offset = self.__offset(pos)
+            size = _LEN.unpack_from(buf, offset)[0]
+            if size == SharedMemoryTransport.__WRAP:
+                tail, offset = tail + self.slots - pos, self.__offset(0)
+                size = _LEN.unpack_from(buf, offset)[0]
+            events.append(unpack(buf, offset + _LEN.size))
+            tail += -(-(size + _LEN.size) // self.slot_size)
+        SharedMemoryTransport.__HEADER.pack_into(buf, SharedMemoryTransport.__TAIL, tail, read + n)
+        return events
+
+    def __offset(self, pos):
+        return SharedMemoryTransport.__HEADER_SIZE + pos * self.slot_size
+
+    def full(self):
+        head = SharedMemoryTransport.__HEADER.unpack_from(self.__memory.buf, SharedMemoryTransport.__HEAD)[0]
+        tail = SharedMemoryTransport.__HEADER.unpack_from(self.__memory.buf, SharedMemoryTransport.__TAIL)[0]
+        return head - tail >= self.slots
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def qsize(self):
+        written = SharedMemoryTransport.__HEADER.unpack_from(self.__memory.buf, SharedMemoryTransport.__HEAD)[1]
+        read = SharedMemoryTransport.__HEADER.unpack_from(self.__memory.buf, SharedMemoryTransport.__TAIL)[1]
+        return written - read
+
+    def close(self):
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__memory.close()
+        if self.__owner == getpid():
+            self.__memory.unlink()
+
+    def __str__(self):
+        return "SharedMemoryTransport({0}, slots={1}, slot_size={2})".format(self.name, self.slots, self.slot_size)
+
+    def __repr__(self):
+        return str(self)
+
+TRANSPORTS = {'queue' : QueueTransport, 'shared' : SharedMemoryTransport}
+
+def get_transport(transport=None, overflow='drop'):
+    """
+        Get a transport for an external sink/source.
+
+    Args:
+        transport (str, object, optional): 'queue', 'shared' or a transport object. Defaults to None ('queue').
+        overflow (str, optional): what a 'shared' transport does when it is full (see SharedMemoryTransport). Defaults to 'drop'.
+    """
+    if transport is None or transport == 'queue':
+        return QueueTransport()
+    if transport == 'shared':
+        return SharedMemoryTransport(overflow=overflow)
+    if isinstance(transport, str):
+        raise ValueError("Invalid transport: {0}, must be one of {1}.".format(transport, list(TRANSPORTS)))
+    return transport
@@ -13,7 +13,7 @@ setuptools.setup(
     include_package_data=True,
     install_requires=[],
     python_requires=">=3.10",
-    extras_require={"tobii": ["tobii-research==1.11.0"]},
+    extras_require={"tobii": ["tobii-research==1.11.0"], "analysis": ["numpy"], "zstd": ["zstandard"]},
     classifiers=[
         "Programming Language :: Python :: 3.7",
         "Development Status :: 2 - Pre-Alpha",